@@ -0,0 +1,80 @@
+"""
+Benchmark: batch job scheduling versus running jobs in file order.
+
+Generates a job list of small regions spread over the stage with the
+objectives mixed at random. Reports objective switches and estimated
+stage travel between jobs for file order and for the schedule. Then runs
+the batch both ways on the simulator, where every turret switch takes
+OBJECTIVE_SWITCH_TIME, and reports the wall time.
+
+    python benchmarks/bench_batch_queue.py --jobs 8 --seed 1
+"""
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import batch_queue, mm_session, scan_logic, scan_plan
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage
+
+
+def make_jobs(count, seed):
+    """
+    `count` 2x2-tile regions at random places inside the stage limits, objectives mixed.
+    """
+    rng = random.Random(seed)
+    jobs = []
+    for n in range(count):
+        objective = rng.choice(("4x", "20x"))
+        x_step, y_step = scan_plan.STEP_SIZES_BY_OBJECTIVE[objective]
+        x = rng.uniform(30000, 90000)
+        y = rng.uniform(368000, 380000)
+        jobs.append(batch_queue.ScanJob(f"region{n + 1:02d}", y + y_step, y, x, x + x_step, objective=objective,
+                                        options={"pipelined": True}))
+    return jobs
+
+
+def run(jobs, schedule, out_dir):
+    use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0)))
+    mm_session.close_sessions()
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = batch_queue.run_batch(jobs, os.path.join(out_dir, "scheduled" if schedule else "file_order"),
+                                           schedule=schedule)
+    finally:
+        use_micromanager()
+    return report, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.jobs, args.seed)
+    start = SimulatedStage().position(jitter=False)
+    out_dir = tempfile.mkdtemp(prefix="bench_batch_")
+    try:
+        print(f"{args.jobs} jobs of 2x2 tiles, objectives mixed\n")
+        print(f"{'order':<12}{'switches':>10}{'travel s':>10}{'wall s':>9}{'done':>6}")
+        for name, schedule in (("file", False), ("scheduled", True)):
+            ordered = batch_queue.schedule_jobs(jobs, "4x", start) if schedule else jobs
+            switches, travel = batch_queue.schedule_cost(ordered, "4x", start)
+            report, elapsed = run(jobs, schedule, out_dir)
+            done = sum(r["status"] == "done" for r in report["jobs"])
+            print(f"{name:<12}{switches:>10}{travel:>10.2f}{elapsed:>9.2f}{done:>6}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
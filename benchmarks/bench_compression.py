@@ -0,0 +1,99 @@
+"""
+Benchmark: tile TIFF codecs on sample frames.
+
+For every codec available here (see tile_compression.CODECS), in strip and
+tiled layout, reports encode MB/s, decode MB/s (of raw pixel data) and the
+compression ratio. Frames are rendered by the simulator unless TIFF files are
+given with --input (use real tiles from a scan folder for representative ratios).
+
+    python benchmarks/bench_compression.py
+    python benchmarks/bench_compression.py --input D:/Scans/Scan_x_20x/tile_000*.tif --levels 1,6
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import tifffile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool.objectives import FRAME_SIZE, um_per_pixel
+from microscope_scan_tool.simulator import VirtualSlide
+from microscope_scan_tool.tile_compression import CODECS, DEFAULT_TILE_SIZE, TileCompression, codec_available
+
+
+def sample_frames(count, objective, seed):
+    slide = VirtualSlide(seed=seed)
+    rng = np.random.default_rng(seed)
+    x_min, y_min, x_max, y_max = slide.bounds
+    frames = []
+    for _ in range(count):
+        x, y = rng.uniform(x_min + 5000, x_max - 5000), rng.uniform(y_min + 5000, y_max - 5000)
+        frame = slide.render(x, y, um_per_pixel(objective), *FRAME_SIZE)
+        noise = rng.normal(0.0, 2.0, frame.shape)  # sensor noise limits real-world ratios
+        frames.append(cv2.cvtColor(np.clip(frame + noise, 0, 255).astype(np.uint8), cv2.COLOR_BGR2RGB))
+    return frames
+
+
+def measure(frames, compression):
+    raw_bytes = sum(f.nbytes for f in frames)
+    encoded = []
+    start = time.perf_counter()
+    for frame in frames:
+        buffer = io.BytesIO()
+        tifffile.imwrite(buffer, frame, photometric="rgb", **compression.imwrite_kwargs(frame.shape))
+        encoded.append(buffer.getvalue())
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data, frame in zip(encoded, frames):
+        decoded = tifffile.imread(io.BytesIO(data), maxworkers=compression.threads)
+        if not np.array_equal(decoded, frame):
+            raise AssertionError(f"{compression} is not lossless")
+    decode_time = time.perf_counter() - start
+
+    mb = raw_bytes / 1e6
+    return mb / encode_time, mb / decode_time, raw_bytes / sum(len(d) for d in encoded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", nargs="*", help="TIFF tiles to use instead of simulated frames")
+    parser.add_argument("--frames", type=int, default=8, help="number of simulated frames")
+    parser.add_argument("--objective", default="20x")
+    parser.add_argument("--levels", default="", help="comma-separated zlib/zstd levels (default: codec default)")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.input:
+        paths = [p for pattern in args.input for p in sorted(glob.glob(pattern))]
+        frames = [tifffile.imread(p) for p in paths]
+    else:
+        frames = sample_frames(args.frames, args.objective, args.seed)
+    levels = [int(v) for v in args.levels.split(",") if v] or [None]
+
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {w}x{h}, {frames[0].nbytes / 1e6:.1f} MB raw each\n")
+    print(f"{'setting':<28}{'encode MB/s':>12}{'decode MB/s':>13}{'ratio':>8}")
+
+    for codec in CODECS:
+        if not codec_available(codec):
+            print(f"{codec:<28}{'not available (needs imagecodecs)':>33}")
+            continue
+        codec_levels = levels if "level" in (CODECS[codec][1] or {}) else [None]
+        for level in codec_levels:
+            for tile_size in (None, args.tile_size):
+                compression = TileCompression(codec, level=level, tile_size=tile_size, threads=args.threads)
+                encode, decode, ratio = measure(frames, compression)
+                print(f"{str(compression):<28}{encode:>12.0f}{decode:>13.0f}{ratio:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
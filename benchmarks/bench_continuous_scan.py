@@ -0,0 +1,106 @@
+"""
+Benchmark: stop-and-go versus continuous-motion scanning.
+
+Scans the same grid on the simulator twice, once stopping at every tile
+(pipelined) and once sweeping the rows at constant velocity (continuous=True).
+Reports tiles/s and the speed-up. For both, each written tile is
+phase-correlated against a clean rendering of the slide at the position in its
+TileConfiguration, which measures how far the recorded positions are from
+where the tiles really are.
+
+Continuous scanning pays off with short exposures. The simulated camera's
+exposure and frame rate can be set:
+
+    python benchmarks/bench_continuous_scan.py --grid 20x=10x6 --exposure 0.2 --fps 30
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import tifffile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import logger, scan_logic, scan_plan
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.metadata_writer import find_tile_configuration, load_fiji_metadata
+from microscope_scan_tool.objectives import um_per_pixel
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage
+
+SCAN_CENTRE = (60000, 375000)
+
+
+def run_scan(objective, cols, rows, continuous, exposure_ms, fps, out_dir):
+    simulator = use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0), camera_fps=fps,
+                                                  exposure=exposure_ms / 1000.0))
+    logger.BASE_SAVE_DIR = out_dir
+    x_step, y_step = scan_plan.STEP_SIZES_BY_OBJECTIVE[objective]
+    x_left = SCAN_CENTRE[0] - (cols - 1) * x_step / 2
+    y_top = SCAN_CENTRE[1] + (rows - 1) * y_step / 2
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            scan_dir = scan_logic.snake_like_scan(y_top, y_top - (rows - 1) * y_step, x_left,
+                                                  x_left + (cols - 1) * x_step, objective,
+                                                  pipelined=True, continuous=continuous)
+    finally:
+        use_micromanager()
+    return scan_dir, time.perf_counter() - start, simulator
+
+
+def position_errors(scan_dir, simulator, objective):
+    """
+    Distance (µm) between each tile's recorded position and the position
+    phase correlation finds against a rendering of the slide there.
+    """
+    um_per_px = um_per_pixel(objective)
+    errors = []
+    for filename, x, y in load_fiji_metadata(find_tile_configuration(scan_dir)):
+        tile = tifffile.imread(os.path.join(scan_dir, filename))
+        h, w = tile.shape[:2]
+        expected = simulator.slide.render(x, y, um_per_px, w, h)
+        a = cv2.cvtColor(tile, cv2.COLOR_RGB2GRAY).astype(np.float32)
+        b = cv2.cvtColor(expected, cv2.COLOR_BGR2GRAY).astype(np.float32)
+        (dx, dy), _ = cv2.phaseCorrelate(a, b)
+        errors.append(np.hypot(dx, dy) * um_per_px)
+    return np.array(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid", default="20x=10x6", help="objective=COLSxROWS")
+    parser.add_argument("--exposure", type=float, default=0.2, help="camera exposure in ms")
+    parser.add_argument("--fps", type=float, default=30.0, help="camera frame rate")
+    parser.add_argument("--keep", action="store_true", help="keep the scan output folders")
+    args = parser.parse_args()
+
+    objective, size = args.grid.split("=")
+    cols, rows = (int(v) for v in size.lower().split("x"))
+    out_dir = tempfile.mkdtemp(prefix="bench_continuous_")
+    try:
+        print(f"{objective} {cols}x{rows} grid, {args.exposure:g} ms exposure, {args.fps:g} fps\n")
+        print(f"{'mode':<14}{'tiles':>7}{'wall s':>9}{'tiles/s':>9}{'mean err um':>13}{'max err um':>12}")
+        rates = {}
+        for name, continuous in (("stop-and-go", False), ("continuous", True)):
+            scan_dir, elapsed, simulator = run_scan(objective, cols, rows, continuous, args.exposure,
+                                                    args.fps, out_dir)
+            errors = position_errors(scan_dir, simulator, objective)
+            rates[name] = len(errors) / elapsed
+            print(f"{name:<14}{len(errors):>7}{elapsed:>9.2f}{rates[name]:>9.2f}"
+                  f"{errors.mean():>13.2f}{errors.max():>12.2f}")
+        print(f"\nSpeed-up: {rates['continuous'] / rates['stop-and-go']:.2f}x")
+    finally:
+        if args.keep:
+            print(f"\nScans kept in {out_dir}")
+        else:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
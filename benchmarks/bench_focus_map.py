@@ -0,0 +1,106 @@
+"""
+Benchmark: focus map vs per-tile autofocus vs fixed Z on the simulated microscope.
+
+The simulated slide is tilted and slightly bowed, so a fixed Z drifts out of
+focus across a 20x grid. Each mode visits the same serpentine grid:
+  fixed     Z focused once at the first tile and never changed
+  per-tile  coarse-to-fine autofocus at every tile
+  map       sparse focus map, interpolated Z set while the XY stage moves
+and reports the time per tile, the overhead against the fixed run, the Z error
+against the slide's true focal surface and the share of tiles within one fine
+autofocus step of focus.
+
+    python benchmarks/bench_focus_map.py --grid 6 --spacing 500
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool.focus_map import AUTOFOCUS_RANGES, FOCUS_METRICS, autofocus, build_focus_map, focus_targets
+from microscope_scan_tool.frame_freshness import fresh_frame
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.scan_plan import OBJECTIVE_TO_POSITION, STEP_SIZES_BY_OBJECTIVE
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage, VirtualSlide
+from microscope_scan_tool.stage_controller import move_stage
+
+SLIDE_TILT = (0.002, -0.003)  # µm of Z per µm of X, Y
+SLIDE_BOW_UM = 4.0
+
+
+def serpentine(objective, cols, rows, start):
+    x_step, y_step = STEP_SIZES_BY_OBJECTIVE[objective]
+    positions = []
+    for row in range(rows):
+        xs = range(cols) if row % 2 == 0 else reversed(range(cols))
+        positions.extend((start[0] + c * x_step, start[1] - row * y_step) for c in xs)
+    return positions
+
+
+def run(mode, args):
+    slide = VirtualSlide(seed=0, focus_tilt=SLIDE_TILT, focus_bow_um=SLIDE_BOW_UM)
+    microscope = use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0), slide=slide))
+    core = microscope.core
+    core.set_property("Objective", "Label", OBJECTIVE_TO_POSITION[args.objective])
+    cap = microscope.open_camera()
+    positions = serpentine(args.objective, args.grid, args.grid, (args.start[0], args.start[1]))
+    device = core.get_focus_device()
+
+    # The operator focused by hand on the first tile
+    move_stage(core, *positions[0])
+    core.set_position(device, float(microscope.slide.focus_z(*positions[0])))
+    core.wait_for_device(device)
+
+    errors = []
+    try:
+        start = time.perf_counter()
+        z_targets = None
+        if mode == "map":
+            focus_map = build_focus_map(core, cap, positions, args.objective, args.spacing, args.metric)
+            z_targets = focus_targets(focus_map, [(i, x, y) for i, (x, y) in enumerate(positions)])
+        for n, (x, y) in enumerate(positions):
+            if z_targets is not None:
+                core.set_position(device, z_targets[n])
+            move_stage(core, x, y)
+            if mode == "per-tile":
+                autofocus(core, cap, core.get_position(), args.objective, args.metric)
+            core.wait_for_device(device)
+            fresh_frame(cap, time.perf_counter())
+            errors.append(core.get_position() - float(microscope.slide.focus_z(x, y)))
+        elapsed = time.perf_counter() - start
+    finally:
+        cap.release()
+        use_micromanager()
+    return elapsed / len(positions), np.abs(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objective", default="20x", choices=sorted(STEP_SIZES_BY_OBJECTIVE))
+    parser.add_argument("--grid", type=int, default=7, help="tiles per side")
+    parser.add_argument("--spacing", type=float, default=None, help="focus map point spacing (µm)")
+    parser.add_argument("--metric", default="laplacian", choices=sorted(FOCUS_METRICS))
+    parser.add_argument("--start", type=float, nargs=2, default=(60000, 376000), metavar=("X", "Y"))
+    parser.add_argument("--modes", nargs="+", default=["fixed", "per-tile", "map"])
+    args = parser.parse_args()
+
+    print(f"{args.grid}x{args.grid} {args.objective} tiles, metric {args.metric}\n")
+    fine_step = AUTOFOCUS_RANGES[args.objective][2]
+    print(f"{'mode':<10}{'ms/tile':>10}{'overhead':>10}{'mean |dZ|':>11}{'max |dZ|':>10}{'in focus':>10}")
+    baseline = None
+    for mode in args.modes:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            per_tile, errors = run(mode, args)
+        baseline = per_tile if mode == "fixed" else baseline
+        overhead = "" if baseline is None or mode == "fixed" else f"{1000 * (per_tile - baseline):+.0f}"
+        print(f"{mode:<10}{1000 * per_tile:>10.0f}{overhead:>10}{errors.mean():>9.2f}µm{errors.max():>8.2f}µm"
+              f"{np.mean(errors <= fine_step):>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
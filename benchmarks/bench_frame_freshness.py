@@ -0,0 +1,97 @@
+"""
+Benchmark: stale/blurred tiles and capture latency, naive read vs fresh capture.
+
+Moves the simulated stage through a serpentine grid and captures one frame per
+tile three ways:
+  naive    cap.read() straight after move_stage (the original capture path)
+  drain    plain VideoCapture, queue drained with grab() timing (frame_freshness)
+  service  shared CameraService, first frame exposed after the settle time
+Each frame is compared with a clean render at the commanded position; frames
+that differ are counted as stale (previous field / exposed during the move).
+
+    python benchmarks/bench_frame_freshness.py --buffered-frames 4 --tiles 40
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import camera_service
+from microscope_scan_tool.frame_freshness import FrameValidator, frame_signature
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.image_capture import grab_frame
+from microscope_scan_tool.scan_plan import STEP_SIZES_BY_OBJECTIVE
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage
+from microscope_scan_tool.stage_controller import move_stage
+
+MATCH_THRESHOLD = 3.0  # mean abs thumbnail difference (gray levels) for a frame to match its position
+
+
+def serpentine(objective, count, start=(60000, 375000), cols=8):
+    x_step, y_step = STEP_SIZES_BY_OBJECTIVE[objective]
+    positions = []
+    for i in range(count):
+        row, col = divmod(i, cols)
+        col = col if row % 2 == 0 else cols - 1 - col
+        positions.append((start[0] + col * x_step, start[1] - row * y_step))
+    return positions
+
+
+def matches(frame, microscope, x, y):
+    reference = microscope.slide.render(x, y, microscope.core.objective_um_per_pixel(), frame.shape[1],
+                                        frame.shape[0])
+    upright = cv2.flip(frame, -1)
+    return float(np.abs(frame_signature(upright)[0] - frame_signature(reference)[0]).mean()) < MATCH_THRESHOLD
+
+
+def run(mode, args):
+    microscope = use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0),
+                                                   buffered_frames=args.buffered_frames))
+    microscope.core.set_property("Objective", "Label", "Position-2" if args.objective == "20x" else "Position-1")
+    if mode == "service":
+        cap = camera_service.acquire_camera()
+    else:
+        cap = microscope.open_camera()
+
+    validator = FrameValidator()
+    stale = 0
+    capture_time = 0.0
+    try:
+        for i, (x, y) in enumerate(serpentine(args.objective, args.tiles), start=1):
+            move_stage(microscope.core, x, y)
+            settled_at = time.perf_counter()
+            if mode == "naive":
+                frame = grab_frame(cap, i)
+            else:
+                frame = grab_frame(cap, i, settled_at, validator)
+            capture_time += time.perf_counter() - settled_at
+            stale += not matches(frame, microscope, x, y)
+    finally:
+        cap.release()
+        use_micromanager()
+    return stale, capture_time / args.tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objective", default="20x", choices=sorted(STEP_SIZES_BY_OBJECTIVE))
+    parser.add_argument("--tiles", type=int, default=40)
+    parser.add_argument("--buffered-frames", type=int, default=4, help="frames queued by the simulated driver")
+    args = parser.parse_args()
+
+    print(f"{args.tiles} {args.objective} tiles, driver queue of {args.buffered_frames} frames\n")
+    print(f"{'mode':<10}{'stale tiles':>12}{'capture ms/tile':>18}")
+    for mode in ("naive", "drain", "service"):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            stale, latency = run(mode, args)
+        print(f"{mode:<10}{stale:>12}{1000 * latency:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: tile quality vs extra time for frame averaging and EDF Z stacks.
+
+Captures tiles of a simulated 20x slide whose section has a few µm of relief
+within each field, so a single Z leaves parts of every tile out of focus, and
+compares each acquisition mode with a noise-free, fully in-focus render:
+  RMSE         overall error against the ideal tile (noise + defocus)
+  noise        temporal noise: spread between two captures of the same tile
+  extra ms     acquisition time beyond the first frame of each tile
+
+    python benchmarks/bench_frame_stacking.py --average 2 4 8 --slices 3 5
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool.frame_stacking import EDF_STEP_UM, TileStacking
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.scan_logic import OBJECTIVE_TO_POSITION
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage, VirtualSlide
+from microscope_scan_tool.stage_controller import move_stage
+
+
+def run(average, slices, args):
+    microscope = use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0),
+                                                   slide=VirtualSlide(seed=0, relief_um=args.relief)))
+    core = microscope.core
+    core.set_property("Objective", "Label", OBJECTIVE_TO_POSITION["20x"])
+    cap = microscope.open_camera()
+    device = core.get_focus_device()
+    stacking = TileStacking.from_settings(core, "20x", average, slices, args.step)
+
+    rmse, noise = [], []
+    try:
+        for n in range(args.tiles):
+            x, y = args.start[0] + 200 * n, args.start[1]
+            core.set_position(device, float(microscope.slide.focus_z(x, y)))
+            move_stage(core, x, y)
+            core.wait_for_device(device)
+            frame, _ = stacking.capture(cap, time.perf_counter())
+            repeat, _ = stacking.capture(cap, time.perf_counter())
+
+            um_per_px = core.objective_um_per_pixel()
+            reference = cv2.flip(microscope.slide.render(x, y, um_per_px, frame.shape[1], frame.shape[0]), -1)
+            rmse.append(float(np.sqrt(np.mean((frame.astype(np.float32) - reference) ** 2))))
+            noise.append(float(np.std(frame.astype(np.float32) - repeat) / np.sqrt(2)))
+    finally:
+        cap.release()
+        use_micromanager()
+    return stacking, np.mean(rmse), np.mean(noise), 1000 * stacking.extra_time / max(stacking.tiles, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiles", type=int, default=6)
+    parser.add_argument("--average", type=int, nargs="+", default=[2, 4, 8], help="frames averaged per tile")
+    parser.add_argument("--slices", type=int, nargs="+", default=[3, 5], help="EDF Z slices per tile")
+    parser.add_argument("--step", type=float, default=EDF_STEP_UM["20x"], help="EDF slice spacing (µm)")
+    parser.add_argument("--relief", type=float, default=3.0, help="section relief within a field (µm)")
+    parser.add_argument("--start", type=float, nargs=2, default=(60000, 376000), metavar=("X", "Y"))
+    args = parser.parse_args()
+
+    modes = [(1, 1)] + [(n, 1) for n in args.average] + [(1, s) for s in args.slices]
+    print(f"{args.tiles} 20x tiles, {args.relief:g} µm section relief\n")
+    print(f"{'mode':<44}{'RMSE':>8}{'noise':>8}{'extra ms':>10}")
+    for average, slices in modes:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            stacking, rmse, noise, extra = run(average, slices, args)
+        print(f"{str(stacking):<44}{rmse:>8.2f}{noise:>8.2f}{extra:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: cold-start time of the entry points.
+
+Starts a fresh interpreter for each command (median of --runs) and reports
+the wall time and which heavy modules it loaded (cv2, tkinter, pycromanager,
+tifffile, zarr). `import main` should load none of them; plan, dry-run and --help should
+stay free of OpenCV and tkinter. With --max-ms the benchmark exits non-zero
+when a command is slower than that, so it can guard against import regressions:
+
+    python benchmarks/bench_import_time.py --runs 7 --max-ms 500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("cv2", "tkinter", "pycromanager", "tifffile", "zarr")
+REGION = ["--objective", "20x", "--region", "376000", "375000", "60000", "61800"]
+
+REPORT_MODULES = ("import atexit, sys; atexit.register(lambda: sys.stderr.write("
+                  "'\\nLOADED ' + ' '.join(m for m in %r if m in sys.modules) + '\\n'))" % (HEAVY_MODULES,))
+
+COMMANDS = {
+    "import main": ["-c", "import main"],
+    "--help": ["-m", "microscope_scan_tool", "--help"],
+    "plan": ["-m", "microscope_scan_tool", "plan", *REGION],
+    "dry-run": ["-m", "microscope_scan_tool", "dry-run", *REGION],
+}
+
+
+def time_command(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=True)
+    return time.perf_counter() - start
+
+
+def loaded_modules(args):
+    """
+    Heavy modules in sys.modules when the command exits.
+    """
+    if args[0] == "-c":
+        code = [REPORT_MODULES + "; " + args[1]]
+    else:
+        code = [REPORT_MODULES + "; import runpy; sys.argv = %r; runpy.run_module(%r, run_name='__main__')"
+                % (["-m", *args[2:]], args[1])]
+    result = subprocess.run([sys.executable, "-c", *code], cwd=ROOT, capture_output=True, text=True)
+    for line in result.stderr.splitlines():
+        if line.startswith("LOADED"):
+            return line.split()[1:]
+    return ["?"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when a command takes longer")
+    args = parser.parse_args()
+
+    time_command(["-c", "pass"])
+    baseline = statistics.median(time_command(["-c", "pass"]) for _ in range(args.runs))
+    print(f"Interpreter start-up: {1000 * baseline:.0f} ms (median of {args.runs})\n")
+    print(f"{'command':<14}{'ms':>7}{'ms over python':>16}  heavy modules loaded")
+    slow = []
+    for name, command in COMMANDS.items():
+        elapsed = statistics.median(time_command(command) for _ in range(args.runs))
+        modules = loaded_modules(command)
+        print(f"{name:<14}{1000 * elapsed:>7.0f}{1000 * (elapsed - baseline):>16.0f}  {' '.join(modules) or '-'}")
+        if args.max_ms is not None and 1000 * elapsed > args.max_ms:
+            slow.append(name)
+    if slow:
+        print(f"\nSlower than {args.max_ms:g} ms: {', '.join(slow)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
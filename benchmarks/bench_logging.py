@@ -0,0 +1,79 @@
+"""
+Benchmark: caller-side cost of logging a line to the scan log.
+
+Compares the previous synchronous logger (open, append and close the log file
+for every line) with the queued logger (the caller only formats and enqueues,
+a background thread batch-writes). Reports per-call latency percentiles on the
+calling thread and the time until every line is on disk. Use --dir to point
+at a slow or network-mounted output directory.
+
+    python benchmarks/bench_logging.py --lines 5000 --dir /mnt/share/tmp
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import logger
+
+
+def synchronous_log(path, message):
+    """
+    The previous log_error: console print plus one open/append/close per line.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    log_line = f"[{timestamp}] {message}"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(log_line + "\n")
+    print(log_line)
+
+
+def run(lines, out_dir, queued):
+    logger.BASE_SAVE_DIR = out_dir
+    scan_dir = logger.create_scan_folder("bench")
+    path = logger.current_log().path
+    latencies = np.empty(lines)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for i in range(lines):
+            t = time.perf_counter()
+            if queued:
+                logger.log_warning(f" Slow stage settle at tile {i}", tile=i, x=50000 + i, y=370000)
+            else:
+                synchronous_log(path, f" Slow stage settle at tile {i}")
+            latencies[i] = time.perf_counter() - t
+        caller = time.perf_counter() - start
+        logger.close_scan_log()
+        total = time.perf_counter() - start
+    shutil.rmtree(scan_dir, ignore_errors=True)
+    return 1e6 * latencies, caller, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--dir", default=None, help="output directory (default: a temporary folder)")
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp(prefix="bench_logging_", dir=args.dir)
+    try:
+        print(f"{args.lines} lines to {out_dir}\n")
+        print(f"{'logger':<14}{'p50 us':>9}{'p99 us':>9}{'max us':>10}{'caller s':>10}{'on disk s':>11}")
+        for name, queued in (("synchronous", False), ("queued", True)):
+            latencies, caller, total = run(args.lines, out_dir, queued)
+            p50, p99 = np.percentile(latencies, (50, 99))
+            print(f"{name:<14}{p50:>9.1f}{p99:>9.1f}{latencies.max():>10.0f}{caller:>10.3f}{total:>11.3f}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
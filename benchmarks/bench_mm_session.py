@@ -0,0 +1,83 @@
+"""
+Benchmark: Micro-Manager round trips with and without the shared session.
+
+Replays a GUI objective selection, the scan's microscope preparation and a
+row of tiles with per-tile focus moves against the simulated core, which adds
+a fixed round-trip latency to every call (the local stand-in for the
+Micro-Manager ZMQ server). Reports the calls that reached the server, the
+round-trip time they cost and the wall time (mostly stage motion), once on the
+bare core (nothing cached) and once through mm_session.
+
+    python benchmarks/bench_mm_session.py --round-trip 0.002 --tiles 50
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import mm_session, scan_logic
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage
+from microscope_scan_tool.stage_controller import move_stage
+from microscope_scan_tool.stage_settling import StageMotionModel
+
+
+def workflow(core_for, objective, tiles):
+    """
+    GUI selection, scan preparation and `tiles` stage + focus moves.
+    Returns the core used for the tiles.
+    """
+    gui = core_for()
+    gui.set_property("Objective", "Label", scan_logic.OBJECTIVE_TO_POSITION[objective])
+    gui.wait_for_device("Objective")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        core = scan_logic.prepare_microscope(objective)
+    model = StageMotionModel()
+    for n in range(tiles):
+        focus = core.get_focus_device()
+        core.set_position(focus, 1500.0 + (n % 5))
+        move_stage(core, 60000 + 200 * n, 375000, model=model)
+        core.wait_for_device(focus)
+    return core
+
+
+def run(round_trip, objective, tiles, cached):
+    simulator = use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0), core_round_trip=round_trip))
+    raw = simulator.core
+    original = scan_logic.get_session
+    if not cached:
+        scan_logic.get_session = lambda port=None: raw
+    mm_session.close_sessions()
+    try:
+        start = time.perf_counter()
+        core = workflow(mm_session.get_session if cached else (lambda: raw), objective, tiles)
+        elapsed = time.perf_counter() - start
+    finally:
+        scan_logic.get_session = original
+        use_micromanager()
+    return sum(raw.calls.values()), elapsed, core
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--round-trip", type=float, default=0.002, help="simulated seconds per Core call")
+    parser.add_argument("--objective", default="20x")
+    parser.add_argument("--tiles", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.tiles} tiles at {args.objective}, {1000 * args.round_trip:.1f} ms per Core call\n")
+    print(f"{'core':<10}{'server calls':>14}{'round trips s':>15}{'wall s':>9}")
+    for name, cached in (("bare", False), ("session", True)):
+        calls, elapsed, core = run(args.round_trip, args.objective, args.tiles, cached)
+        print(f"{name:<10}{calls:>14}{calls * args.round_trip:>15.2f}{elapsed:>9.2f}")
+    print()
+    for line in core.report():
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: live overview canvas, per-tile cost and memory.
+
+For square 20x grids of increasing size, builds the OverviewCanvas and adds
+tiles to it, reporting the canvas scale and size, the time to add one tile
+(halving cascade) against one direct INTER_AREA resize to the same size, the
+memory allocated per added tile after warm-up, and the cost of one preview
+redraw (BGR snapshot). The full-resolution mosaic size is listed for comparison.
+
+    python benchmarks/bench_overview_canvas.py --grids 10 100 1000 --repeat 50
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool.objectives import FRAME_SIZE
+from microscope_scan_tool.overview_canvas import OverviewCanvas
+from microscope_scan_tool.scan_plan import STEP_SIZES_BY_OBJECTIVE
+
+OBJECTIVE = "20x"
+
+
+def time_it(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grids", type=int, nargs="+", default=[10, 100, 1000], help="tiles per grid side")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tile = rng.integers(0, 256, (FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype=np.uint8)
+    x_step, y_step = STEP_SIZES_BY_OBJECTIVE[OBJECTIVE]
+
+    print(f"{OBJECTIVE} tiles of {FRAME_SIZE[0]}x{FRAME_SIZE[1]}, {x_step} x {y_step} µm steps\n")
+    print(f"{'grid':>11}{'scale':>9}{'canvas':>13}{'MB':>7}{'full GB':>9}{'add ms':>8}{'direct ms':>11}"
+          f"{'alloc B':>9}{'redraw ms':>11}")
+    for n in args.grids:
+        positions = [(0, 0), ((n - 1) * x_step, (n - 1) * y_step)]
+        canvas = OverviewCanvas(positions, OBJECTIVE)
+        full_gb = canvas.nbytes / canvas.scale ** 2 / 1e9
+        points = rng.uniform(0, 1, (args.repeat, 2)) * positions[1]
+        cycle = iter(points.tolist() * 2)
+
+        add = time_it(lambda: canvas.add_tile(tile, *next(cycle)), args.repeat - 1)
+        size = canvas.describe()["size"]
+        small = (max(1, round(tile.shape[1] * canvas.scale)), max(1, round(tile.shape[0] * canvas.scale)))
+        direct = time_it(lambda: cv2.resize(tile, small, interpolation=cv2.INTER_AREA), args.repeat)
+
+        tracemalloc.start()
+        for x, y in points.tolist():
+            canvas.add_tile(tile, x, y)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        display = canvas.snapshot()
+        redraw = time_it(lambda: canvas.snapshot(display), 10)
+        print(f"{f'{n}x{n}':>11}{canvas.scale:>9.4f}{f'{size[0]}x{size[1]}':>13}{canvas.nbytes / 2 ** 20:>7.1f}"
+              f"{full_gb:>9.1f}{1000 * add:>8.2f}{1000 * direct:>11.2f}{allocated / len(points):>9.0f}"
+              f"{1000 * redraw:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: pixel calibration accuracy and the tiles calibrated steps save.
+
+For each objective, the simulated camera is given a true pixel size that
+differs from the nominal one (--pixel-scale) and a rotation against the stage
+(--rotation). The calibration is measured by stage moves and phase
+correlation and compared with the truth. Then a region is planned with the
+fixed STEP_SIZES_BY_OBJECTIVE table and with calibrated steps for --overlap
+percent. For both, the table shows the tile count and the overlap the steps
+really give with the true field of view (negative means gaps).
+
+    python benchmarks/bench_pixel_calibration.py --rotation 0.8 --pixel-scale 1.03 --overlap 10
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool.objectives import um_per_pixel
+from microscope_scan_tool.pixel_calibration import PixelCalibration, measure_pixel_calibration
+from microscope_scan_tool.scan_plan import OBJECTIVE_TO_POSITION, STEP_SIZES_BY_OBJECTIVE, count_tiles
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage
+
+REGION = (377710, 370232, 35672, 42606)  # the GUI's default bounds
+CALIBRATION_SITE = (60000, 375000)
+
+
+def calibrate(objective, rotation, pixel_scale):
+    simulator = SimulatedMicroscope(stage=SimulatedStage(seed=0), camera_rotation=rotation, pixel_scale=pixel_scale)
+    core = simulator.core
+    core.set_property("Objective", "Label", OBJECTIVE_TO_POSITION[objective])
+    core.set_xy_position(*CALIBRATION_SITE)
+    core.wait_for_device(core.get_xy_stage_device())
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        calibration = measure_pixel_calibration(core, simulator.open_camera(), objective)
+    return calibration, time.perf_counter() - start
+
+
+def true_overlap(steps, truth):
+    width, height = truth.covered_field()
+    return 100.0 * (1 - steps[0] / width), 100.0 * (1 - steps[1] / height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rotation", type=float, default=0.8, help="true camera rotation in degrees")
+    parser.add_argument("--pixel-scale", type=float, default=1.03, help="true / nominal pixel size")
+    parser.add_argument("--overlap", type=float, default=10.0, help="target tile overlap in percent")
+    args = parser.parse_args()
+
+    print(f"True camera: rotation {args.rotation:+.2f}°, pixel size x{args.pixel_scale:g} of nominal\n")
+    print(f"{'objective':<10}{'um/px true':>11}{'measured':>10}{'error %':>9}{'rot err °':>10}{'misfit px':>11}"
+          f"{'s':>7}")
+    results = {}
+    for objective in STEP_SIZES_BY_OBJECTIVE:
+        calibration, elapsed = calibrate(objective, args.rotation, args.pixel_scale)
+        true_um = um_per_pixel(objective) * args.pixel_scale
+        measured = sum(calibration.um_per_px) / 2
+        print(f"{objective:<10}{true_um:>11.4f}{measured:>10.4f}{100 * (measured / true_um - 1) + 0.0:>9.3f}"
+              f"{calibration.rotation_deg - args.rotation + 0.0:>10.3f}{calibration.residual_px:>11.2f}{elapsed:>7.2f}")
+        truth = PixelCalibration(objective, (true_um, true_um), args.rotation, calibration.size)
+        results[objective] = (calibration, truth)
+
+    print(f"\nRegion {REGION}, target overlap {args.overlap:g}%\n")
+    print(f"{'objective':<10}{'steps':<10}{'step um':>14}{'tiles':>8}{'true overlap %':>18}")
+    for objective, (calibration, truth) in results.items():
+        for name, steps in (("fixed", STEP_SIZES_BY_OBJECTIVE[objective]),
+                            ("measured", calibration.step_sizes(args.overlap))):
+            ox, oy = true_overlap(steps, truth)
+            print(f"{objective:<10}{name:<10}{steps[0]:>7} x {steps[1]:<5}{count_tiles(*REGION, *steps):>7}"
+                  f"{ox:>10.1f} x {oy:.1f}")
+
+
+if __name__ == "__main__":
+    main()
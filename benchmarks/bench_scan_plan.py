@@ -0,0 +1,91 @@
+"""
+Benchmark: tile grid generation, old list loop versus the NumPy grid engine.
+
+Plans the whole safe stage area at a given step size three ways: the former
+while-loop that builds a list of tuples (bounding-box check only), calc_positions
+(NumPy grid clipped to the safe polygon, returned as a list) and iter_grid
+streamed into a GridSummary (nothing materialised). Reports time, peak traced
+memory and the tiles the bounding-box check would have accepted outside the
+safe polygon.
+
+    python benchmarks/bench_scan_plan.py --step 20
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import scan_plan
+from microscope_scan_tool.scan_plan import GridSummary, calc_positions, iter_grid, points_in_polygon
+
+
+def legacy_positions(y_top, y_bottom, x_left, x_right, x_step, y_step):
+    """
+    The former calc_positions loop (bounding box already checked).
+    """
+    positions = []
+    y = int(y_top)
+    move_right = True
+    x_positions_fixed = list(range(int(x_left), int(x_right) + 1, x_step))
+    while y >= int(y_bottom):
+        row = x_positions_fixed if move_right else list(reversed(x_positions_fixed))
+        positions.extend([(x, y) for x in row])
+        y -= y_step
+        move_right = not move_right
+    return positions
+
+
+def streamed_summary(*bounds):
+    summary = GridSummary(bounds[4], bounds[5])
+    for chunk in iter_grid(*bounds):
+        summary.add(chunk)
+    return summary
+
+
+def measure(func, *args):
+    """
+    (result, seconds, peak traced MB). Timed and traced in separate runs, since tracing
+    slows down allocating many small tuples far more than array code.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        del result
+        tracemalloc.start()
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--step", type=int, default=20, help="X and Y step in µm")
+    args = parser.parse_args()
+
+    bounds = (scan_plan.HARD_Y_MAX, scan_plan.HARD_Y_MIN, scan_plan.HARD_X_MIN, scan_plan.HARD_X_MAX,
+              args.step, args.step)
+    print(f"Safe area bounding box at {args.step} µm steps\n")
+    print(f"{'method':<22}{'tiles':>12}{'s':>9}{'peak MB':>10}")
+    legacy, elapsed, peak = measure(legacy_positions, *bounds)
+    print(f"{'list loop (bbox)':<22}{len(legacy):>12}{elapsed:>9.2f}{peak:>10.1f}")
+    xy = np.asarray(legacy)
+    outside = int((~points_in_polygon(xy[:, 0], xy[:, 1])).sum())
+    del legacy, xy
+    positions, elapsed, peak = measure(calc_positions, *bounds)
+    print(f"{'calc_positions':<22}{len(positions):>12}{elapsed:>9.2f}{peak:>10.1f}")
+    del positions
+    summary, elapsed, peak = measure(streamed_summary, *bounds)
+    print(f"{'iter_grid summary':<22}{summary.tiles:>12}{elapsed:>9.2f}{peak:>10.1f}")
+    print(f"\nTiles outside the safe polygon accepted by the bounding-box check: {outside}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+End-to-end scan throughput benchmark against the simulated microscope.
+
+Runs full snake_like_scan jobs for 4x and 20x grids and reports tiles/sec,
+time spent per phase and peak traced memory.
+
+    python benchmarks/bench_scan_throughput.py
+    python benchmarks/bench_scan_throughput.py --grid 20x=30x30 --no-pipeline
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import acquisition_pipeline, image_capture, logger, scan_logic, scan_plan
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage
+
+SCAN_CENTRE = (60000, 375000)  # inside HARD_BOUNDARY_CORNERS
+DEFAULT_GRIDS = ["4x=6x6", "20x=15x15"]
+
+
+class PhaseTimer:
+    """
+    Accumulates wall time of wrapped module functions, keyed by phase name.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+        self._patched = []
+
+    def wrap(self, module, name, phase):
+        original = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.totals[phase] += time.perf_counter() - start
+                    self.counts[phase] += 1
+
+        setattr(module, name, timed)
+        self._patched.append((module, name, original))
+
+    def restore(self):
+        for module, name, original in reversed(self._patched):
+            setattr(module, name, original)
+        self._patched.clear()
+
+
+def grid_bounds(objective, cols, rows):
+    x_step, y_step = scan_plan.STEP_SIZES_BY_OBJECTIVE[objective]
+    cx, cy = SCAN_CENTRE
+    x_left = cx - (cols - 1) * x_step / 2
+    y_top = cy + (rows - 1) * y_step / 2
+    return y_top, y_top - (rows - 1) * y_step, x_left, x_left + (cols - 1) * x_step
+
+
+def run_grid(objective, cols, rows, pipelined, time_scale, out_dir, compression=None):
+    simulator = use_simulator(SimulatedMicroscope(stage=SimulatedStage(time_scale=time_scale, seed=0)))
+    logger.BASE_SAVE_DIR = out_dir
+
+    timer = PhaseTimer()
+    timer.wrap(scan_logic, "move_stage", "move")
+    timer.wrap(image_capture, "grab_frame", "grab")
+    timer.wrap(image_capture, "save_frame", "process+write")
+    timer.wrap(acquisition_pipeline, "save_frame", "process+write")
+
+    y_top, y_bottom, x_left, x_right = grid_bounds(objective, cols, rows)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            scan_dir = scan_logic.snake_like_scan(y_top, y_bottom, x_left, x_right,
+                                                  objective_label=objective, pipelined=pipelined,
+                                                  compression=compression)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timer.restore()
+        use_micromanager()
+
+    tile_files = [os.path.join(scan_dir, n) for n in os.listdir(scan_dir) if n.startswith("tile_")] if scan_dir else []
+    tiles = len(tile_files)
+    return {
+        "objective": objective,
+        "tiles": tiles,
+        "elapsed": elapsed,
+        "phases": {k: (timer.totals[k], timer.counts[k]) for k in timer.totals},
+        "peak_mb": peak / 1e6,
+        "stage_moves": simulator.core.stage.move_count,
+        "disk_mb": sum(os.path.getsize(p) for p in tile_files) / 1e6,
+    }
+
+
+def print_result(result, pipelined):
+    tiles = result["tiles"]
+    mode = "pipelined" if pipelined else "sequential"
+    print(f"\n{result['objective']} ({mode}): {tiles} tiles in {result['elapsed']:.2f} s "
+          f"-> {tiles / result['elapsed']:.2f} tiles/s, peak traced memory {result['peak_mb']:.1f} MB, "
+          f"{result['disk_mb']:.0f} MB written")
+    for phase, (total, count) in sorted(result["phases"].items()):
+        print(f"  {phase:<14} {total:8.2f} s total  {1000 * total / max(count, 1):8.1f} ms/call  ({count} calls)")
+    # Background writes overlap the scan loop, so only foreground phases add up to wall time
+    foreground = [p for p in result["phases"] if not (pipelined and p == "process+write")]
+    accounted = sum(result["phases"][p][0] for p in foreground)
+    print(f"  {'other':<14} {max(result['elapsed'] - accounted, 0.0):8.2f} s (setup, camera start, metadata)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid", action="append",
+                        help="objective=COLSxROWS, may be repeated (default: %s)" % " ".join(DEFAULT_GRIDS))
+    parser.add_argument("--no-pipeline", action="store_true", help="use the sequential capture path")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="speed factor for the simulated stage physics")
+    parser.add_argument("--compression", default=None,
+                        help="tile codec (none, zlib, zstd, lzw, webp; default: none)")
+    parser.add_argument("--keep", action="store_true", help="keep the scan output folder")
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp(prefix="scan_bench_")
+    try:
+        for spec in args.grid or DEFAULT_GRIDS:
+            objective, size = spec.split("=")
+            cols, rows = (int(v) for v in size.lower().split("x"))
+            result = run_grid(objective, cols, rows, not args.no_pipeline, args.time_scale, out_dir,
+                              args.compression)
+            print_result(result, not args.no_pipeline)
+    finally:
+        if args.keep:
+            print(f"\nScan output kept in {out_dir}")
+        else:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
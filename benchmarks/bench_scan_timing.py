@@ -0,0 +1,92 @@
+"""
+Benchmark: cost of the per-tile timing hooks, and a sample performance report.
+
+Measures the per-call cost of scan_timing.record() with timing off and on,
+runs the same simulated scan with timing off and on (wall time of each), and
+prints the report the timed scan logged (phase percentiles, tiles/hour,
+stage busy/idle, slowest tiles).
+
+    python benchmarks/bench_scan_timing.py --grid 20x=10x10
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import logger, scan_logic, scan_plan, scan_timing
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.simulator import SimulatedMicroscope, SimulatedStage
+
+SCAN_CENTRE = (60000, 375000)
+
+
+def hook_cost(calls, out_dir):
+    """
+    ns per record() call with timing off and with timing on.
+    """
+    costs = []
+    for active in (False, True):
+        if active:
+            scan_timing.start(out_dir)
+            scan_timing.begin_tile(1, 0, 0)
+        start = time.perf_counter()
+        for _ in range(calls):
+            scan_timing.record("grab", time.perf_counter())
+        costs.append(1e9 * (time.perf_counter() - start) / calls)
+        scan_timing._active = None  # discard without writing a file
+    scan_timing.set_tile(None)
+    return costs
+
+
+def run_scan(objective, cols, rows, pipelined, timing, out_dir):
+    use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0)))
+    logger.BASE_SAVE_DIR = out_dir
+    x_step, y_step = scan_plan.STEP_SIZES_BY_OBJECTIVE[objective]
+    x_left = SCAN_CENTRE[0] - (cols - 1) * x_step / 2
+    y_top = SCAN_CENTRE[1] + (rows - 1) * y_step / 2
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            scan_dir = scan_logic.snake_like_scan(y_top, y_top - (rows - 1) * y_step, x_left,
+                                                  x_left + (cols - 1) * x_step, objective,
+                                                  pipelined=pipelined, timing=timing)
+    finally:
+        use_micromanager()
+    return scan_dir, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grid", default="20x=10x10", help="objective=COLSxROWS")
+    parser.add_argument("--calls", type=int, default=1_000_000, help="record() calls for the hook cost")
+    parser.add_argument("--no-pipeline", action="store_true", help="use the sequential capture path")
+    parser.add_argument("--keep", action="store_true", help="keep the scan output folders")
+    args = parser.parse_args()
+
+    objective, size = args.grid.split("=")
+    cols, rows = (int(v) for v in size.lower().split("x"))
+    out_dir = tempfile.mkdtemp(prefix="bench_timing_")
+    try:
+        off, on = hook_cost(args.calls, out_dir)
+        print(f"record() incl. perf_counter(): {off:.0f} ns/call with timing off, {on:.0f} ns/call with timing on")
+
+        pipelined = not args.no_pipeline
+        _, untimed = run_scan(objective, cols, rows, pipelined, False, out_dir)
+        scan_dir, timed = run_scan(objective, cols, rows, pipelined, True, out_dir)
+        print(f"{objective} {cols}x{rows} scan: {untimed:.2f} s untimed, {timed:.2f} s timed\n")
+        for line in scan_timing.summary_lines(scan_timing.load_timings(scan_dir)):
+            print(line)
+    finally:
+        if args.keep:
+            print(f"\nScans kept in {out_dir}")
+        else:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
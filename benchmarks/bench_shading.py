@@ -0,0 +1,155 @@
+"""
+Benchmark: flat-field estimation accuracy and the cost of shading correction.
+
+The simulated camera darkens the frame corners (vignetting) and adds a black
+level offset. Flat fields are obtained two ways:
+  blank slide    averaged frames of glass at a few positions, plus a dark frame
+  retrospective  per-pixel percentile over the tiles of a simulated 4x scan
+and compared with the true illumination profile (RMS error, and the residual
+corner/centre brightness of a corrected glass frame). The per-frame cost of
+the capture-path preprocessing is reported with white balance only and with
+white balance fused with the shading correction.
+
+    python benchmarks/bench_shading.py --vignetting 0.3 --grid 6x6
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microscope_scan_tool import logger, scan_logic, scan_plan, shared_state
+from microscope_scan_tool.hardware import use_micromanager, use_simulator
+from microscope_scan_tool.preprocessing import TilePreprocessor
+from microscope_scan_tool.objectives import FRAME_SIZE
+from microscope_scan_tool.shading_correction import (ShadingCalibration, acquire_dark_frame, acquire_flat_field,
+                                                     estimate_flat_from_scan)
+from microscope_scan_tool.simulator import GLASS_BGR, SimulatedMicroscope, SimulatedStage, VirtualSlide
+
+SCAN_CENTRE = (60000, 375000)
+
+
+class BlankSlide(VirtualSlide):
+    def render(self, cx, cy, um_per_px, width, height, rotation=0.0):
+        return np.full((height, width, 3), GLASS_BGR, dtype=np.uint8)
+
+
+def truth(camera, shape):
+    profile = camera.vignette_map(shape)[::-1, ::-1]  # the camera flips frames after vignetting
+    return profile / profile.reshape(-1, 3).mean(axis=0)
+
+
+def residual(calibration, camera, shape):
+    """
+    (RMS error of the flat in %, corner/centre brightness of a corrected glass frame).
+    """
+    flat = calibration.full_flat()
+    true = truth(camera, shape)
+    rms = float(np.sqrt(np.mean((flat / true - 1) ** 2)))
+    corrected = true / flat
+    h, w = shape[:2]
+    corner = corrected[:h // 10, :w // 10].mean()
+    centre = corrected[h * 9 // 20:h * 11 // 20, w * 9 // 20:w * 11 // 20].mean()
+    return rms, corner / centre
+
+
+def blank_slide_flat(args):
+    microscope = use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0), slide=BlankSlide(seed=0),
+                                                   vignetting=args.vignetting, dark_level=args.dark_level))
+    camera = microscope.open_camera()
+    try:
+        start = time.perf_counter()
+        camera.light = False
+        dark = acquire_dark_frame(camera, args.frames)
+        camera.light = True
+        positions = [(SCAN_CENTRE[0] + 500 * i, SCAN_CENTRE[1]) for i in range(3)]
+        calibration = acquire_flat_field(camera, "4x", microscope.core, positions, args.frames, dark)
+        elapsed = time.perf_counter() - start
+        shape = (calibration.size[1], calibration.size[0], 3)
+        return calibration, elapsed, residual(calibration, camera, shape)
+    finally:
+        camera.release()
+        use_micromanager()
+
+
+def retrospective_flat(args, out_dir):
+    microscope = use_simulator(SimulatedMicroscope(stage=SimulatedStage(seed=0), vignetting=args.vignetting,
+                                                   dark_level=args.dark_level))
+    logger.BASE_SAVE_DIR = out_dir
+    cols, rows = (int(v) for v in args.grid.lower().split("x"))
+    x_step, y_step = scan_plan.STEP_SIZES_BY_OBJECTIVE["4x"]
+    x_left = SCAN_CENTRE[0] - (cols - 1) * x_step / 2
+    y_top = SCAN_CENTRE[1] + (rows - 1) * y_step / 2
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            scan_dir = scan_logic.snake_like_scan(y_top, y_top - (rows - 1) * y_step, x_left,
+                                                  x_left + (cols - 1) * x_step, "4x", pipelined=True)
+        start = time.perf_counter()
+        calibration = estimate_flat_from_scan(scan_dir, percentile=args.percentile)
+        elapsed = time.perf_counter() - start
+        camera = microscope.open_camera()
+        shape = (calibration.size[1], calibration.size[0], 3)
+        return calibration, elapsed, residual(calibration, camera, shape)
+    finally:
+        use_micromanager()
+
+
+def preprocessing_cost(calibration, repeat):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (calibration.size[1], calibration.size[0], 3), dtype=np.uint8)
+    preprocessor = TilePreprocessor()
+    shared_state.state.set_white_balance(on=True, medians=[180.0, 200.0, 210.0])
+    timings = []
+    for active in (None, calibration):
+        shared_state.state.shading_calibration = active
+        preprocessor.process_tile(frame)  # builds the LUT / gain map
+        start = time.perf_counter()
+        for _ in range(repeat):
+            preprocessor.process_tile(frame)
+        timings.append(1000 * (time.perf_counter() - start) / repeat)
+    shared_state.state.shading_calibration = None
+    shared_state.state.set_white_balance(on=False)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vignetting", type=float, default=0.3, help="corner brightness loss of the camera")
+    parser.add_argument("--dark-level", type=int, default=8, help="black level offset (counts)")
+    parser.add_argument("--frames", type=int, default=16, help="frames averaged per blank-slide position")
+    parser.add_argument("--grid", default="6x6", help="4x scan used for the retrospective estimate")
+    parser.add_argument("--percentile", type=float, default=80.0)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--keep", action="store_true", help="keep the simulated scan folder")
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp(prefix="bench_shading_")
+    try:
+        print(f"Vignetting {args.vignetting:.0%}, black level {args.dark_level}\n")
+        print(f"{'flat field':<16}{'time s':>8}{'RMS error':>11}{'corner/centre':>15}")
+        camera = SimulatedMicroscope(vignetting=args.vignetting).open_camera()
+        rms, ratio = residual(ShadingCalibration(np.ones((8, 8, 3))), camera, (FRAME_SIZE[1], FRAME_SIZE[0], 3))
+        print(f"{'none':<16}{'':>8}{rms:>10.1%}{ratio:>15.2f}")
+        for name, run in (("blank slide", lambda: blank_slide_flat(args)),
+                          ("retrospective", lambda: retrospective_flat(args, out_dir))):
+            calibration, elapsed, (rms, ratio) = run()
+            print(f"{name:<16}{elapsed:>8.1f}{rms:>10.1%}{ratio:>15.2f}")
+
+        wb_only, fused = preprocessing_cost(calibration, args.repeat)
+        print(f"\nPreprocessing per {calibration.size[0]}x{calibration.size[1]} frame: "
+              f"white balance LUT {wb_only:.1f} ms, white balance + shading {fused:.1f} ms")
+    finally:
+        if args.keep:
+            print(f"\nScan kept in {out_dir}")
+        else:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
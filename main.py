@@ -1,7 +1,4 @@
 import threading
-from microscope_scan_tool.camera_preview import live_camera_preview
-from microscope_scan_tool.user_input_gui import get_user_inputs
-from microscope_scan_tool.scan_logic import snake_like_scan
 
 
 # ========== DEFAULTS ==========
@@ -9,6 +6,11 @@ fields = ["y_top", "y_bottom", "x_left", "x_right"]
 default_values = ["377710", "370232", "35672", "42606"]
 
 def main():
+    # Imported here so that importing main stays cheap (cv2, tkinter and the scan stack load on launch)
+    from microscope_scan_tool.camera_preview import live_camera_preview
+    from microscope_scan_tool.user_input_gui import get_user_inputs
+    from microscope_scan_tool.scan_logic import snake_like_scan
+
     # Start live camera in background thread
     camera_thread = threading.Thread(target=live_camera_preview, daemon=True)
     camera_thread.start()
@@ -16,10 +18,7 @@ def main():
     # Show GUI for user input
     user_inputs = get_user_inputs(fields, default_values)
 
-    # Wait for the camera thread to close
-    camera_thread.join()
-
-    # If valid inputs were returned, begin scan
+    # If valid inputs were returned, begin scan (the preview stays live meanwhile)
     if user_inputs:
         snake_like_scan(
             float(user_inputs["y_top"]),
@@ -27,8 +26,13 @@ def main():
             float(user_inputs["x_left"]),
             float(user_inputs["x_right"]),
             objective_label=user_inputs["objective_label"],
-            dry_run= False
+            dry_run= False,
+            pipelined=True
         )
+        print(" Close the preview window (or press 'q') to exit.")
+
+    # Wait for the camera thread to close
+    camera_thread.join()
 
 if __name__ == "__main__":
     try:
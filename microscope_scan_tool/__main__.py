@@ -0,0 +1,3 @@
+from microscope_scan_tool.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from microscope_scan_tool import scan_timing
+from microscope_scan_tool.image_capture import save_frame
+from microscope_scan_tool.logger import log_error
+from microscope_scan_tool.tile_compression import NO_COMPRESSION
+
+WRITER_WORKERS = 2
+MAX_PENDING_FRAMES = 8  # raw 1920x1080 frames are ~6 MB each
+
+
+class TileWriterPool:
+    """
+    Processes and writes captured frames on background threads so the scan loop
+    only has to move the stage and grab frames.
+
+    At most `max_pending` frames are held at once; `submit` blocks when the pool
+    is full, so a slow disk throttles the stage instead of filling memory.
+    """
+
+    def __init__(self, save_dir, workers=WRITER_WORKERS, max_pending=MAX_PENDING_FRAMES,
+                 mosaic=None, write_tiles=True, compression=NO_COMPRESSION, journal=None):
+        self.save_dir = save_dir
+        self.mosaic = mosaic
+        self.write_tiles = write_tiles
+        self.compression = compression
+        self.journal = journal
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile-writer")
+        self._pending = []  # (index, x, y, actual, future) in acquisition order
+
+    def _save(self, frame, index, x, y, actual):
+        scan_timing.set_tile(index)
+        filename = save_frame(frame, self.save_dir, index, x, y, mosaic=self.mosaic,
+                              write_tile=self.write_tiles, compression=self.compression)
+        if self.journal is not None and self.write_tiles and filename:
+            self.journal.record_tile(index, x, y, actual, filename)
+        return filename
+
+    def submit(self, frame, index, x, y, actual=None):
+        """
+        Queues a raw frame for white balance, flip, compression and TIFF write.
+        With a journal, the tile is recorded (at commanded (x, y) and the read-back
+        `actual` position) once its file is on disk.
+        Blocks while `max_pending` frames are still in flight.
+        """
+        start = time.perf_counter()
+        self._slots.acquire()
+        scan_timing.record("queue", start)
+        try:
+            future = self._executor.submit(self._save, frame, index, x, y, actual)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def on_done(f):
+            self._slots.release()
+            if f.exception() is not None:
+                log_error(f"Failed to write tile {index} at ({x}, {y}): {f.exception()}", tile=index, x=x, y=y)
+
+        future.add_done_callback(on_done)
+        self._pending.append((index, x, y, actual, future))
+
+    def finish(self, use_actual=False):
+        """
+        Waits for every queued tile and returns [(filename, x, y)] in acquisition order,
+        with the `actual` positions instead of the commanded ones if use_actual=True.
+        Tiles whose write failed are left out (they were already logged by index).
+        """
+        self._executor.shutdown(wait=True)
+
+        positions = []
+        for index, x, y, actual, future in self._pending:
+            if future.exception() is not None:
+                continue
+            filename = future.result()
+            if filename:
+                positions.append((filename,) + (tuple(actual) if use_actual and actual is not None else (x, y)))
+
+        self._pending.clear()
+        return positions
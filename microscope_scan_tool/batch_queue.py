@@ -0,0 +1,355 @@
+"""
+Batch scanning: a queue of scan jobs (regions or slides) read from a JSON
+job file and run unattended.
+
+    {
+      "defaults": {"objective": "20x", "pipelined": true, "compression": "zstd"},
+      "jobs": [
+        {"name": "slide1_A", "y_top": 377710, "y_bottom": 370232, "x_left": 35672, "x_right": 42606},
+        {"name": "slide1_B", "objective": "4x", "y_top": 389000, "y_bottom": 385000,
+         "x_left": 50000, "x_right": 56000, "flat_field": true,
+         "white_balance": {"medians": [231, 236, 238], "scale": 1.2}}
+      ]
+    }
+
+Apart from name, the four bounds (µm), objective and white_balance, every job
+key is passed to snake_like_scan as a keyword argument; unknown keys are
+rejected when the file is loaded. Jobs without white_balance are scanned with
+white balance off.
+
+schedule_jobs() runs all jobs of one objective before switching the turret
+(starting with the objective already in place). Within an objective, the next
+region is the one whose first tile is quickest to reach from where the
+previous scan ended. run_batch() scans the jobs in that order, each into its
+own folder under the batch folder. A failing job is logged and recorded, and
+the batch moves on. batch_report.json is rewritten after every job; running a
+batch again into the same folder skips the jobs that are already done.
+
+    python -m microscope_scan_tool.batch_queue jobs.json [--dry-run] [--batch-dir DIR] [--simulator]
+"""
+import argparse
+import inspect
+import json
+import os
+import re
+import time
+import traceback
+from datetime import datetime
+
+import numpy as np
+
+from microscope_scan_tool import logger, scan_plan, shared_state
+from microscope_scan_tool.logger import close_scan_log, log_debug, log_error
+from microscope_scan_tool.mm_session import get_session
+from microscope_scan_tool.path_planner import DEFAULT_PROFILE, move_times
+from microscope_scan_tool.pixel_calibration import load_pixel_calibration
+from microscope_scan_tool.stage_settling import read_xy
+
+REPORT_FILENAME = "batch_report.json"
+BOUND_KEYS = ("y_top", "y_bottom", "x_left", "x_right")
+
+
+class ScanJob:
+    """
+    One region to scan: bounds (µm), objective, optional white balance
+    ({"medians": [b, g, r], "scale": s}) and snake_like_scan options.
+    """
+
+    def __init__(self, name, y_top, y_bottom, x_left, x_right, objective="4x", white_balance=None, options=None):
+        self.name = name
+        self.y_top, self.y_bottom, self.x_left, self.x_right = y_top, y_bottom, x_left, x_right
+        self.objective = objective
+        self.white_balance = white_balance
+        self.options = dict(options or {})
+        self._positions = None
+
+    def __repr__(self):
+        return f"ScanJob({self.name!r}, {self.objective})"
+
+    def positions(self):
+        """
+        Planned serpentine tile positions, or None if the region is outside the stage limits.
+        """
+        if self._positions is None:
+            # The same plan as snake_like_scan makes for this job
+            overlap = self.options.get("overlap")
+            pixels = load_pixel_calibration(self.objective)
+            x_step, y_step = scan_plan.step_sizes(self.objective, overlap, pixels)
+            self._positions = scan_plan.calc_positions(self.y_top, self.y_bottom, self.x_left, self.x_right,
+                                                       x_step, y_step,
+                                                       fov=scan_plan.tile_footprint(self.objective, pixels)) or []
+        return self._positions or None
+
+
+def load_jobs(path):
+    """
+    Reads a job file (see the module docstring; a bare list of jobs also works).
+    Raises ValueError naming the job for missing bounds, unknown objectives or options.
+    """
+    from microscope_scan_tool import scan_logic
+
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {"jobs": spec}
+    defaults = spec.get("defaults", {})
+    options = set(inspect.signature(scan_logic.snake_like_scan).parameters) - set(BOUND_KEYS) - {"objective_label"}
+
+    jobs = []
+    names = set()
+    for n, entry in enumerate(spec.get("jobs", []), start=1):
+        fields = {**defaults, **entry}
+        name = str(fields.pop("name", f"job{n:03d}"))
+        if name in names:
+            raise ValueError(f"Job '{name}' is listed twice")
+        names.add(name)
+        missing = [key for key in BOUND_KEYS if key not in fields]
+        if missing:
+            raise ValueError(f"Job '{name}': missing {', '.join(missing)}")
+        bounds = [float(fields.pop(key)) for key in BOUND_KEYS]
+        objective = fields.pop("objective", "4x")
+        if objective not in scan_plan.OBJECTIVE_TO_POSITION:
+            raise ValueError(f"Job '{name}': unknown objective '{objective}'")
+        white_balance = fields.pop("white_balance", None)
+        unknown = sorted(set(fields) - options)
+        if unknown:
+            raise ValueError(f"Job '{name}': unknown option(s) {', '.join(unknown)}")
+        jobs.append(ScanJob(name, *bounds, objective=objective, white_balance=white_balance, options=fields))
+    return jobs
+
+
+def schedule_jobs(jobs, current_objective=None, start=None, profile=DEFAULT_PROFILE):
+    """
+    Orders jobs for the fewest turret switches and the least stage travel: one
+    group per objective (current_objective first, then in file order); within
+    a group, the job whose first tile is quickest to reach from the end of the
+    previous scan (or from `start`) goes next. Jobs outside the stage limits go last.
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.objective, []).append(job)
+
+    scheduled, invalid = [], []
+    position = start
+    for objective in sorted(groups, key=lambda o: o != current_objective):
+        remaining = [job for job in groups[objective] if job.positions()]
+        invalid.extend(job for job in groups[objective] if not job.positions())
+        while remaining:
+            job = remaining[0]
+            if position is not None:
+                entries = np.array([j.positions()[0] for j in remaining], dtype=np.float64)
+                times = move_times(np.broadcast_to(np.asarray(position, dtype=np.float64), entries.shape), entries,
+                                   profile)
+                job = remaining[int(np.argmin(times))]
+            remaining.remove(job)
+            scheduled.append(job)
+            position = job.positions()[-1]
+    return scheduled + invalid
+
+
+def schedule_cost(jobs, current_objective=None, start=None, profile=DEFAULT_PROFILE):
+    """
+    (turret switches, estimated seconds of stage travel between jobs) for running jobs in the given order.
+    """
+    switches, travel = 0, 0.0
+    objective, position = current_objective, start
+    for job in jobs:
+        if not job.positions():
+            continue
+        if job.objective != objective:
+            switches += objective is not None
+            objective = job.objective
+        if position is not None:
+            travel += float(move_times(np.asarray([position], dtype=np.float64),
+                                       np.asarray([job.positions()[0]], dtype=np.float64), profile)[0])
+        position = job.positions()[-1]
+    return switches, travel
+
+
+def _microscope_state():
+    """
+    (objective label, stage (x, y)) the microscope is at now; None for what cannot be read.
+    """
+    try:
+        core = get_session()
+    except Exception:
+        return None, None
+    objective = position = None
+    try:
+        label = core.get_property("Objective", "Label")
+        objective = next((k for k, v in scan_plan.OBJECTIVE_TO_POSITION.items() if v == label), None)
+    except Exception:
+        pass
+    try:
+        position = read_xy(core)
+    except Exception:
+        pass
+    return objective, position
+
+
+def run_job(job, dry_run=False):
+    """
+    Scans one job with its white balance and options. Returns the scan folder
+    (None if the scan did not run, or for a dry run).
+    """
+    from microscope_scan_tool import scan_logic
+
+    wb = job.white_balance or {}
+    shared_state.state.set_white_balance(on=wb.get("medians") is not None, medians=wb.get("medians"),
+                                         scale=wb.get("scale", shared_state.DEFAULT_WHITE_BALANCE_SCALE))
+    options = dict(job.options)
+    if dry_run:
+        options["dry_run"] = True
+    return scan_logic.snake_like_scan(job.y_top, job.y_bottom, job.x_left, job.x_right,
+                                      objective_label=job.objective, **options)
+
+
+def load_report(batch_dir):
+    """
+    The batch_report.json of a batch folder, or None.
+    """
+    try:
+        with open(os.path.join(batch_dir, REPORT_FILENAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_report(batch_dir, report):
+    path = os.path.join(batch_dir, REPORT_FILENAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _folder_name(index, name):
+    return f"{index:03d}_" + re.sub(r"[^\w.-]+", "_", name)
+
+
+def run_batch(jobs, batch_dir=None, dry_run=False, schedule=True):
+    """
+    Runs jobs one after another (in schedule_jobs() order unless schedule=False),
+    each into its own folder under batch_dir (default: a new Batch_<timestamp>
+    folder). Failed jobs are logged and recorded, and the batch continues;
+    state.stop() or Ctrl+C ends it after the current job. Jobs already done in
+    an earlier run into the same batch_dir are skipped.
+    Returns the report, which is also saved as batch_report.json.
+    """
+    batch_dir = batch_dir or os.path.join(logger.BASE_SAVE_DIR, datetime.now().strftime("Batch_%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(batch_dir, exist_ok=True)
+    previous = {r["name"]: r for r in (load_report(batch_dir) or {}).get("jobs", []) if r["status"] == "done"}
+
+    objective, position = _microscope_state()
+    if schedule:
+        file_cost = schedule_cost(jobs, objective, position)
+        jobs = schedule_jobs(jobs, objective, position)
+        switches, travel = schedule_cost(jobs, objective, position)
+        print(f" Batch of {len(jobs)} jobs: {switches} objective switches (file order: {file_cost[0]}), "
+              f"~{travel:.0f} s travel between jobs (file order: ~{file_cost[1]:.0f} s)")
+
+    records = []
+    for job in jobs:
+        positions = job.positions()
+        records.append(previous.get(job.name) or {
+            "name": job.name, "objective": job.objective, "tiles": len(positions) if positions else 0,
+            "status": "pending" if positions else "invalid",
+        })
+    report = {"batch_dir": batch_dir, "started": datetime.now().isoformat(timespec="seconds"), "jobs": records}
+    _write_report(batch_dir, report)
+
+    base_dir = logger.BASE_SAVE_DIR
+    scanned_tiles, scanned_seconds = 0, 0.0
+    batch_start = time.perf_counter()
+    for k, (job, record) in enumerate(zip(jobs, records), start=1):
+        if record["status"] in ("done", "invalid"):
+            print(f" [{k}/{len(jobs)}] {job.name}: {record['status']}, skipped")
+            continue
+        if not shared_state.state.running:
+            print(" Batch stopped.")
+            break
+
+        remaining = sum(r["tiles"] for r in records[k - 1:] if r["status"] == "pending")
+        eta = ""
+        if scanned_tiles:
+            seconds = remaining * scanned_seconds / scanned_tiles
+            eta = f", ETA ~{seconds:.0f} s" if seconds < 120 else f", ETA ~{seconds / 60:.0f} min"
+        print(f" [{k}/{len(jobs)}] {job.name}: {record['tiles']} tiles at {job.objective}{eta}")
+        record.update(status="running", started=datetime.now().isoformat(timespec="seconds"))
+        _write_report(batch_dir, report)
+
+        interrupted = False
+        start = time.perf_counter()
+        logger.BASE_SAVE_DIR = os.path.join(batch_dir, _folder_name(k, job.name))
+        try:
+            scan_dir = run_job(job, dry_run)
+            record["scan_dir"] = scan_dir
+            if dry_run:
+                record["status"] = "dry-run"
+            elif scan_dir is None:
+                record.update(status="failed", error="scan did not run (see the console output)")
+            else:
+                record["status"] = "done"
+        except KeyboardInterrupt:
+            record["status"] = "interrupted"
+            interrupted = True
+        except Exception as e:
+            record.update(status="failed", error=f"{type(e).__name__}: {e}")
+            log_error(f" Job {job.name} failed: {e}")
+            log_debug(traceback.format_exc())
+        finally:
+            close_scan_log()
+            logger.BASE_SAVE_DIR = base_dir
+            record["seconds"] = round(time.perf_counter() - start, 1)
+            _write_report(batch_dir, report)
+        print(f" [{k}/{len(jobs)}] {job.name}: {record['status']} in {record['seconds']:.1f} s")
+        if record["status"] == "done":
+            scanned_tiles += record["tiles"]
+            scanned_seconds += record["seconds"]
+        if interrupted:
+            print(" Batch interrupted.")
+            break
+
+    report["seconds"] = round(time.perf_counter() - batch_start, 1)
+    _write_report(batch_dir, report)
+    for line in summary_lines(report):
+        print(line)
+    return report
+
+
+def summary_lines(report):
+    """
+    Per-job status and time of a batch report, and the totals.
+    """
+    lines = [f" Batch {report['batch_dir']}:"]
+    for record in report["jobs"]:
+        seconds = f"{record['seconds']:>8.1f} s" if "seconds" in record else " " * 10
+        error = f"  {record['error']}" if record.get("error") else ""
+        lines.append(f"   {record['name']:<24}{record['objective']:>4}{record['tiles']:>7} tiles"
+                     f"  {record['status']:<12}{seconds}{error}".rstrip())
+    counts = {}
+    for record in report["jobs"]:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    lines.append("   " + ", ".join(f"{n} {status}" for status, n in counts.items())
+                 + (f" in {report['seconds']:.0f} s" if "seconds" in report else ""))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a batch of scan jobs from a JSON job file.")
+    parser.add_argument("job_file")
+    parser.add_argument("--batch-dir", default=None, help="batch folder (re-use one to skip jobs already done)")
+    parser.add_argument("--dry-run", action="store_true", help="plan every job without moving the stage")
+    parser.add_argument("--no-schedule", action="store_true", help="run the jobs in file order")
+    parser.add_argument("--simulator", action="store_true", help="run against the simulated microscope")
+    args = parser.parse_args(argv)
+
+    if args.simulator:
+        from microscope_scan_tool.hardware import use_simulator
+        use_simulator()
+    report = run_batch(load_jobs(args.job_file), args.batch_dir, dry_run=args.dry_run,
+                       schedule=not args.no_schedule)
+    return 1 if any(r["status"] in ("failed", "interrupted") for r in report["jobs"]) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
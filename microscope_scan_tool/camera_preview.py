@@ -1,7 +1,13 @@
 import cv2
 import numpy as np
 from microscope_scan_tool import shared_state
-from microscope_scan_tool.white_balance_utils import apply_white_balance_to_frame
+from microscope_scan_tool.camera_service import FRAME_TIMEOUT, acquire_camera
+from microscope_scan_tool.overview_canvas import OverviewWindow
+from microscope_scan_tool.preprocessing import default_preprocessor
+
+PREVIEW_SIZE = (960, 540)
+PREVIEW_FPS = 30
+PREVIEW_FPS_DURING_SCAN = 5  # leaves the CPU to the scan while still showing live view
 
 
 def compute_patch_medians(frame, patch_coords):
@@ -13,98 +19,73 @@ def compute_patch_medians(frame, patch_coords):
 
 
 def live_camera_preview():
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    if not cap.isOpened():
+    state = shared_state.state
+    camera = acquire_camera()
+    if camera is None:
         print("Camera not detected.")
         return
 
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 540)
+    full = None
+    small = np.empty((PREVIEW_SIZE[1], PREVIEW_SIZE[0], 3), dtype=np.uint8)
+    last_seq = -1
+    overview_window = OverviewWindow()
+    box = {"start": None, "end": None, "drawing": False}  # patch box in display (flipped) coordinates
 
     cv2.namedWindow("Live Camera Preview", cv2.WINDOW_NORMAL)
     cv2.setWindowProperty("Live Camera Preview", cv2.WND_PROP_TOPMOST, 1)
 
     def mouse_event(event, x, y, flags, param):
-        if not shared_state.enable_patch_selection:
-            return
-
-        if shared_state.last_frame_snapshot is None:
+        if not state.patch_selection.is_set():
             return
 
-        # Unflip the coordinates (flip both horizontally and vertically)
-        frame_height, frame_width = shared_state.last_frame_snapshot.shape[:2]
-        x = frame_width - x
-        y = frame_height - y
-
         if event == cv2.EVENT_LBUTTONDOWN:
-            shared_state.selecting_box = True
-            shared_state.box_start = (x, y)
-            shared_state.box_end = None
-            shared_state.white_balance_on = False  # Disable previous WB during new draw
+            box["start"], box["end"], box["drawing"] = (x, y), None, True
+            state.set_white_balance(on=False)  # Disable previous WB during new draw
 
-        elif event == cv2.EVENT_MOUSEMOVE and shared_state.selecting_box:
-            shared_state.box_end = (x, y)
+        elif event == cv2.EVENT_MOUSEMOVE and box["drawing"]:
+            box["end"] = (x, y)
 
-        elif event == cv2.EVENT_LBUTTONUP and shared_state.selecting_box:
-            shared_state.selecting_box = False
-            shared_state.box_end = (x, y)
+        elif event == cv2.EVENT_LBUTTONUP and box["drawing"]:
+            box["drawing"] = False
 
-            # Compute white balance from the box
-            start, end = shared_state.box_start, shared_state.box_end
-            x1, y1 = min(start[0], end[0]), min(start[1], end[1])
-            x2, y2 = max(start[0], end[0]), max(start[1], end[1])
-            patch_coords = (y1, x1, y2 - y1, x2 - x1)
-
-            frame = shared_state.last_frame_snapshot
-            medians = compute_patch_medians(frame, patch_coords)
+            # Unflip the box (the display is rotated 180°). Mouse callbacks run on this
+            # thread inside waitKey, so `small` still holds the frame on screen.
+            (x1, y1), (x2, y2) = box["start"], (x, y)
+            frame_height, frame_width = small.shape[:2]
+            patch_coords = (frame_height - max(y1, y2), frame_width - max(x1, x2), abs(y2 - y1), abs(x2 - x1))
+            medians = compute_patch_medians(small, patch_coords)
 
+            state.finish_patch_selection(medians)
             if medians is not None:
-                shared_state.white_balance_medians = medians
-                shared_state.white_balance_on = True
                 print(" White balance enabled with medians:", medians)
             else:
                 print(" Empty patch selected.")
-                shared_state.white_balance_on = False
-
-            # Reset patch selection mode
-            shared_state.enable_patch_selection = False
-            shared_state.box_start = None
-            shared_state.box_end = None
+            box["start"] = box["end"] = None
 
     cv2.setMouseCallback("Live Camera Preview", mouse_event)
 
-    while shared_state.camera_running:
-        ret, frame = cap.read()
-        if not ret or frame is None:
+    while state.running:
+        full, last_seq, _ = camera.wait_for_frame(after_seq=last_seq, timeout=FRAME_TIMEOUT, out=full)
+        if full is None:
             break
+        frame = cv2.resize(full, PREVIEW_SIZE, dst=small, interpolation=cv2.INTER_AREA)
+
+        # Apply white balance if and only if it's active and valid (LUT, reused buffer)
+        display_frame = default_preprocessor.flip_for_display(default_preprocessor.white_balance(frame))
 
-        shared_state.last_frame_snapshot = frame.copy()
-
-        # Apply white balance if and only if it's active and valid
-        if (
-            shared_state.white_balance_on and
-            shared_state.white_balance_medians is not None and
-            shared_state.white_balance_scale is not None
-        ):
-            corrected = apply_white_balance_to_frame(frame)
-            display_frame = corrected
-        else:
-            display_frame = frame
-
-        # If drawing a box, show it on top of current frame
-        if shared_state.selecting_box and shared_state.box_start and shared_state.box_end:
-            box_frame = display_frame.copy()
-            cv2.rectangle(box_frame, shared_state.box_start, shared_state.box_end, (0, 0, 255), 2)
-            cv2.imshow("Live Camera Preview", cv2.flip(box_frame, -1))
-        else:
-            cv2.imshow("Live Camera Preview", cv2.flip(display_frame, -1))
+        # The box is drawn on the flipped display buffer, so `small` stays untouched for the patch medians
+        if box["drawing"] and box["end"] is not None:
+            cv2.rectangle(display_frame, box["start"], box["end"], (0, 0, 255), 2)
+        cv2.imshow("Live Camera Preview", display_frame)
+        overview_window.update(state.overview)
 
         if cv2.getWindowProperty("Live Camera Preview", cv2.WND_PROP_VISIBLE) < 1:
-            shared_state.camera_running = False
+            state.stop()
             break
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            shared_state.camera_running = False
+        fps = PREVIEW_FPS_DURING_SCAN if state.scanning.is_set() else PREVIEW_FPS
+        if cv2.waitKey(max(1, int(1000 / fps))) & 0xFF == ord('q'):
+            state.stop()
             break
 
-    cap.release()
-    cv2.destroyAllWindows()
\ No newline at end of file
+    camera.release()
+    cv2.destroyAllWindows()
@@ -0,0 +1,278 @@
+"""
+Shared camera acquisition service.
+
+One background thread owns the camera device and copies every frame into a
+preallocated ring buffer together with its sequence number and grab time.
+The live preview, white balance patch selection and the scan loop are all
+consumers of the same service, so the device is opened once and the preview
+keeps running while a scan acquires tiles.
+
+Consumers get the service from acquire_camera() and hand it back with
+release(); the device is closed when the last consumer releases it. The
+service also answers the cv2.VideoCapture calls the capture path uses
+(isOpened, read, set, get, release).
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from microscope_scan_tool.hardware import CAMERA_INDEX, open_camera
+from microscope_scan_tool.logger import log_error
+
+CAMERA_SIZE = (1920, 1080)
+RING_SIZE = 8               # frames kept; 1920x1080 BGR frames are ~6 MB each
+FRAME_TIMEOUT = 2.0         # seconds to wait for a frame before giving up
+MAX_GRAB_FAILURES = 30      # consecutive failed grabs before the service stops
+MAX_SKIPPED_FRAMES = 10     # queued frames skipped in a row before one is decoded anyway
+DEFAULT_FPS = 30.0
+
+_service = None
+_service_lock = threading.Lock()
+
+
+class CameraService:
+    """
+    Owns one camera device and keeps its most recent frames in a ring buffer.
+
+    Each slot holds a frame, its sequence number (increasing from 0), a
+    time.perf_counter() value its exposure is known to have started after, and
+    the time its grab returned (about the end of its exposure; NaN if unknown).
+
+    Grabs that return almost immediately were served from the driver queue, so
+    their exposure time is unknown; the thread skips decoding those and only
+    keeps frames whose grab had to wait for the sensor. Such a frame finished
+    exposing after its grab started, so it was exposed after (grab start - one
+    frame interval). This keeps the queue drained even when decoding is slower
+    than the frame rate, and frame_after(T) never returns a frame that saw the
+    stage before time T.
+    """
+
+    def __init__(self, size=CAMERA_SIZE, ring_size=RING_SIZE, index=CAMERA_INDEX, fps=None):
+        self.size = size
+        self.fps = fps  # None: use the rate the driver reports
+        self.ring_size = ring_size
+        self.index = index
+        self._cap = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._users = 0
+        self._frames = None
+        self._seqs = np.full(ring_size, -1, dtype=np.int64)
+        self._times = np.zeros(ring_size, dtype=np.float64)
+        self._grabbed = np.full(ring_size, np.nan, dtype=np.float64)
+        self._latest = -1
+        self._running = False
+
+    # --- lifecycle -------------------------------------------------------
+
+    def start(self):
+        """
+        Opens the device, allocates the ring from the first frame and starts the
+        acquisition thread. Returns False if the camera could not be opened.
+        """
+        cap = open_camera(self.index)
+        if not cap.isOpened():
+            return False
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.size[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.size[1])
+
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            cap.release()
+            return False
+
+        self._cap = cap
+        fps = self.fps or cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1.0 / (fps if fps and fps > 0 else DEFAULT_FPS)
+        self._frames = np.empty((self.ring_size,) + frame.shape, dtype=frame.dtype)
+        self._store(frame, 0.0)  # exposure time unknown
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera-service", daemon=True)
+        self._thread.start()
+        print(f"Camera resolution set to: {frame.shape[1]}x{frame.shape[0]}")
+        return True
+
+    def _run(self):
+        failures = 0
+        skipped = 0
+        exposed_after = 0.0
+        while not self._stop.is_set():
+            grab_start = time.perf_counter()
+            ok = self._cap.grab()
+            grab_end = time.perf_counter()
+            waited = grab_end - grab_start >= self.frame_interval / 2
+            if ok and not waited and skipped < MAX_SKIPPED_FRAMES:
+                skipped += 1  # queued frame: a newer one is already on its way
+                continue
+            ret, frame = self._cap.retrieve() if ok else (False, None)
+            if not ret or frame is None:
+                failures += 1
+                if failures >= MAX_GRAB_FAILURES:
+                    log_error(" Camera stopped delivering frames.")
+                    break
+                continue
+            failures = 0
+            skipped = 0
+            if waited:
+                exposed_after = grab_start - self.frame_interval
+            self._store(frame, exposed_after, grab_end if waited else np.nan)
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def _store(self, frame, exposed_after, grabbed_at=np.nan):
+        seq = self._latest + 1
+        slot = seq % self.ring_size
+        with self._cond:
+            self._seqs[slot] = -1  # readers of the old frame in this slot will retry
+        np.copyto(self._frames[slot], frame)
+        with self._cond:
+            self._seqs[slot] = seq
+            self._times[slot] = exposed_after
+            self._grabbed[slot] = grabbed_at
+            self._latest = seq
+            self._cond.notify_all()
+
+    def _close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=FRAME_TIMEOUT)
+        if self._cap is not None:
+            self._cap.release()
+        self._running = False
+
+    # --- consumers -------------------------------------------------------
+
+    def _find(self, after_seq, after_time):
+        """
+        Oldest buffered frame newer than after_seq and exposed after
+        after_time, as (slot, seq), or None. Caller holds the condition.
+        """
+        best = None
+        for slot in range(self.ring_size):
+            seq = int(self._seqs[slot])
+            if seq <= after_seq or self._times[slot] < after_time:
+                continue
+            if best is None or seq < best[1]:
+                best = (slot, seq)
+        return best
+
+    def _wait(self, after_seq, after_time, timeout, out):
+        deadline = time.perf_counter() + timeout
+        while True:
+            with self._cond:
+                found = self._find(after_seq, after_time)
+                while found is None:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or not self._running:
+                        return None, -1, None, None
+                    self._cond.wait(remaining)
+                    found = self._find(after_seq, after_time)
+                slot, seq = found
+                exposed_after = float(self._times[slot])
+                grabbed_at = float(self._grabbed[slot])
+
+            # Copy outside the lock, then make sure the slot was not overwritten meanwhile
+            if out is None:
+                out = np.empty_like(self._frames[slot])
+            np.copyto(out, self._frames[slot])
+            with self._cond:
+                if self._seqs[slot] == seq:
+                    return out, seq, exposed_after, grabbed_at
+            after_seq = seq  # overwritten while copying; that frame is gone
+
+    def wait_for_frame(self, after_seq=-1, after_time=0.0, timeout=FRAME_TIMEOUT, out=None):
+        """
+        Returns (frame, seq, exposed_after) for the first buffered frame with a
+        sequence number above after_seq that was exposed after after_time,
+        waiting for one if needed. The frame is a copy (into `out`
+        when given). Returns (None, -1, None) on timeout or if the camera stopped.
+        """
+        return self._wait(after_seq, after_time, timeout, out)[:3]
+
+    def wait_for_stamped_frame(self, after_seq=-1, timeout=FRAME_TIMEOUT, out=None):
+        """
+        Like wait_for_frame(after_seq), but returns (frame, seq, grabbed_at) with
+        the time.perf_counter() value at which the frame's grab returned, i.e.
+        about when its exposure ended (NaN for frames served from the driver queue).
+        """
+        frame, seq, _, grabbed_at = self._wait(after_seq, 0.0, timeout, out)
+        return frame, seq, grabbed_at
+
+    def latest_seq(self):
+        with self._cond:
+            return self._latest
+
+    def latest(self, out=None):
+        """
+        Returns (frame, seq, exposed_after) of the newest frame without waiting.
+        """
+        with self._cond:
+            seq = self._latest
+        return self.wait_for_frame(after_seq=seq - 1, timeout=0.0, out=out)
+
+    def frame_after(self, t, timeout=FRAME_TIMEOUT, out=None):
+        """
+        First frame exposed after time.perf_counter() value t.
+        """
+        return self.wait_for_frame(after_time=t, timeout=timeout, out=out)
+
+    # --- cv2.VideoCapture interface used by the capture path -------------
+
+    def isOpened(self):
+        return self._running
+
+    def read(self, image=None):
+        """
+        Returns the first frame grabbed after this call (never a buffered one).
+        """
+        frame, _, _ = self.frame_after(time.perf_counter(), out=image)
+        return frame is not None, frame
+
+    def set(self, prop, value):
+        # The service owns the device settings; only the configured size is accepted
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return int(value) == self._frames.shape[2]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return int(value) == self._frames.shape[1]
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._frames.shape[2])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._frames.shape[1])
+        return self._cap.get(prop)
+
+    def release(self):
+        """
+        Hands the service back; the device is closed when the last consumer releases it.
+        """
+        global _service
+        with _service_lock:
+            self._users -= 1
+            if self._users > 0:
+                return
+            if _service is self:
+                _service = None
+        self._close()
+
+
+def acquire_camera(size=CAMERA_SIZE):
+    """
+    Returns the shared, running CameraService (starting it on first use), or
+    None if the camera could not be opened. Call release() when done.
+    """
+    global _service
+    with _service_lock:
+        if _service is None or not _service.isOpened():
+            service = CameraService(size)
+            if not service.start():
+                return None
+            _service = service
+        _service._users += 1
+        return _service
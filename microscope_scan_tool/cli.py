@@ -0,0 +1,233 @@
+"""
+Command-line entry point: python -m microscope_scan_tool <command>.
+
+    plan         tile grid and estimated stage travel for a region (no hardware, no OpenCV),
+                 streamed in blocks so even million-tile plans use little memory
+    dry-run      snake_like_scan(dry_run=True): the full scan plan without touching hardware
+    scan         scan a region, run a batch job file (--jobs) or resume a scan (--resume)
+    postprocess  register tiles, rebuild the TileConfiguration, export OME-TIFF, timing report
+    calibrate    measure µm/pixel, camera rotation and field of view for an objective
+    gui          the interactive preview + form (same as main.py)
+
+Settings come from a JSON config file (--config, default scan_config.json in
+the working directory when present); command-line options override it:
+
+    {
+      "backend": "micromanager",
+      "output_dir": "D:/Scans",
+      "objective": "20x",
+      "region": {"y_top": 377710, "y_bottom": 370232, "x_left": 35672, "x_right": 42606},
+      "options": {"pipelined": true, "compression": "zstd"}
+    }
+
+options are keyword arguments of snake_like_scan (also settable with
+--set key=value). Every command imports only what it needs, so plan and
+--help start quickly and run without OpenCV, tkinter or pycromanager, and
+dry-run loads no OpenCV, tifffile or Micro-Manager either (only its optional
+tissue, autofocus, flat-field and continuous reports import their modules).
+"""
+import argparse
+import json
+import os
+import sys
+
+DEFAULT_CONFIG = "scan_config.json"
+BOUND_KEYS = ("y_top", "y_bottom", "x_left", "x_right")
+
+
+def load_config(path=None):
+    """
+    Reads the config file at `path` (or DEFAULT_CONFIG if it exists). Returns a dict.
+    """
+    if path is None:
+        if not os.path.exists(DEFAULT_CONFIG):
+            return {}
+        path = DEFAULT_CONFIG
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _settings(args, config):
+    """
+    (objective, region dict, snake_like_scan options) from the config with command-line overrides.
+    """
+    objective = args.objective or config.get("objective", "4x")
+    region = dict(config.get("region", {}))
+    if args.region:
+        region = dict(zip(BOUND_KEYS, args.region))
+    missing = [key for key in BOUND_KEYS if key not in region]
+    if missing:
+        raise SystemExit(f"No scan region: set {', '.join(missing)} in the config file or pass --region")
+    options = dict(config.get("options", {}))
+    for item in args.set or []:
+        key, _, value = item.partition("=")
+        options[key] = _parse_value(value)
+    if args.overlap is not None:
+        options["overlap"] = args.overlap
+    return objective, {key: float(region[key]) for key in BOUND_KEYS}, options
+
+
+def _use_backend(args, config):
+    """
+    Applies output_dir and, for the simulator backend, installs the simulated microscope.
+    """
+    from microscope_scan_tool import logger
+
+    if config.get("output_dir"):
+        logger.BASE_SAVE_DIR = config["output_dir"]
+    if args.simulator or config.get("backend") == "simulator":
+        from microscope_scan_tool.hardware import use_simulator
+        use_simulator()
+
+
+def cmd_plan(args, config):
+    from microscope_scan_tool.pixel_calibration import load_pixel_calibration
+    from microscope_scan_tool.scan_plan import (GridSummary, calibration_lines, grid_axes, iter_grid, step_sizes,
+                                                tile_footprint)
+
+    objective, region, options = _settings(args, config)
+    pixels = load_pixel_calibration(objective)
+    x_step, y_step = step_sizes(objective, options.get("overlap"), pixels)
+    bounds = (region["y_top"], region["y_bottom"], region["x_left"], region["x_right"], x_step, y_step)
+    summary = GridSummary(x_step, y_step)
+    print(f" {objective}:")
+    for chunk in iter_grid(*bounds, fov=tile_footprint(objective, pixels)):
+        if args.list:
+            for i, (x, y) in enumerate(chunk.tolist(), start=summary.tiles + 1):
+                print(f"{i}\t{x}\t{y}")
+        summary.add(chunk)
+    xs, ys = grid_axes(*bounds)
+    for line in summary.lines():
+        print(line)
+    if summary.tiles < len(xs) * len(ys):
+        print(f" {len(xs) * len(ys) - summary.tiles} tiles outside the allowed scan area skipped")
+    if pixels is not None:
+        for line in calibration_lines(*bounds[:4], objective, pixels, options.get("overlap")):
+            print(line)
+    return 0 if summary.tiles else 1
+
+
+def cmd_dry_run(args, config):
+    from microscope_scan_tool.scan_logic import snake_like_scan
+
+    # The dry run never reaches the microscope, so the backend (and the simulator's slide) is not set up.
+    objective, region, options = _settings(args, config)
+    options["dry_run"] = True
+    snake_like_scan(objective_label=objective, **region, **options)
+    return 0
+
+
+def cmd_scan(args, config):
+    _use_backend(args, config)
+    if args.resume:
+        from microscope_scan_tool.scan_logic import resume_scan
+        return 0 if resume_scan(args.resume, register=args.register) else 1
+    if args.jobs:
+        from microscope_scan_tool.batch_queue import load_jobs, run_batch
+        report = run_batch(load_jobs(args.jobs), args.batch_dir)
+        return 1 if any(r["status"] in ("failed", "interrupted") for r in report["jobs"]) else 0
+
+    from microscope_scan_tool.scan_logic import snake_like_scan
+    objective, region, options = _settings(args, config)
+    if args.register:
+        options["register"] = True
+    return 0 if snake_like_scan(objective_label=objective, **region, **options) else 1
+
+
+def cmd_postprocess(args, config):
+    if not (args.rebuild or args.register or args.ome_tiff or args.timing):
+        raise SystemExit("postprocess: choose at least one of --rebuild, --register, --ome-tiff, --timing")
+    scan_dir = args.scan_dir
+    if args.rebuild:
+        from microscope_scan_tool.scan_journal import load_journal, rebuild_tile_configuration
+        plan, _ = load_journal(scan_dir)
+        if rebuild_tile_configuration(scan_dir, use_actual=bool(plan and plan.get("continuous"))) is None:
+            print(" No intact tiles in the journal.")
+            return 1
+    if args.register:
+        from microscope_scan_tool.registration import register_scan
+        register_scan(scan_dir)
+    if args.ome_tiff:
+        from microscope_scan_tool.mosaic_writer import MOSAIC_DIRNAME, export_ome_tiff
+        export_ome_tiff(os.path.join(scan_dir, MOSAIC_DIRNAME), args.ome_tiff)
+    if args.timing:
+        from microscope_scan_tool.scan_timing import load_timings, summary_lines
+        for line in summary_lines(load_timings(scan_dir)):
+            print(line)
+    return 0
+
+
+def cmd_calibrate(args, config):
+    from microscope_scan_tool.scan_logic import calibrate_pixels
+
+    _use_backend(args, config)
+    objective = args.objective or config.get("objective", "4x")
+    x, y = args.at if args.at else (None, None)
+    return 0 if calibrate_pixels(objective, x, y, save=not args.no_save) else 1
+
+
+def cmd_gui(args, config):
+    _use_backend(args, config)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import main
+    main.main()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m microscope_scan_tool", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=None, help=f"JSON config file (default: {DEFAULT_CONFIG} if present)")
+    parser.add_argument("--simulator", action="store_true", help="use the simulated microscope")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    region = argparse.ArgumentParser(add_help=False)
+    region.add_argument("--objective", choices=("4x", "20x"), default=None)
+    region.add_argument("--region", nargs=4, type=float, metavar=("Y_TOP", "Y_BOTTOM", "X_LEFT", "X_RIGHT"))
+    region.add_argument("--overlap", type=float, help="tile overlap in percent instead of the fixed step sizes")
+    region.add_argument("--set", action="append", metavar="KEY=VALUE",
+                        help="snake_like_scan option; the value is parsed as JSON, otherwise kept as text")
+
+    plan = commands.add_parser("plan", parents=[region], help="tile grid and travel estimate")
+    plan.add_argument("--list", action="store_true", help="print every tile position")
+    plan.set_defaults(func=cmd_plan)
+
+    dry_run = commands.add_parser("dry-run", parents=[region], help="print the scan plan without hardware")
+    dry_run.set_defaults(func=cmd_dry_run)
+
+    scan = commands.add_parser("scan", parents=[region], help="scan a region, a batch job file or resume a scan")
+    scan.add_argument("--jobs", help="batch job file (see batch_queue)")
+    scan.add_argument("--batch-dir", help="batch folder for --jobs")
+    scan.add_argument("--resume", metavar="SCAN_DIR", help="resume an interrupted scan")
+    scan.add_argument("--register", action="store_true", help="register the tiles after the scan")
+    scan.set_defaults(func=cmd_scan)
+
+    post = commands.add_parser("postprocess", help="post-process a finished scan folder")
+    post.add_argument("scan_dir")
+    post.add_argument("--rebuild", action="store_true", help="rewrite the TileConfiguration from the journal")
+    post.add_argument("--register", action="store_true", help="register the tiles")
+    post.add_argument("--ome-tiff", metavar="PATH", help="export mosaic.ome.zarr as a pyramidal OME-TIFF")
+    post.add_argument("--timing", action="store_true", help="print the scan timing report")
+    post.set_defaults(func=cmd_postprocess)
+
+    calibrate = commands.add_parser("calibrate", help="measure pixel size, rotation and field of view")
+    calibrate.add_argument("--objective", choices=("4x", "20x"), default=None)
+    calibrate.add_argument("--at", nargs=2, type=float, metavar=("X", "Y"), help="stage position over tissue")
+    calibrate.add_argument("--no-save", action="store_true", help="print the result without caching it")
+    calibrate.set_defaults(func=cmd_calibrate)
+
+    gui = commands.add_parser("gui", help="live preview and scan form")
+    gui.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args, load_config(args.config))
@@ -0,0 +1,408 @@
+"""
+Continuous-motion ("on-the-fly") scanning with position-stamped frames.
+
+Instead of stopping at every tile, the stage sweeps each serpentine row at a
+constant velocity while the camera service streams frames. A PositionSampler
+thread reads the stage position every SAMPLE_INTERVAL seconds. Each frame is
+stamped with the position at the middle of its exposure, from a linear fit
+to the samples around that time. For every tile the frame taken nearest the
+tile centre is kept and written at its measured position, so the
+TileConfiguration lists where the tiles really are, not where they were
+commanded.
+
+The sweep velocity is the lowest of three limits (see scan_velocity):
+- blur: the stage moves at most max_blur_px pixels during one exposure;
+- frame rate: at least FRAMES_PER_OVERLAP frames are taken while the stage
+  crosses one tile overlap, so the nearest frame is never off centre by more
+  than a quarter of the overlap;
+- stage: MAX_STAGE_VELOCITY.
+Short exposures and wide overlaps make continuous scanning pay off; with long
+exposures the blur limit makes stop-and-go faster.
+
+Grab times are snapped onto the camera's frame cadence (FrameClock), so a
+late wake-up of the camera thread does not shift a tile's measured position.
+
+The velocity is set through the XY stage property STAGE_SPEED_PROPERTY (in
+STAGE_SPEED_UNITS per µm/s). Both depend on the Micro-Manager stage adapter.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from microscope_scan_tool import scan_timing, shared_state
+from microscope_scan_tool.acquisition_pipeline import TileWriterPool
+from microscope_scan_tool.hardware import MM_PORT, connect_core
+from microscope_scan_tool.logger import log_error, log_info, log_warning
+from microscope_scan_tool.objectives import field_of_view, um_per_pixel
+from microscope_scan_tool.path_planner import DEFAULT_PROFILE, estimate_travel_time
+from microscope_scan_tool.stage_controller import POSITION_TOLERANCE, move_stage
+from microscope_scan_tool.stage_settling import default_motion_model, read_xy
+
+MAX_BLUR_PX = 1.5               # motion blur allowed during one exposure (pixels)
+FRAMES_PER_OVERLAP = 2.0        # frames taken while the stage crosses one tile overlap
+MAX_STAGE_VELOCITY = 10000.0    # µm/s
+DEFAULT_EXPOSURE = 0.01         # s, used when the camera does not report its exposure
+CAMERA_LATENCY = 0.0            # s from the end of an exposure until its grab returns
+STAGE_SPEED_PROPERTY = "Speed"  # XY stage device property that sets the velocity
+STAGE_SPEED_UNITS = 1.0         # property units per µm/s (e.g. 0.001 for an adapter taking mm/s)
+RUN_UP_MARGIN_UM = 100.0        # constant-velocity travel before the first and after the last tile
+ROW_TIMEOUT_MARGIN = 2.0        # s beyond the expected sweep time before a row is given up
+SAMPLE_INTERVAL = 0.002         # s between stage position reads
+SAMPLER_HISTORY = 8192          # position samples kept
+FIT_WINDOW = 0.03               # s of samples on each side of a frame used for its position
+RATE_FRAMES = 10                # stamped frames used to measure the frame rate
+CLOCK_HISTORY = 16              # recent grab times the frame cadence is estimated from
+
+
+class PositionSampler:
+    """
+    Background thread reading the XY stage position every `interval` seconds
+    into a ring buffer of (time.perf_counter(), x, y); each read is stamped
+    with the middle of its call.
+
+    pycromanager bridges are bound to the thread that created them, so the
+    thread opens its own core with core_factory (default: hardware.connect_core).
+    """
+
+    def __init__(self, core_factory=None, interval=SAMPLE_INTERVAL, history=SAMPLER_HISTORY):
+        self.core_factory = core_factory or (lambda: connect_core(MM_PORT))
+        self.interval = interval
+        self.error = None
+        self._samples = np.full((history, 3), np.nan)
+        self._count = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stage-position-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        try:
+            core = self.core_factory()
+            next_read = time.perf_counter()
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                x, y = read_xy(core)
+                stamp = (start + time.perf_counter()) / 2
+                with self._cond:
+                    self._samples[self._count % len(self._samples)] = (stamp, x, y)
+                    self._count += 1
+                    self._cond.notify_all()
+                next_read = max(next_read + self.interval, time.perf_counter())
+                self._stop.wait(next_read - time.perf_counter())
+        except Exception as e:
+            self.error = e
+            log_error(f" Stage position sampler stopped: {e}")
+        finally:
+            self._stop.set()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _latest_time(self):
+        if self._count == 0:
+            return -math.inf
+        return self._samples[(self._count - 1) % len(self._samples), 0]
+
+    def position_at(self, t, window=FIT_WINDOW, timeout=1.0):
+        """
+        Stage ((x, y), (vx, vy)) at time.perf_counter() value t, from a linear
+        fit to the samples within `window` seconds of t (waiting for the samples
+        after t to arrive). Returns None if there is no sample near t.
+        """
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while self._latest_time() < t + window and not self._stop.is_set():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            samples = self._samples[:min(self._count, len(self._samples))].copy()
+
+        samples = samples[np.abs(samples[:, 0] - t) <= window]
+        if len(samples) == 0:
+            return None
+        if len(samples) == 1:
+            return (samples[0, 1], samples[0, 2]), (0.0, 0.0)
+        dt = samples[:, 0] - t
+        design = np.stack([np.ones_like(dt), dt], axis=1)
+        (x0, y0), (vx, vy) = np.linalg.lstsq(design, samples[:, 1:], rcond=None)[0]
+        return (float(x0), float(y0)), (float(vx), float(vy))
+
+
+class FrameClock:
+    """
+    Removes scheduling delays from grab times. Exposures end on a fixed cadence
+    (k * interval + phase), and a late wake-up can only make a grab return
+    later, so the phase is the earliest recent offset from the cadence (offsets
+    far below the median are wrapped-around delays and left out).
+    """
+
+    def __init__(self, interval, history=CLOCK_HISTORY):
+        self.interval = interval
+        self._origin = None
+        self._offsets = deque(maxlen=history)
+
+    def correct(self, t):
+        """
+        Grab time t moved back onto the frame cadence.
+        """
+        if self._origin is None:
+            self._origin = t
+        offset = (t - self._origin + self.interval / 2) % self.interval - self.interval / 2
+        self._offsets.append(offset)
+        median = float(np.median(self._offsets))
+        phase = min(o for o in self._offsets if o >= median - self.interval / 4)
+        return t - (offset - phase) % self.interval
+
+
+def scan_velocity(exposure, um_per_px, frame_rate, overlap_um, max_blur_px=MAX_BLUR_PX,
+                  max_velocity=MAX_STAGE_VELOCITY):
+    """
+    Fastest sweep velocity (µm/s) that keeps motion blur within max_blur_px
+    and takes FRAMES_PER_OVERLAP frames per tile overlap.
+    Returns (velocity, name of the limiting constraint).
+    """
+    limits = {
+        "blur": max_blur_px * um_per_px / exposure if exposure > 0 else math.inf,
+        "frame rate": frame_rate * max(overlap_um, 0.0) / FRAMES_PER_OVERLAP,
+        "stage": max_velocity,
+    }
+    limit = min(limits, key=limits.get)
+    return limits[limit], limit
+
+
+def camera_exposure(cap, exposure_ms=None):
+    """
+    Exposure time in seconds: exposure_ms if given, else the camera's
+    CAP_PROP_EXPOSURE (DirectShow reports log2 of seconds), else DEFAULT_EXPOSURE.
+    """
+    if exposure_ms is not None:
+        return exposure_ms / 1000.0
+    try:
+        value = cap.get(cv2.CAP_PROP_EXPOSURE)
+    except Exception:
+        value = 0.0
+    return 2.0 ** value if value and value < 0 else DEFAULT_EXPOSURE
+
+
+def stamped_frame_rate(cap, frames=RATE_FRAMES):
+    """
+    Rate (frames/s) at which the camera service delivers frames with a known
+    exposure time, which can be below the sensor rate when decoding is slow.
+    Returns None if the camera delivered too few.
+    """
+    seq = cap.latest_seq()
+    stamps = []
+    buffer = None
+    for _ in range(2 * frames):
+        buffer, seq, grabbed_at = cap.wait_for_stamped_frame(seq, out=buffer)
+        if buffer is None:
+            break
+        if not math.isnan(grabbed_at):
+            stamps.append(grabbed_at)
+            if len(stamps) == frames:
+                break
+    if len(stamps) < 2 or stamps[-1] <= stamps[0]:
+        return None
+    return (len(stamps) - 1) / (stamps[-1] - stamps[0])
+
+
+def group_rows(tiles):
+    """
+    Splits [(index, x, y)] into runs of consecutive tiles on one row (same y,
+    x moving in one direction), each swept in a single pass.
+    """
+    rows = []
+    for tile in tiles:
+        row = rows[-1] if rows else None
+        if row and row[-1][2] == tile[2] and tile[1] != row[-1][1]:
+            direction = row[-1][1] - row[0][1]
+            if direction == 0 or (tile[1] - row[-1][1]) * direction > 0:
+                row.append(tile)
+                continue
+        rows.append([tile])
+    return rows
+
+
+def tile_overlap(tiles, objective_label):
+    """
+    Overlap (µm) of neighbouring tiles along the rows: tile width minus the
+    smallest X step (the full width when no row has two tiles).
+    """
+    steps = [abs(b[1] - a[1]) for row in group_rows(tiles) for a, b in zip(row, row[1:])]
+    return field_of_view(objective_label)[0] - (min(steps) if steps else 0.0)
+
+
+def run_up_distance(velocity, profile=DEFAULT_PROFILE):
+    """
+    Travel (µm) needed to reach `velocity` before the first tile of a row.
+    """
+    return velocity * velocity / (2 * profile.x_accel) + RUN_UP_MARGIN_UM
+
+
+def _sweep_ends(row, run_up, x_limits=None):
+    xs = [x for _, x, _ in row]
+    direction = 1 if xs[-1] >= xs[0] else -1
+    start_x, end_x = xs[0] - direction * run_up, xs[-1] + direction * run_up
+    if x_limits is not None:
+        start_x, end_x = (min(max(v, x_limits[0]), x_limits[1]) for v in (start_x, end_x))
+    return start_x, end_x, direction
+
+
+def estimate_scan_time(tiles, velocity, x_limits=None, profile=DEFAULT_PROFILE):
+    """
+    Estimated seconds of stage motion for a continuous scan of [(index, x, y)]:
+    fast moves to the start of each row plus the constant-velocity sweeps.
+    """
+    run_up = run_up_distance(velocity, profile)
+    total = 0.0
+    position = None
+    for row in group_rows(tiles):
+        start_x, end_x, _ = _sweep_ends(row, run_up, x_limits)
+        y = row[0][2]
+        if position is not None:
+            total += estimate_travel_time([position, (start_x, y)], profile)
+        total += abs(end_x - start_x) / velocity + velocity / profile.x_accel
+        position = (end_x, y)
+    return total
+
+
+def _sweep_row(core, cap, sampler, clock, writer, row, velocity, exposure, run_up, x_limits, buffers, stats):
+    """
+    Sweeps one row and submits the frame nearest each tile centre.
+    Returns the number of tiles that got no frame.
+    """
+    xs = [x for _, x, _ in row]
+    y = row[0][2]
+    start_x, end_x, direction = _sweep_ends(row, run_up, x_limits)
+    xy_device = core.get_xy_stage_device()
+
+    scan_timing.begin_tile(*row[0])
+    move_stage(core, start_x, y)
+    core.set_property(xy_device, STAGE_SPEED_PROPERTY, velocity * STAGE_SPEED_UNITS)
+    seq = cap.latest_seq()
+    sweep_start = time.perf_counter()
+    core.set_xy_position(end_x, y)
+    deadline = sweep_start + abs(end_x - start_x) / velocity + ROW_TIMEOUT_MARGIN
+
+    def submit(n, chosen, since):
+        index, x, _ = row[n]
+        if n:
+            scan_timing.begin_tile(index, x, y)
+        scan_timing.record("grab", since)
+        frame, (px, py), (vx, _) = chosen
+        writer.submit(frame.copy(), index, x, y, (round(px, 2), round(py, 2)))
+        stats.append((abs(vx), px - x))
+
+    n = 0
+    k = 0
+    previous = None  # (frame, position, velocity) of the last stamped frame
+    grab_start = time.perf_counter()
+    while n < len(row) and time.perf_counter() < deadline:
+        frame, seq, grabbed_at = cap.wait_for_stamped_frame(seq, out=buffers[k % 2])
+        if frame is None:
+            break
+        buffers[k % 2] = frame
+        if math.isnan(grabbed_at):
+            continue  # exposure time unknown; the buffer is reused for the next frame
+        fit = sampler.position_at(clock.correct(grabbed_at) - CAMERA_LATENCY - exposure / 2)
+        if fit is None:
+            continue
+        k += 1
+        current = (frame,) + fit
+        while n < len(row) and direction * (current[1][0] - xs[n]) >= 0:
+            chosen = current
+            if previous is not None and abs(previous[1][0] - xs[n]) < abs(current[1][0] - xs[n]):
+                chosen = previous
+            submit(n, chosen, grab_start)
+            grab_start = time.perf_counter()
+            n += 1
+        previous = current
+
+    # A row clamped to the stage limits ends right at its last tile
+    if n < len(row) and previous is not None and abs(previous[1][0] - xs[n]) < POSITION_TOLERANCE:
+        submit(n, previous, grab_start)
+        n += 1
+
+    core.wait_for_device(xy_device)
+    default_motion_model.last_target = (end_x, y)
+    for index, x, _ in row[n:]:
+        log_error(f" Continuous scan: no frame for tile {index} at ({x}, {y}).", tile=index, x=x, y=y)
+    return len(row) - n
+
+
+def acquire_continuous(core, cap, scan_dir, tiles, objective_label, mosaic=None, write_tiles=True,
+                       compression=None, journal=None, velocity=None, max_blur_px=MAX_BLUR_PX,
+                       exposure_ms=None, x_limits=None, core_factory=None):
+    """
+    Acquires tiles [(index, x, y)] by sweeping each row at a constant velocity
+    (from scan_velocity unless given). Each tile is the streamed frame nearest
+    its centre, processed and written on a TileWriterPool and journaled with
+    its commanded and measured positions.
+    Returns [(filename, measured x, measured y)] of the written tiles, or None
+    if the stage speed cannot be controlled (nothing was acquired).
+    """
+    xy_device = core.get_xy_stage_device()
+    try:
+        fast_speed = core.get_property(xy_device, STAGE_SPEED_PROPERTY)
+    except Exception as e:
+        log_error(f" Continuous scan needs the XY stage property '{STAGE_SPEED_PROPERTY}': {e}")
+        return None
+
+    exposure = camera_exposure(cap, exposure_ms)
+    um_per_px = um_per_pixel(objective_label)
+    if velocity is None:
+        rate = stamped_frame_rate(cap)
+        if rate is None:
+            log_error(" Continuous scan: the camera delivers no time-stamped frames.")
+            return None
+        velocity, limit = scan_velocity(exposure, um_per_px, rate, tile_overlap(tiles, objective_label),
+                                        max_blur_px)
+        if velocity <= 0:
+            log_error(" Continuous scan: tiles do not overlap along the rows.")
+            return None
+        log_info(f" Continuous scan at {velocity:.0f} µm/s (limited by {limit}): exposure "
+                 f"{1000 * exposure:.2f} ms, {rate:.1f} stamped frames/s")
+
+    writer = TileWriterPool(scan_dir, mosaic=mosaic, write_tiles=write_tiles, compression=compression,
+                            journal=journal)
+    sampler = PositionSampler(core_factory).start()
+    clock = FrameClock(cap.frame_interval)
+    run_up = run_up_distance(velocity)
+    buffers = [None, None]
+    stats = []  # (measured speed, offset from the tile centre) per tile
+    missed = 0
+    shared_state.state.scanning.set()
+    try:
+        for row in group_rows(tiles):
+            try:
+                missed += _sweep_row(core, cap, sampler, clock, writer, row, velocity, exposure, run_up,
+                                     x_limits, buffers, stats)
+            finally:
+                core.set_property(xy_device, STAGE_SPEED_PROPERTY, fast_speed)
+    finally:
+        shared_state.state.scanning.clear()
+        scan_timing.set_tile(None)
+        sampler.stop()
+        positions = writer.finish(use_actual=True)
+
+    if stats:
+        speeds, offsets = np.abs(np.array(stats)).T
+        log_info(f" Continuous scan: {len(stats)} tiles at {speeds.mean():.0f} µm/s measured "
+                 f"(~{speeds.mean() * exposure / um_per_px:.2f} px blur), up to {offsets.max():.0f} µm "
+                 f"from the tile centres")
+    if missed:
+        log_warning(f" Continuous scan: {missed} tiles missed; resume the scan to capture them.")
+    return positions
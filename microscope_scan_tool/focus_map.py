@@ -0,0 +1,260 @@
+"""
+Focus map autofocus.
+
+Instead of focusing every tile, the scan focuses a sparse set of tiles (about
+one per FOCUS_SPACING_UM cell of the scan area) with a coarse-to-fine Z sweep,
+fits a smooth surface z(x, y) through those points and sets the interpolated
+Z at every tile while the XY stage moves.
+
+Focus is scored on a downsampled grayscale copy of each frame, so one score
+costs a few milliseconds even for 1920x1080 frames.
+"""
+import time
+
+import cv2
+import numpy as np
+
+from microscope_scan_tool.frame_freshness import fresh_frame
+from microscope_scan_tool.logger import log_warning
+from microscope_scan_tool.path_planner import optimize_tile_order
+from microscope_scan_tool.stage_controller import move_stage
+
+# (half search range, coarse step, fine step) in µm around the expected focus
+AUTOFOCUS_RANGES = {
+    "4x": (100.0, 20.0, 4.0),
+    "20x": (24.0, 4.0, 1.0),
+}
+FOCUS_SPACING_UM = {       # one focus point per square cell of this size
+    "4x": 6000.0,
+    "20x": 800.0,
+}
+FOCUS_DOWNSAMPLE = 4       # frames are scored at 1/4 resolution
+MIN_PEAK_RATIO = 1.5       # best score / median score below this: no structure to focus on (glass)
+MAX_FIT_RESIDUAL = 3.0     # points further than this many fine steps from the surface are dropped
+MAX_EXTRAPOLATION = 0.75   # tiles further beyond the focus points than this share of their span get the plane
+
+
+def _laplacian_variance(gray):
+    return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+
+def _tenengrad(gray):
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1)
+    return float(cv2.mean(gx * gx + gy * gy)[0])
+
+
+def _normalized_variance(gray):
+    mean, std = cv2.meanStdDev(gray)
+    return float(std[0, 0] ** 2 / max(mean[0, 0], 1.0))
+
+
+FOCUS_METRICS = {
+    "laplacian": _laplacian_variance,
+    "tenengrad": _tenengrad,
+    "normalized_variance": _normalized_variance,
+}
+
+
+def focus_score(frame, metric="laplacian", downsample=FOCUS_DOWNSAMPLE):
+    """
+    Sharpness of a frame (higher is sharper), computed on a downsampled grayscale copy.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    if downsample > 1:
+        gray = cv2.resize(gray, (gray.shape[1] // downsample, gray.shape[0] // downsample),
+                          interpolation=cv2.INTER_AREA)
+    return FOCUS_METRICS[metric](gray)
+
+
+def _peak(zs, scores):
+    """
+    Sub-step peak position from a parabola through the log scores around the best sample.
+    """
+    best = int(np.argmax(scores))
+    if best == 0 or best == len(scores) - 1:
+        return float(zs[best])
+    l0, l1, l2 = np.log(np.maximum(scores[best - 1:best + 2], 1e-9))
+    denom = l0 - 2 * l1 + l2
+    if denom >= 0:
+        return float(zs[best])
+    offset = 0.5 * (l0 - l2) / denom
+    return float(zs[best] + offset * (zs[best + 1] - zs[best]))
+
+
+def autofocus(core, cap, z_center, objective_label="20x", metric="laplacian"):
+    """
+    Coarse-to-fine Z search around z_center at the current XY position.
+
+    Returns:
+        (z, frames) with the in-focus Z (or None if the field has no structure to
+        focus on or the peak lies at the edge of the search range) and the number
+        of frames scored. The focus drive is left at the returned Z.
+    """
+    half_range, coarse_step, fine_step = AUTOFOCUS_RANGES.get(objective_label, AUTOFOCUS_RANGES["4x"])
+    device = core.get_focus_device()
+
+    def sweep(zs):
+        scores = []
+        for z in zs:
+            core.set_position(device, float(z))
+            core.wait_for_device(device)
+            frame = fresh_frame(cap, time.perf_counter())
+            scores.append(0.0 if frame is None else focus_score(frame, metric))
+        return np.array(scores)
+
+    coarse_z = z_center + np.arange(-half_range, half_range + coarse_step / 2, coarse_step)
+    coarse = sweep(coarse_z)
+    best = int(np.argmax(coarse))
+    frames = len(coarse_z)
+    if coarse[best] < MIN_PEAK_RATIO * np.median(coarse) or best in (0, len(coarse) - 1):
+        core.set_position(device, float(z_center))
+        return None, frames
+
+    fine_z = coarse_z[best] + np.arange(-coarse_step + fine_step, coarse_step - fine_step / 2, fine_step)
+    fine = sweep(fine_z)
+    z = _peak(fine_z, fine)
+    core.set_position(device, z)
+    core.wait_for_device(device)
+    return z, frames + len(fine_z)
+
+
+class FocusMap:
+    """
+    Smooth focus surface through measured (x, y, z) points: a constant for one
+    or two points, a plane up to five points and a quadratic surface from six.
+    Points that disagree with the fitted surface by more than `tolerance` µm
+    are dropped once and the surface is refitted. Interpolated Z never leaves
+    the measured Z range widened by `margin` µm on both sides.
+    """
+
+    def __init__(self, points, tolerance=None, margin=0.0):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        if len(self.points) == 0:
+            raise ValueError("A focus map needs at least one point")
+        xy = self.points[:, :2]
+        self._origin = xy.mean(axis=0)
+        self._scale = max(float(np.ptp(xy, axis=0).max()), 1.0)
+        self.margin = margin
+        self._fit(self.points)
+        if tolerance is not None and len(self.points) > 3:
+            residual = np.abs(self.z_at(self.points[:, 0], self.points[:, 1]) - self.points[:, 2])
+            keep = residual <= tolerance
+            if 0 < keep.sum() < len(self.points):
+                self.points = self.points[keep]
+                self._fit(self.points)
+
+    def _terms(self, x, y, degree):
+        u = (np.asarray(x, dtype=np.float64) - self._origin[0]) / self._scale
+        v = (np.asarray(y, dtype=np.float64) - self._origin[1]) / self._scale
+        terms = [np.ones_like(u)]
+        if degree >= 1:
+            terms += [u, v]
+        if degree >= 2:
+            terms += [u * u, u * v, v * v]
+        return np.stack(terms, axis=-1)
+
+    def _fit(self, points):
+        self.degree = 0 if len(points) < 3 else 1 if len(points) < 6 else 2
+        self._coeffs = {}
+        for degree in range(min(self.degree, 1), self.degree + 1):
+            terms = self._terms(points[:, 0], points[:, 1], degree)
+            self._coeffs[degree] = np.linalg.lstsq(terms, points[:, 2], rcond=None)[0]
+        self.z_limits = (float(points[:, 2].min()) - self.margin, float(points[:, 2].max()) + self.margin)
+        self._extent = (points[:, :2].min(axis=0), points[:, :2].max(axis=0))
+
+    def z_at(self, x, y, plane=False):
+        """
+        Interpolated focus Z at stage positions x, y (scalars or arrays), from the
+        fitted plane instead of the quadratic surface with plane=True.
+        """
+        degree = min(self.degree, 1) if plane else self.degree
+        return np.clip(self._terms(x, y, degree) @ self._coeffs[degree], *self.z_limits)
+
+    def spans(self, x, y):
+        """
+        True if no position x, y lies further beyond the focus points than
+        MAX_EXTRAPOLATION of their extent along either axis.
+        """
+        xy = np.stack([np.ravel(x), np.ravel(y)], axis=-1).astype(np.float64)
+        lo, hi = self._extent
+        reach = MAX_EXTRAPOLATION * (hi - lo)
+        return bool(np.all(xy.min(axis=0) >= lo - reach) and np.all(xy.max(axis=0) <= hi + reach))
+
+    def to_list(self):
+        return [[float(x), float(y), float(z)] for x, y, z in self.points]
+
+
+def sample_points(positions, spacing_um):
+    """
+    Divides the area the tiles cover into cells of about spacing_um x spacing_um
+    and picks, in every cell that holds tiles, the tile nearest the cell centre
+    (at least one tile). Returns a list of (x, y) in the order of `positions`.
+    Tiles are bucketed by cell, so time and memory grow with the tile count only.
+    """
+    xy = np.asarray(positions, dtype=np.float64)
+    lo, hi = xy.min(axis=0), xy.max(axis=0)
+    counts = np.maximum(1, np.ceil((hi - lo) / spacing_um)).astype(int)
+    size = np.where(hi > lo, (hi - lo) / counts, 1.0)
+    cell_xy = np.minimum(np.floor((xy - lo) / size), counts - 1).astype(np.int64)
+    cell = cell_xy[:, 1] * counts[0] + cell_xy[:, 0]
+    distance = (((xy - lo) / size - cell_xy - 0.5) * size) ** 2
+    # Sort by cell, nearest first within a cell; np.unique then returns the first tile of each cell
+    order = np.lexsort((distance.sum(axis=1), cell))
+    _, first = np.unique(cell[order], return_index=True)
+    return [tuple(positions[i]) for i in np.sort(order[first]).tolist()]
+
+
+def build_focus_map(core, cap, positions, objective_label="20x", spacing_um=None, metric="laplacian"):
+    """
+    Autofocuses a sparse set of the scan's tiles and fits a FocusMap through them.
+    Returns the FocusMap, or None if no point could be focused (Z is left unchanged).
+    """
+    if metric not in FOCUS_METRICS:
+        raise ValueError(f"Unknown focus metric '{metric}', expected one of {sorted(FOCUS_METRICS)}")
+    spacing_um = spacing_um or FOCUS_SPACING_UM.get(objective_label, FOCUS_SPACING_UM["4x"])
+    targets = sample_points(positions, spacing_um)
+    if len(targets) > 2:
+        targets = optimize_tile_order(targets)
+
+    start = time.perf_counter()
+    z_start = core.get_position()
+    found = []
+    frames = 0
+    for x, y in targets:
+        move_stage(core, x, y)
+        z_center = float(np.median([p[2] for p in found])) if found else z_start
+        z, used = autofocus(core, cap, z_center, objective_label, metric)
+        frames += used
+        if z is None:
+            log_warning(f" Focus point at ({x}, {y}) skipped: no focus peak found.", x=x, y=y)
+            continue
+        found.append((x, y, z))
+
+    elapsed = time.perf_counter() - start
+    if not found:
+        log_warning(f" Focus map failed: no focus point found, keeping Z at {z_start:.1f} µm.")
+        return None
+
+    half_range, _, fine_step = AUTOFOCUS_RANGES.get(objective_label, AUTOFOCUS_RANGES["4x"])
+    focus_map = FocusMap(found, tolerance=MAX_FIT_RESIDUAL * fine_step, margin=half_range)
+    zs = focus_map.points[:, 2]
+    print(f" Focus map: {len(focus_map.points)} of {len(targets)} points, {frames} frames in {elapsed:.1f} s "
+          f"({1000 * elapsed / len(positions):.0f} ms per tile), Z {zs.min():.1f}-{zs.max():.1f} µm")
+    return focus_map
+
+
+def focus_targets(focus_map, tiles):
+    """
+    Vectorised Z target for every (index, x, y) tile, clamped to the focus map's
+    Z limits. When the tiles reach well beyond the focus points, the quadratic
+    surface would extrapolate, so the fitted plane is used instead.
+    """
+    if not tiles:
+        return []
+    xy = np.array([(x, y) for _, x, y in tiles], dtype=np.float64)
+    plane = focus_map.degree == 2 and not focus_map.spans(xy[:, 0], xy[:, 1])
+    if plane:
+        log_warning(" Focus points do not span the scan area; using a focus plane instead of the curved surface.",
+                    points=len(focus_map.points))
+    return [float(z) for z in focus_map.z_at(xy[:, 0], xy[:, 1], plane=plane)]
@@ -0,0 +1,129 @@
+"""
+Post-move frame freshness.
+
+Cameras queue finished frames (DirectShow keeps several), so a read right
+after a stage move can return a frame exposed before or during the move.
+fresh_frame() only returns frames exposed after the stage settled: the camera
+service tracks when each frame was exposed (see camera_service), and a plain
+cv2.VideoCapture has its driver queue drained first.
+
+FrameValidator then compares a cheap downsampled signature of each tile with
+the previous tile to catch duplicates (the previous field again) and motion
+blur, and the capture is retried when a frame looks suspect.
+"""
+import time
+
+import cv2
+import numpy as np
+
+SIGNATURE_SIZE = (64, 36)     # grayscale thumbnail used for comparisons
+DUPLICATE_THRESHOLD = 0.75    # mean abs difference (gray levels) below which tiles count as identical
+MIN_TEXTURE = 2.0             # thumbnails flatter than this (blank glass) are not checked for duplicates
+BLUR_RATIO = 0.6              # a frame this much less sharp than a re-grab of the same field is blurred
+MAX_CAPTURE_RETRIES = 3
+DRAIN_MAX_FRAMES = 10         # upper bound on queued frames discarded from a plain VideoCapture
+DEFAULT_FRAME_INTERVAL = 1.0 / 30
+
+
+def frame_signature(frame):
+    """
+    Returns (thumbnail, sharpness): a small float32 grayscale thumbnail and the
+    variance of the Laplacian of a half-resolution grayscale copy.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    half = cv2.resize(gray, (gray.shape[1] // 2, gray.shape[0] // 2), interpolation=cv2.INTER_AREA)
+    sharpness = float(cv2.Laplacian(half, cv2.CV_32F).var())
+    thumbnail = cv2.resize(half, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    return thumbnail, sharpness
+
+
+def drain_buffered_frames(cap, frame_interval=DEFAULT_FRAME_INTERVAL, max_frames=DRAIN_MAX_FRAMES):
+    """
+    Discards frames a plain VideoCapture has already queued: grabs that return
+    much faster than a frame interval came from the queue. Returns the number
+    of frames dropped.
+    """
+    dropped = 0
+    while dropped < max_frames:
+        start = time.perf_counter()
+        if not cap.grab():
+            break
+        if time.perf_counter() - start >= frame_interval / 2:
+            break  # this grab waited for the sensor, so the queue is empty
+        dropped += 1
+    return dropped
+
+
+def fresh_frame(cap, settled_at):
+    """
+    Reads the first frame exposed entirely after time.perf_counter() value
+    `settled_at`. Returns the frame or None.
+    """
+    if hasattr(cap, "frame_after"):
+        frame, _, _ = cap.frame_after(settled_at)
+        return frame
+
+    drain_buffered_frames(cap)
+    ret, frame = cap.read()  # the frame after an empty queue starts exposing after settled_at
+    return frame if ret else None
+
+
+class FrameValidator:
+    """
+    Remembers the signature of the last accepted tile and flags frames that
+    repeat it or look motion blurred.
+    """
+
+    def __init__(self):
+        self.previous = None
+
+    def check(self, frame, signature=None):
+        """
+        Returns (problem, signature) where problem is None, "duplicate" or
+        "blur-suspect". Blur is only suspected from a drop in sharpness against
+        the previous tile; capture_fresh_frame() confirms it with a second frame.
+        """
+        thumbnail, sharpness = signature or frame_signature(frame)
+        if self.previous is not None:
+            prev_thumbnail, prev_sharpness = self.previous
+            if thumbnail.std() >= MIN_TEXTURE and prev_thumbnail.std() >= MIN_TEXTURE:
+                if float(np.abs(thumbnail - prev_thumbnail).mean()) < DUPLICATE_THRESHOLD:
+                    return "duplicate", (thumbnail, sharpness)
+            if sharpness < BLUR_RATIO * prev_sharpness:
+                return "blur-suspect", (thumbnail, sharpness)
+        return None, (thumbnail, sharpness)
+
+    def accept(self, signature):
+        self.previous = signature
+
+
+def capture_fresh_frame(cap, settled_at, validator=None, retries=MAX_CAPTURE_RETRIES):
+    """
+    Returns (frame, problems) for a frame exposed after `settled_at`, retrying
+    (with a newer frame) while the validator flags it. problems lists every
+    problem that caused a retry; if the retries run out the last frame is kept.
+    """
+    frame = fresh_frame(cap, settled_at)
+    if frame is None or validator is None:
+        return frame, []
+
+    problems = []
+    problem, signature = validator.check(frame)
+    for _ in range(retries):
+        if problem is None:
+            break
+        retry = fresh_frame(cap, time.perf_counter())
+        if retry is None:
+            break
+        retry_problem, retry_signature = validator.check(retry)
+        if problem == "blur-suspect" and retry_signature[1] < signature[1] / BLUR_RATIO:
+            # Not sharper a moment later: this field just has less detail than the last one
+            if retry_signature[1] > signature[1]:
+                frame, signature = retry, retry_signature
+            problem = None
+            break
+        problems.append("blur" if problem == "blur-suspect" else problem)
+        frame, problem, signature = retry, retry_problem, retry_signature
+
+    validator.accept(signature)
+    return frame, problems
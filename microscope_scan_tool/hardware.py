@@ -0,0 +1,61 @@
+"""
+Hardware backend selection.
+
+Scan and preview code get their Micro-Manager core and camera from here instead of
+constructing pycromanager.Core / cv2.VideoCapture directly, so the same code runs
+against the simulator. Set MICROSCOPE_BACKEND=simulator or call use_simulator().
+"""
+import os
+
+MM_PORT = 4827
+CAMERA_INDEX = 0
+BACKEND_ENV_VAR = "MICROSCOPE_BACKEND"
+
+_simulator = None
+
+
+def use_simulator(simulator=None):
+    """
+    Routes connect_core()/open_camera() to a simulated microscope and returns it.
+    """
+    global _simulator
+    if simulator is None:
+        from microscope_scan_tool.simulator import SimulatedMicroscope
+        simulator = SimulatedMicroscope()
+    _simulator = simulator
+    return _simulator
+
+
+def use_micromanager():
+    """
+    Routes connect_core()/open_camera() back to the real hardware.
+    """
+    global _simulator
+    _simulator = None
+
+
+def active_simulator():
+    """
+    Returns the active SimulatedMicroscope, or None when running on real hardware.
+    """
+    if _simulator is None and os.environ.get(BACKEND_ENV_VAR, "").lower() == "simulator":
+        use_simulator()
+    return _simulator
+
+
+def connect_core(port=MM_PORT):
+    simulator = active_simulator()
+    if simulator is not None:
+        return simulator.core
+
+    from pycromanager import Core
+    return Core(port=port)
+
+
+def open_camera(index=CAMERA_INDEX):
+    simulator = active_simulator()
+    if simulator is not None:
+        return simulator.open_camera()
+
+    import cv2
+    return cv2.VideoCapture(index, cv2.CAP_DSHOW)
@@ -1,74 +1,128 @@
 import os
+import time
 from datetime import datetime
 import uuid
 import tifffile
-import cv2
-import numpy as np
 
-from microscope_scan_tool.logger import log_error
-from microscope_scan_tool import shared_state
-from microscope_scan_tool.white_balance_utils import apply_white_balance_to_frame
+from microscope_scan_tool.logger import log_error, log_warning
+from microscope_scan_tool.camera_service import acquire_camera
+from microscope_scan_tool.frame_freshness import capture_fresh_frame
+from microscope_scan_tool import scan_timing, shared_state
+from microscope_scan_tool.preprocessing import default_preprocessor
+from microscope_scan_tool.tile_compression import NO_COMPRESSION
 
 
 def initialize_camera():
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    if not cap.isOpened():
+    """
+    Returns the shared camera service (already running if the preview is open).
+    Release it with cap.release() when the scan is done.
+    """
+    cap = acquire_camera()
+    if cap is None:
         print("Camera not detected.")
         return None
-
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-    print("Camera resolution set to: 1920x1080")
     return cap
 
-def capture_image(cap, save_dir, index, x, y):
-    ret, frame = cap.read()
-    if not ret:
-        log_error(f"Failed to capture image at tile {index}.")
-        return None
+def grab_frame(cap, index, settled_at=None, validator=None, stacking=None):
+    """
+    Reads one raw frame from the camera.
 
-    # Apply white balance if enabled
-    if (
-        shared_state.white_balance_on and
-        shared_state.white_balance_medians is not None and
-        shared_state.white_balance_scale is not None
-    ):
-        frame = apply_white_balance_to_frame(frame)
+    With settled_at (time.perf_counter() when the stage settled) the frame is
+    guaranteed to be exposed after that time, and with a FrameValidator it is
+    re-captured if it repeats the previous tile or looks motion blurred.
+    With a TileStacking (see frame_stacking) the tile is averaged over several
+    frames and/or fused from a Z stack.
+    Returns None (and logs the tile index) if the camera did not deliver a frame.
+    """
+    start = time.perf_counter()
+    if settled_at is None:
+        ret, frame = cap.read()
+        frame = frame if ret else None
+    else:
+        if stacking is not None:
+            frame, problems = stacking.capture(cap, settled_at, validator)
+        else:
+            frame, problems = capture_fresh_frame(cap, settled_at, validator)
+        if problems:
+            log_warning(f" Tile {index}: re-captured after {', '.join(problems)} frame.", tile=index)
+    scan_timing.record("grab", start)
+    if frame is None:
+        log_error(f"Failed to capture image at tile {index}.", tile=index)
+        return None
+    return frame
 
-    # Flip the frame before saving (same as preview)
-    flipped_frame = cv2.cvtColor(cv2.flip(frame, -1), cv2.COLOR_BGR2RGB)
 
-    # Construct metadata to embed in the TIFF
-    metadata = {
+def tile_metadata(tile, x, y):
+    """
+    Per-tile metadata embedded in the TIFF description and mosaic annotations.
+    """
+    return {
         "TileX": x,
         "TileY": y,
         "TileZ": 0,
         "Channel": "Brightfield",
-        "SizeX": flipped_frame.shape[1],
-        "SizeY": flipped_frame.shape[0],
+        "SizeX": tile.shape[1],
+        "SizeY": tile.shape[0],
         "SizeZ": 1,
         "SizeT": 1,
         "SizeC": 1,
         "AcquisitionDate": datetime.now().isoformat(),
-        "Objective": shared_state.objective_label,
-        "GainFactor": shared_state.white_balance_scale,
+        "Objective": shared_state.state.objective_label,
+        "GainFactor": shared_state.state.white_balance.scale,
         "ImageID": str(uuid.uuid4())
         # VoxelSizeX/Y intentionally omitted
     }
 
-    # Convert metadata dict to string
-    description = "\n".join([f"{k}={v}" for k, v in metadata.items()])
+
+def save_frame(frame, save_dir, index, x, y, mosaic=None, write_tile=True, compression=NO_COMPRESSION):
+    """
+    Applies white balance, flips and writes a raw camera frame as tile_XXXX.tif
+    (encoded as set by `compression`, a TileCompression) and/or into a streaming
+    mosaic (see mosaic_writer). The tile is also placed on the live overview
+    of the running scan, if there is one (see overview_canvas).
+    Returns the tile filename.
+    """
+    # White balance (if enabled), flip (same as preview) and BGR -> RGB in reused buffers
+    flipped_frame = default_preprocessor.process_tile(frame)
+
+    # Construct metadata to embed in the TIFF
+    metadata = tile_metadata(flipped_frame, x, y)
 
     # Create output path and filename
     filename = f"tile_{index:04d}.tif"
-    path = os.path.join(save_dir, filename)
 
-    # Save as TIFF with metadata
-    tifffile.imwrite(
-        path,
-        flipped_frame,
-        description=description,
-        photometric='rgb' if flipped_frame.ndim == 3 else 'minisblack'
-    )
+    if mosaic is not None:
+        start = time.perf_counter()
+        mosaic.add_tile(flipped_frame, index, x, y, metadata)
+        scan_timing.record("mosaic", start)
+
+    overview = shared_state.state.overview
+    if overview is not None:
+        start = time.perf_counter()
+        overview.add_tile(flipped_frame, x, y)
+        scan_timing.record("overview", start)
+
+    if write_tile:
+        # Convert metadata dict to string
+        description = "\n".join([f"{k}={v}" for k, v in metadata.items()])
+
+        # Save as TIFF with metadata (encode and write times are recorded when a scan is timed)
+        with scan_timing.timed_output(os.path.join(save_dir, filename)) as target:
+            tifffile.imwrite(
+                target,
+                flipped_frame,
+                description=description,
+                photometric='rgb' if flipped_frame.ndim == 3 else 'minisblack',
+                **compression.imwrite_kwargs(flipped_frame.shape)
+            )
 
     return filename
+
+
+def capture_image(cap, save_dir, index, x, y, mosaic=None, write_tile=True, compression=NO_COMPRESSION,
+                  settled_at=None, validator=None, stacking=None):
+    frame = grab_frame(cap, index, settled_at, validator, stacking)
+    if frame is None:
+        return None
+    return save_frame(frame, save_dir, index, x, y, mosaic=mosaic, write_tile=write_tile,
+                      compression=compression)
@@ -1,12 +1,182 @@
+"""
+Scan folders and the scan log.
+
+Each scan gets its own ScanLog (opened by create_scan_folder / open_scan_folder
+and closed by close_scan_log), held as shared_state.state.scan_log while the
+scan runs. Logging calls only format the line and put it on a queue, together
+with the caller's sys.stdout; one background thread echoes queued lines to the
+console and appends them to the log files in batches, keeping each file open,
+and flushes them every FLUSH_INTERVAL seconds, immediately after ERROR lines,
+and at exit.
+
+    log_info(" Scan started")
+    log_warning(" Slow stage settle", tile=12, x=51000, y=370200)
+
+File lines carry the level and any structured fields:
+    [2025-01-01 10:00:00] WARNING  Slow stage settle | tile=12 x=51000 y=370200
+"""
+import atexit
 import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 
+from microscope_scan_tool import shared_state
+
 BASE_SAVE_DIR = os.path.join(os.getcwd(), "ScanOutputs")
-LOG_FILE = None  
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+CONSOLE_LEVEL = "INFO"   # lower levels go to the log file only
+FLUSH_INTERVAL = 1.0     # seconds between file flushes
+MAX_BATCH = 512          # lines written per batch at most
+
+_FLUSH = object()
+
+
+class ScanLog:
+    """
+    Log file of one scan. Lines are appended by the background writer only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __repr__(self):
+        return f"ScanLog({self.path!r})"
+
+    def _write(self, lines):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.writelines(lines)
+
+    def _flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _LogWriter:
+    """
+    Background thread that prints and batch-writes queued
+    (ScanLog or None, file line or None, console line or None, stream, urgent) items.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="scan-log-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put(item)
+
+    def _run(self):
+        dirty = set()
+        last_flush = time.monotonic()
+        while True:
+            try:
+                items = [self._queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < MAX_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batches = {}
+            streams = set()
+            flush_now = False
+            done = []
+            for item in items:
+                if item[0] is _FLUSH:
+                    _, log, close, event = item
+                    flush_now = True
+                    done.append((log, close, event))
+                    continue
+                log, line, console, stream, urgent = item
+                if console is not None:
+                    try:
+                        stream.write(console + "\n")
+                        streams.add(stream)
+                    except (OSError, ValueError):
+                        pass  # console closed or redirected to a closed file
+                if line is not None:
+                    batches.setdefault(log, []).append(line)
+                flush_now = flush_now or urgent
+
+            for stream in streams:
+                try:
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+
+            for log, lines in batches.items():
+                try:
+                    log._write(lines)
+                    dirty.add(log)
+                except OSError as e:
+                    print(f"  Could not write to {log.path}: {e}")
+            if flush_now or time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                for log in dirty:
+                    try:
+                        log._flush()
+                    except OSError:
+                        pass
+                dirty.clear()
+                last_flush = time.monotonic()
+            for log, close, event in done:
+                if close and log is not None:
+                    log._close()
+                event.set()
+
+    def flush(self, log=None, close=False, timeout=5.0):
+        """
+        Blocks until every line queued so far is on disk (and `log` is closed if close=True).
+        """
+        if self._thread is None:
+            if close and log is not None:
+                log._close()
+            return True
+        event = threading.Event()
+        self._queue.put((_FLUSH, log, close, event))
+        return event.wait(timeout)
+
+
+_writer = _LogWriter()
+
+
+def _activate(path):
+    """
+    Opens the ScanLog at `path` as the log of the scan that is starting and returns it.
+    """
+    close_scan_log()
+    scan_log = ScanLog(path)
+    shared_state.state.scan_log = scan_log
+    return scan_log
+
+
+def current_log():
+    """
+    The ScanLog messages currently go to, or None outside a scan.
+    """
+    return shared_state.state.scan_log
+
 
 def create_scan_folder(objective_name=None):
     timestamp = datetime.now().strftime("Scan_%Y-%m-%d_%H-%M-%S")
-    
+
     if objective_name:
         folder_name = f"{timestamp}_{objective_name}"
     else:
@@ -15,22 +185,78 @@ def create_scan_folder(objective_name=None):
     folder_path = os.path.join(BASE_SAVE_DIR, folder_name)
     os.makedirs(folder_path, exist_ok=True)
 
-    global LOG_FILE
-    LOG_FILE = os.path.join(folder_path, f"{timestamp}_log.txt")
+    _activate(os.path.join(folder_path, f"{timestamp}_log.txt"))
+    return folder_path
+
+
+def open_scan_folder(folder_path):
+    """
+    Continues logging into an existing scan folder (used when resuming a scan).
+    """
+    logs = sorted(name for name in os.listdir(folder_path) if name.endswith("_log.txt"))
+    name = logs[-1] if logs else datetime.now().strftime("Scan_%Y-%m-%d_%H-%M-%S_log.txt")
+    _activate(os.path.join(folder_path, name))
     return folder_path
 
 
-def log_error(message):
+def close_scan_log():
+    """
+    Writes out and closes the current scan's log; later messages go to the console only.
+    """
+    state = shared_state.state
+    log, state.scan_log = state.scan_log, None
+    if log is not None:
+        _writer.flush(log, close=True)
+
+
+def flush(timeout=5.0):
+    """
+    Waits until every queued log line is printed, written and flushed.
+    """
+    return _writer.flush(timeout=timeout)
+
+
+def _shutdown():
+    close_scan_log()
+    flush()
+
+
+def log(message, level="INFO", **fields):
     """
-    Logs messages to both the terminal and the scan log file.
+    Logs a message to the console (at CONSOLE_LEVEL and above) and, during a
+    scan, to the scan log file with its level and structured fields. Both are
+    done by the background writer; the caller only formats and enqueues.
     """
-    global LOG_FILE
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_line = f"[{timestamp}] {message}"
+    severity = LEVELS[level]
+    console = f"[{timestamp}] {message}" if severity >= LEVELS[CONSOLE_LEVEL] else None
+
+    scan_log = shared_state.state.scan_log
+    line = None
+    if scan_log is not None:
+        extra = " | " + " ".join(f"{k}={v}" for k, v in fields.items()) if fields else ""
+        line = f"[{timestamp}] {level:<7} {message.strip()}{extra}\n"
+    if console is not None or line is not None:
+        _writer.put((scan_log, line, console, sys.stdout, severity >= LEVELS["ERROR"]))
+
+
+def log_debug(message, **fields):
+    log(message, "DEBUG", **fields)
+
+
+def log_info(message, **fields):
+    log(message, "INFO", **fields)
+
+
+def log_warning(message, **fields):
+    log(message, "WARNING", **fields)
+
+
+def log_error(message, **fields):
+    """
+    Logs an error (see log()); also flushes the log file promptly.
+    """
+    log(message, "ERROR", **fields)
 
-    # Save to file
-    if LOG_FILE:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(log_line + "\n")
 
-    print(log_line)
+atexit.register(_shutdown)
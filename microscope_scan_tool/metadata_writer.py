@@ -1,24 +1,59 @@
+import glob
 import os
+import re
 from datetime import datetime
-from pycromanager import Core
 
-def save_fiji_metadata(save_dir, positions):
+def save_fiji_metadata(save_dir, positions, output_name=None, decimals=0):
     """
     Saves stage coordinates in FIJI-compatible TileConfiguration format.
     
     Args:
         save_dir (str): Directory to save the .txt file.
         positions (list of tuples): (filename, x, y)
+        output_name (str): File name to use instead of TileConfiguration_<timestamp>.txt.
+        decimals (int): Digits kept after the decimal point (0 writes whole numbers).
     """
     os.makedirs(save_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    output_file = os.path.join(save_dir, f"TileConfiguration_{timestamp}.txt")
+    if output_name is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_name = f"TileConfiguration_{timestamp}.txt"
+    output_file = os.path.join(save_dir, output_name)
 
     with open(output_file, "w") as f:
         f.write("\n")  # Required blank first line for FIJI
         f.write("dim = 2\n")
         for filename, x, y in positions:
-            f.write(f"{filename}; ; ({int(x)}, {int(y)})\n")
+            if decimals:
+                f.write(f"{filename}; ; ({x:.{decimals}f}, {y:.{decimals}f})\n")
+            else:
+                f.write(f"{filename}; ; ({int(x)}, {int(y)})\n")
 
     print(f"FIJI metadata saved to: {output_file}")
     return output_file
+
+
+TILE_LINE = re.compile(r"^\s*([^;]+?)\s*;\s*;\s*\(\s*([-\d.eE+]+)\s*,\s*([-\d.eE+]+)\s*\)")
+
+
+def load_fiji_metadata(path):
+    """
+    Reads a TileConfiguration file written by save_fiji_metadata.
+
+    Returns:
+        list of tuples: (filename, x, y)
+    """
+    positions = []
+    with open(path) as f:
+        for line in f:
+            match = TILE_LINE.match(line)
+            if match:
+                positions.append((match.group(1), float(match.group(2)), float(match.group(3))))
+    return positions
+
+
+def find_tile_configuration(scan_dir):
+    """
+    Returns the newest TileConfiguration_*.txt in a scan folder, or None.
+    """
+    candidates = sorted(glob.glob(os.path.join(scan_dir, "TileConfiguration_*.txt")))
+    return candidates[-1] if candidates else None
@@ -0,0 +1,223 @@
+"""
+One Micro-Manager session shared by the GUI and the scan.
+
+get_session() returns a process-wide MicroscopeSession around a single core
+(one pycromanager bridge connection, or the simulator's core), so the GUI and
+snake_like_scan no longer open a Core each. Every pycromanager call is a ZMQ
+round trip, so the session avoids the ones that cannot change anything:
+
+- device property values are cached: set_property is skipped when the device
+  already has the value (and so is a following wait_for_device on that device),
+  get_property is answered from the cache. Only properties the program alone
+  controls are cached; the turret and hub (LIVE_DEVICES) can be operated by
+  hand, so their values are always read live before a set is skipped;
+- wait_for_device is skipped for a device that was waited on and has not been
+  commanded since;
+- the XY stage and focus device names are read once (focus moves and Z stacks
+  ask for the focus device on every tile); XY positions are read with one
+  get_xy_stage_position call instead of separate X and Y reads
+  (stage_settling.read_xy).
+
+Cached property values also expire after PROPERTY_CACHE_TTL seconds;
+set_property then re-reads the value (one cheap call) before deciding to skip.
+Every call (forwarded or skipped) is counted with its latency; see report().
+
+pycromanager bridges must be used from the thread that created them, which is
+the main thread for both the GUI and the scan.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from microscope_scan_tool.hardware import MM_PORT, active_simulator, connect_core
+
+PROPERTY_CACHE_TTL = 60.0  # seconds a cached property value is trusted
+LIVE_DEVICES = ("Objective", "OlympusHub")  # can be changed by hand: never answered from the cache
+
+_sessions = {}           # port -> session on real hardware
+_simulated_session = None
+_sessions_lock = threading.Lock()
+
+
+class CallStats:
+    """
+    Per-method call counts, skipped calls and latency.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.skipped = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.slowest = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.calls[name] += 1
+            self.seconds[name] += seconds
+            self.slowest[name] = max(self.slowest[name], seconds)
+
+    def skip(self, name):
+        with self._lock:
+            self.skipped[name] += 1
+
+    def totals(self):
+        """
+        (calls made, calls skipped, seconds spent in calls).
+        """
+        with self._lock:
+            return sum(self.calls.values()), sum(self.skipped.values()), sum(self.seconds.values())
+
+    def reset(self):
+        with self._lock:
+            for table in (self.calls, self.skipped, self.seconds, self.slowest):
+                table.clear()
+
+
+class MicroscopeSession:
+    """
+    Drop-in replacement for the core: the calls listed in the module docstring
+    are cached, every other Core method is forwarded; all are counted and timed.
+    """
+
+    def __init__(self, core, property_ttl=PROPERTY_CACHE_TTL):
+        self.core = core
+        self.property_ttl = property_ttl
+        self.stats = CallStats()
+        self._properties = {}  # (device, property) -> (value as str, time.monotonic() when known)
+        self._idle = set()     # devices waited on and not commanded since
+        self._names = {}       # cached device names (xy stage, focus)
+
+    def _call(self, name, *args):
+        start = time.perf_counter()
+        try:
+            return getattr(self.core, name)(*args)
+        finally:
+            self.stats.record(name, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        attr = getattr(self.core, name)
+        if not callable(attr):
+            return attr
+
+        def forwarded(*args):
+            return self._call(name, *args)
+
+        return forwarded
+
+    def _cached_property(self, device, prop):
+        if device in LIVE_DEVICES:
+            return None
+        entry = self._properties.get((device, prop))
+        if entry is None or time.monotonic() - entry[1] > self.property_ttl:
+            return None
+        return entry[0]
+
+    def get_property(self, device, prop):
+        value = self._cached_property(device, prop)
+        if value is not None:
+            self.stats.skip("get_property")
+            return value
+        value = str(self._call("get_property", device, prop))
+        self._properties[(device, prop)] = (value, time.monotonic())
+        return value
+
+    def set_property(self, device, prop, value):
+        """
+        Sets a device property unless it already has this value (checked against
+        the cache, or with one get_property when the cached value is unknown or
+        expired, and always for LIVE_DEVICES). Returns True if the call was made.
+        """
+        current = self._cached_property(device, prop)
+        if current is None:
+            try:
+                current = self.get_property(device, prop)
+            except Exception:
+                current = None
+        if current == str(value):
+            self.stats.skip("set_property")
+            return False
+        self._call("set_property", device, prop, value)
+        self._properties[(device, prop)] = (str(value), time.monotonic())
+        self._idle.discard(device)
+        return True
+
+    def invalidate(self, device=None):
+        """
+        Forgets cached property values (of one device, or all).
+        """
+        if device is None:
+            self._properties.clear()
+            self._idle.clear()
+        else:
+            self._properties = {k: v for k, v in self._properties.items() if k[0] != device}
+            self._idle.discard(device)
+
+    def wait_for_device(self, device):
+        if device in self._idle:
+            self.stats.skip("wait_for_device")
+            return
+        self._call("wait_for_device", device)
+        self._idle.add(device)
+
+    def _device_name(self, getter):
+        if getter not in self._names:
+            self._names[getter] = self._call(getter)
+        else:
+            self.stats.skip(getter)
+        return self._names[getter]
+
+    def get_xy_stage_device(self):
+        return self._device_name("get_xy_stage_device")
+
+    def get_focus_device(self):
+        return self._device_name("get_focus_device")
+
+    def set_xy_position(self, x, y):
+        self._call("set_xy_position", x, y)
+        self._idle.discard(self.get_xy_stage_device())
+
+    def set_position(self, *args):
+        # set_position(z) or set_position(device, z), like Core.setPosition
+        self._call("set_position", *args)
+        self._idle.discard(args[0] if len(args) > 1 else self.get_focus_device())
+
+    def report(self):
+        """
+        Lines summarising the Micro-Manager calls of this session.
+        """
+        made, skipped, seconds = self.stats.totals()
+        lines = [f" Micro-Manager calls: {made} made in {seconds:.2f} s, {skipped} skipped (cached)"]
+        for name in sorted(set(self.stats.calls) | set(self.stats.skipped),
+                           key=lambda n: self.stats.seconds[n], reverse=True):
+            calls = self.stats.calls[name]
+            mean = 1000 * self.stats.seconds[name] / calls if calls else 0.0
+            lines.append(f"   {name:<24}{calls:>7} calls{self.stats.skipped[name]:>7} skipped"
+                         f"{mean:>9.2f} ms avg{1000 * self.stats.slowest[name]:>9.1f} ms max")
+        return lines
+
+
+def get_session(port=MM_PORT):
+    """
+    The shared session for the active backend (created on first use).
+    """
+    global _simulated_session
+    simulator = active_simulator()
+    with _sessions_lock:
+        if simulator is not None:
+            if _simulated_session is None or _simulated_session.core is not simulator.core:
+                _simulated_session = MicroscopeSession(simulator.core)
+            return _simulated_session
+        if port not in _sessions:
+            _sessions[port] = MicroscopeSession(connect_core(port))
+        return _sessions[port]
+
+
+def close_sessions():
+    """
+    Drops every cached session (the next get_session() reconnects).
+    """
+    global _simulated_session
+    with _sessions_lock:
+        _sessions.clear()
+        _simulated_session = None
@@ -0,0 +1,370 @@
+"""
+Streaming multiscale mosaic output.
+
+Tiles are written into a chunked OME-Zarr (NGFF 0.4, bioformats2raw layout) as
+they are acquired, at their stage position, and every pyramid level is updated
+from the same tile, so no stitching pass is needed afterwards. Chunks live in a
+bounded LRU cache and are read back from disk if a later tile overlaps them,
+so memory does not grow with the scan size.
+
+The Zarr v2 format is written directly (JSON metadata plus zlib-compressed chunk
+files), so no zarr package is needed. export_ome_tiff() converts a finished
+mosaic into a tiled pyramidal OME-TIFF, streaming one tile at a time.
+"""
+import json
+import os
+import threading
+import xml.etree.ElementTree as ET
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from microscope_scan_tool.objectives import FRAME_SIZE, um_per_pixel
+
+MOSAIC_DIRNAME = "mosaic.ome.zarr"
+CHUNK_SIZE = 512
+MIN_LEVEL_SIZE = 512         # stop adding pyramid levels below this size
+CACHE_BYTES = 256 * 2 ** 20  # decoded chunks kept in memory across all levels
+COMPRESSION_LEVEL = 1        # zlib level for chunk files, None for uncompressed
+FILL_VALUE = 255             # background of areas not covered by any tile
+OME_NS = "http://www.openmicroscopy.org/Schemas/OME/2016-06"
+
+
+class _ChunkCache:
+    """
+    LRU of decoded chunks shared by all pyramid levels. Dirty chunks are written
+    to disk when evicted or flushed.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()  # (array, key) -> [chunk, dirty]
+
+    def get(self, array, key):
+        entry = self._entries.get((array, key))
+        if entry is not None:
+            self._entries.move_to_end((array, key))
+            return entry
+        entry = [array.load_chunk(key), False]
+        self._entries[(array, key)] = entry
+        self.bytes += entry[0].nbytes
+        self._evict()
+        return entry
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            (array, key), (chunk, dirty) = self._entries.popitem(last=False)
+            if dirty:
+                array.store_chunk(key, chunk)
+            self.bytes -= chunk.nbytes
+
+    def flush(self):
+        for (array, key), entry in self._entries.items():
+            if entry[1]:
+                array.store_chunk(key, entry[0])
+                entry[1] = False
+
+
+class ZarrArray:
+    """
+    Minimal Zarr v2 array of uint8 with "/"-separated chunk keys.
+    """
+
+    def __init__(self, path, shape=None, chunks=None, fill_value=FILL_VALUE,
+                 compression_level=COMPRESSION_LEVEL, cache=None):
+        self.path = path
+        if shape is None:
+            with open(os.path.join(path, ".zarray")) as f:
+                meta = json.load(f)
+            shape, chunks, fill_value = meta["shape"], meta["chunks"], meta["fill_value"]
+            compression_level = meta["compressor"]["level"] if meta["compressor"] else None
+        else:
+            os.makedirs(path, exist_ok=True)
+            meta = {
+                "zarr_format": 2,
+                "shape": list(shape),
+                "chunks": list(chunks),
+                "dtype": "|u1",
+                "compressor": None if compression_level is None else {"id": "zlib", "level": compression_level},
+                "fill_value": fill_value,
+                "order": "C",
+                "filters": None,
+                "dimension_separator": "/",
+            }
+            with open(os.path.join(path, ".zarray"), "w") as f:
+                json.dump(meta, f, indent=2)
+
+        self.shape = tuple(shape)
+        self.chunks = tuple(chunks)
+        self.fill_value = fill_value
+        self.compression_level = compression_level
+        self.cache = cache or _ChunkCache(CACHE_BYTES)
+
+    def _chunk_path(self, key):
+        return os.path.join(self.path, *(str(k) for k in key))
+
+    def load_chunk(self, key):
+        path = self._chunk_path(key)
+        if not os.path.exists(path):
+            return np.full(self.chunks, self.fill_value, dtype=np.uint8)
+        with open(path, "rb") as f:
+            data = f.read()
+        if self.compression_level is not None:
+            data = zlib.decompress(data)
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.chunks).copy()
+
+    def store_chunk(self, key, chunk):
+        path = self._chunk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = chunk.tobytes()
+        if self.compression_level is not None:
+            data = zlib.compress(data, self.compression_level)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _regions(self, y0, x0, h, w):
+        """
+        Yields (chunk key, slice inside the chunk, slice inside the region) for a
+        (channel, y, x) region, clipped to the array bounds.
+        """
+        _, height, width = self.shape
+        _, ch, cw = self.chunks
+        y_start, y_stop = max(y0, 0), min(y0 + h, height)
+        x_start, x_stop = max(x0, 0), min(x0 + w, width)
+        for cy in range(y_start // ch, (y_stop - 1) // ch + 1 if y_stop > y_start else 0):
+            for cx in range(x_start // cw, (x_stop - 1) // cw + 1 if x_stop > x_start else 0):
+                ya, yb = max(y_start, cy * ch), min(y_stop, (cy + 1) * ch)
+                xa, xb = max(x_start, cx * cw), min(x_stop, (cx + 1) * cw)
+                yield (
+                    (0, cy, cx),
+                    (slice(None), slice(ya - cy * ch, yb - cy * ch), slice(xa - cx * cw, xb - cx * cw)),
+                    (slice(None), slice(ya - y0, yb - y0), slice(xa - x0, xb - x0)),
+                )
+
+    def write(self, y0, x0, data):
+        """
+        Writes a (channels, h, w) block with its top-left corner at (y0, x0).
+        """
+        for key, chunk_slice, data_slice in self._regions(y0, x0, data.shape[1], data.shape[2]):
+            entry = self.cache.get(self, key)
+            entry[0][chunk_slice] = data[data_slice]
+            entry[1] = True
+
+    def read(self, y0, x0, h, w):
+        out = np.full((self.shape[0], h, w), self.fill_value, dtype=np.uint8)
+        for key, chunk_slice, data_slice in self._regions(y0, x0, h, w):
+            out[data_slice] = self.cache.get(self, key)[0][chunk_slice]
+        return out
+
+
+def _write_json(path, content):
+    with open(path, "w") as f:
+        json.dump(content, f, indent=2)
+
+
+def build_ome_xml(name, size_x, size_y, um_per_px, origin, objective_label, tiles):
+    """
+    OME-XML for an RGB mosaic; per-tile stage positions and capture metadata are
+    stored as MapAnnotations linked to the image.
+    """
+    ET.register_namespace("", OME_NS)
+    ome = ET.Element(f"{{{OME_NS}}}OME")
+    instrument = ET.SubElement(ome, f"{{{OME_NS}}}Instrument", ID="Instrument:0")
+    ET.SubElement(instrument, f"{{{OME_NS}}}Objective", ID="Objective:0", Model=str(objective_label))
+
+    image = ET.SubElement(ome, f"{{{OME_NS}}}Image", ID="Image:0", Name=name)
+    ET.SubElement(image, f"{{{OME_NS}}}AcquisitionDate").text = datetime.now().isoformat(timespec="seconds")
+    ET.SubElement(image, f"{{{OME_NS}}}InstrumentRef", ID="Instrument:0")
+    ET.SubElement(image, f"{{{OME_NS}}}ObjectiveSettings", ID="Objective:0")
+    pixels = ET.SubElement(
+        image, f"{{{OME_NS}}}Pixels", ID="Pixels:0", DimensionOrder="XYCZT", Type="uint8",
+        SizeX=str(size_x), SizeY=str(size_y), SizeC="3", SizeZ="1", SizeT="1",
+        PhysicalSizeX=str(um_per_px), PhysicalSizeXUnit="µm",
+        PhysicalSizeY=str(um_per_px), PhysicalSizeYUnit="µm",
+        Interleaved="false",
+    )
+    ET.SubElement(pixels, f"{{{OME_NS}}}Channel", ID="Channel:0:0", Name="Brightfield", SamplesPerPixel="3")
+    ET.SubElement(pixels, f"{{{OME_NS}}}MetadataOnly")
+    ET.SubElement(pixels, f"{{{OME_NS}}}Plane", TheC="0", TheZ="0", TheT="0",
+                  PositionX=str(origin[0]), PositionXUnit="µm",
+                  PositionY=str(origin[1]), PositionYUnit="µm")
+
+    annotations = ET.SubElement(ome, f"{{{OME_NS}}}StructuredAnnotations")
+    for i, tile in enumerate(tiles):
+        ET.SubElement(image, f"{{{OME_NS}}}AnnotationRef", ID=f"Annotation:{i}")
+        annotation = ET.SubElement(annotations, f"{{{OME_NS}}}MapAnnotation", ID=f"Annotation:{i}",
+                                   Namespace="microscope_scan_tool/tile")
+        value = ET.SubElement(annotation, f"{{{OME_NS}}}Value")
+        for k, v in tile.items():
+            ET.SubElement(value, f"{{{OME_NS}}}M", K=str(k)).text = str(v)
+
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(ome, encoding="unicode")
+
+
+class OmeZarrMosaicWriter:
+    """
+    Writes tiles into a multiscale OME-Zarr mosaic as they arrive.
+
+    The canvas covers every planned position; tile (x, y) is the stage position
+    of the tile centre. add_tile() is thread-safe and may be called from the
+    writer pool; call close() once to flush chunks and write the metadata.
+    """
+
+    def __init__(self, path, positions, objective_label, frame_size=FRAME_SIZE, chunk_size=CHUNK_SIZE,
+                 cache_bytes=CACHE_BYTES, compression_level=COMPRESSION_LEVEL):
+        self.path = path
+        self.objective_label = objective_label
+        self.um_per_px = um_per_pixel(objective_label)
+        self.frame_size = frame_size
+
+        fov_w = frame_size[0] * self.um_per_px
+        fov_h = frame_size[1] * self.um_per_px
+        xs = [p[0] for p in positions]
+        ys = [p[1] for p in positions]
+        self.origin = (min(xs) - fov_w / 2, min(ys) - fov_h / 2)
+        width = int(np.ceil((max(xs) - min(xs) + fov_w) / self.um_per_px))
+        height = int(np.ceil((max(ys) - min(ys) + fov_h) / self.um_per_px))
+
+        self._lock = threading.Lock()
+        self._cache = _ChunkCache(cache_bytes)
+        self._tiles = []
+
+        image_dir = os.path.join(path, "0")
+        os.makedirs(os.path.join(path, "OME"), exist_ok=True)
+        self.levels = []
+        level = 0
+        while True:
+            shape = (3, max(1, height >> level), max(1, width >> level))
+            self.levels.append(ZarrArray(os.path.join(image_dir, str(level)), shape,
+                                         (3, chunk_size, chunk_size), FILL_VALUE, compression_level, self._cache))
+            if max(shape[1:]) <= MIN_LEVEL_SIZE:
+                break
+            level += 1
+
+    def add_tile(self, tile, index, x, y, metadata=None):
+        """
+        Places an upright RGB tile (H, W, 3) centred at stage position (x, y) on
+        every pyramid level.
+        """
+        h, w = tile.shape[:2]
+        col = (x - self.origin[0]) / self.um_per_px - w / 2
+        row = (y - self.origin[1]) / self.um_per_px - h / 2
+
+        # Downsample outside the lock; each level is half the previous one
+        blocks = []
+        current = tile
+        for level in range(len(self.levels)):
+            if level > 0:
+                size = (max(1, current.shape[1] // 2), max(1, current.shape[0] // 2))
+                current = cv2.resize(current, size, interpolation=cv2.INTER_AREA)
+            block = current.reshape(current.shape[0], current.shape[1], -1).transpose(2, 0, 1)
+            blocks.append((int(round(row / 2 ** level)), int(round(col / 2 ** level)), block))
+
+        record = {"Index": index, "StageX": x, "StageY": y, "PixelX": int(round(col)), "PixelY": int(round(row))}
+        record.update(metadata or {})
+        with self._lock:
+            for array, (r, c, block) in zip(self.levels, blocks):
+                array.write(r, c, block)
+            self._tiles.append(record)
+
+    def close(self):
+        with self._lock:
+            self._cache.flush()
+            self._write_metadata()
+
+    def _write_metadata(self):
+        image_dir = os.path.join(self.path, "0")
+        name = os.path.basename(os.path.dirname(os.path.abspath(self.path)))
+        datasets = [
+            {
+                "path": str(level),
+                "coordinateTransformations": [
+                    {"type": "scale", "scale": [1.0, self.um_per_px * 2 ** level, self.um_per_px * 2 ** level]},
+                    {"type": "translation", "translation": [0.0, self.origin[1], self.origin[0]]},
+                ],
+            }
+            for level in range(len(self.levels))
+        ]
+        _write_json(os.path.join(self.path, ".zgroup"), {"zarr_format": 2})
+        _write_json(os.path.join(self.path, ".zattrs"), {"bioformats2raw.layout": 3})
+        _write_json(os.path.join(image_dir, ".zgroup"), {"zarr_format": 2})
+        _write_json(os.path.join(image_dir, ".zattrs"), {
+            "multiscales": [{
+                "version": "0.4",
+                "name": name,
+                "axes": [
+                    {"name": "c", "type": "channel"},
+                    {"name": "y", "type": "space", "unit": "micrometer"},
+                    {"name": "x", "type": "space", "unit": "micrometer"},
+                ],
+                "datasets": datasets,
+                "type": "area",
+            }],
+            "omero": {
+                "rdefs": {"model": "color"},
+                "channels": [
+                    {"label": label, "color": color, "active": True,
+                     "window": {"start": 0, "end": 255, "min": 0, "max": 255}}
+                    for label, color in (("Red", "FF0000"), ("Green", "00FF00"), ("Blue", "0000FF"))
+                ],
+            },
+        })
+        _write_json(os.path.join(self.path, "OME", ".zgroup"), {"zarr_format": 2})
+        _write_json(os.path.join(self.path, "OME", ".zattrs"), {"series": ["0"]})
+
+        level0 = self.levels[0]
+        xml = build_ome_xml(name, level0.shape[2], level0.shape[1], self.um_per_px, self.origin,
+                            self.objective_label, sorted(self._tiles, key=lambda t: t["Index"]))
+        with open(os.path.join(self.path, "OME", "METADATA.ome.xml"), "w", encoding="utf-8") as f:
+            f.write(xml)
+
+
+def export_ome_tiff(zarr_path, tiff_path, tile_size=256):
+    """
+    Converts a finished OME-Zarr mosaic into a tiled, pyramidal OME-TIFF (levels
+    as SubIFDs), reading one tile at a time.
+    """
+    import tifffile
+
+    image_dir = os.path.join(zarr_path, "0")
+    with open(os.path.join(image_dir, ".zattrs")) as f:
+        multiscales = json.load(f)["multiscales"][0]
+    cache = _ChunkCache(CACHE_BYTES)
+    levels = [ZarrArray(os.path.join(image_dir, d["path"]), cache=cache) for d in multiscales["datasets"]]
+
+    # The stored XML describes planar Zarr data; the TIFF is interleaved RGB
+    ET.register_namespace("", OME_NS)
+    ome = ET.parse(os.path.join(zarr_path, "OME", "METADATA.ome.xml")).getroot()
+    for pixels in ome.iter(f"{{{OME_NS}}}Pixels"):
+        pixels.set("Interleaved", "true")
+        for i, child in enumerate(list(pixels)):
+            if child.tag == f"{{{OME_NS}}}MetadataOnly":
+                pixels.remove(child)
+                pixels.insert(i, ET.Element(f"{{{OME_NS}}}TiffData", IFD="0", PlaneCount="1"))
+    # TIFF description tags must be 7-bit ASCII ("µm" becomes a character reference)
+    ome_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(ome, encoding="unicode")
+    ome_xml = ome_xml.encode("ascii", "xmlcharrefreplace").decode("ascii")
+
+    def tiles(array):
+        _, height, width = array.shape
+        for y in range(0, height, tile_size):
+            for x in range(0, width, tile_size):
+                yield array.read(y, x, tile_size, tile_size).transpose(1, 2, 0)
+
+    with tifffile.TiffWriter(tiff_path, bigtiff=True) as tif:
+        for level, array in enumerate(levels):
+            _, height, width = array.shape
+            options = dict(
+                shape=(height, width, 3), dtype=np.uint8, tile=(tile_size, tile_size),
+                photometric="rgb", compression="zlib", compressionargs={"level": COMPRESSION_LEVEL or 1},
+                metadata=None,
+            )
+            if level == 0:
+                tif.write(tiles(array), description=ome_xml, subifds=len(levels) - 1, **options)
+            else:
+                tif.write(tiles(array), subfiletype=1, **options)
+    return tiff_path
@@ -0,0 +1,26 @@
+"""
+Optical constants per objective used to map tile pixels to stage microns.
+
+Tile images are assumed to be aligned with the stage axes and centred on the
+commanded stage position, which is what the TileConfiguration export assumes.
+"""
+
+FRAME_SIZE = (1920, 1080)  # capture resolution (width, height)
+
+# Nominal pixel size at FRAME_SIZE
+NOMINAL_UM_PER_PIXEL = {
+    "4x": 1.0,
+    "20x": 0.2,
+}
+
+
+def um_per_pixel(objective_label):
+    return NOMINAL_UM_PER_PIXEL[objective_label]
+
+
+def field_of_view(objective_label, frame_size=FRAME_SIZE):
+    """
+    Returns the (width, height) of one tile in stage microns.
+    """
+    scale = um_per_pixel(objective_label)
+    return frame_size[0] * scale, frame_size[1] * scale
@@ -0,0 +1,266 @@
+"""
+Visiting order for arbitrary tile sets that minimises estimated stage move time.
+
+Move time is modelled per axis (trapezoidal velocity profile, X and Y moving
+concurrently) plus a fixed per-move overhead, so the planner prefers moves along
+the faster axis and penalises many short hops. Orders are built from a few cheap
+heuristics (given order, row/column serpentines, greedy nearest neighbour) and
+the best one is improved with neighbour-list 2-opt under a time budget.
+"""
+import math
+import time
+
+import numpy as np
+
+NEIGHBOURS = 8              # candidate neighbours per tile for greedy / 2-opt
+TIME_BUDGET = 2.0           # seconds spent improving an order
+
+
+class TravelProfile:
+    """
+    Stage motion parameters used to estimate move times.
+    Speeds in µm/s, accelerations in µm/s², overhead in seconds per move.
+    """
+
+    def __init__(self, x_speed=20000.0, y_speed=20000.0, x_accel=200000.0, y_accel=200000.0,
+                 move_overhead=0.05):
+        self.x_speed = x_speed
+        self.y_speed = y_speed
+        self.x_accel = x_accel
+        self.y_accel = y_accel
+        self.move_overhead = move_overhead
+
+
+DEFAULT_PROFILE = TravelProfile()
+
+
+def _axis_time(distance, speed, accel):
+    """
+    Vectorised rest-to-rest trapezoidal move time for one axis.
+    """
+    distance = np.abs(distance)
+    ramp = speed * speed / accel
+    short = 2.0 * np.sqrt(distance / accel)
+    long = distance / speed + speed / accel
+    return np.where(distance < ramp, short, long)
+
+
+def move_times(xy_from, xy_to, profile=DEFAULT_PROFILE):
+    """
+    Estimated seconds for each move from xy_from[i] to xy_to[i] (arrays of shape (n, 2)).
+    """
+    delta = np.asarray(xy_to, dtype=np.float64) - np.asarray(xy_from, dtype=np.float64)
+    tx = _axis_time(delta[..., 0], profile.x_speed, profile.x_accel)
+    ty = _axis_time(delta[..., 1], profile.y_speed, profile.y_accel)
+    moving = (delta[..., 0] != 0) | (delta[..., 1] != 0)
+    return np.maximum(tx, ty) + profile.move_overhead * moving
+
+
+def estimate_travel_time(positions, profile=DEFAULT_PROFILE, start=None):
+    """
+    Total estimated move time to visit `positions` in the given order, starting
+    from `start` (default: already at the first position).
+    """
+    xy = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    if start is not None:
+        xy = np.vstack([np.asarray(start, dtype=np.float64), xy])
+    if len(xy) < 2:
+        return 0.0
+    return float(move_times(xy[:-1], xy[1:], profile).sum())
+
+
+class _CostModel:
+    """
+    Scalar move-time lookups for the inner loops of the heuristics.
+    """
+
+    def __init__(self, xy, profile):
+        self.x = xy[:, 0].tolist()
+        self.y = xy[:, 1].tolist()
+        self.p = profile
+        self.x_ramp = profile.x_speed ** 2 / profile.x_accel
+        self.y_ramp = profile.y_speed ** 2 / profile.y_accel
+
+    def __call__(self, a, b):
+        p = self.p
+        dx = abs(self.x[a] - self.x[b])
+        dy = abs(self.y[a] - self.y[b])
+        if dx == 0 and dy == 0:
+            return 0.0
+        tx = 2.0 * math.sqrt(dx / p.x_accel) if dx < self.x_ramp else dx / p.x_speed + p.x_speed / p.x_accel
+        ty = 2.0 * math.sqrt(dy / p.y_accel) if dy < self.y_ramp else dy / p.y_speed + p.y_speed / p.y_accel
+        return max(tx, ty) + p.move_overhead
+
+
+def _neighbour_lists(xy, profile, k):
+    """
+    k cheapest neighbours of every tile, found through a uniform grid in
+    time-scaled coordinates so the search stays near O(n).
+    """
+    n = len(xy)
+    k = min(k, n - 1)
+    scaled = xy / np.array([profile.x_speed, profile.y_speed])
+    span = np.maximum(scaled.max(axis=0) - scaled.min(axis=0), 1e-9)
+    cell = max(math.sqrt(span[0] * span[1] * (k + 1) / n), span.max() / max(n, 1), 1e-9)
+    cells = np.floor((scaled - scaled.min(axis=0)) / cell).astype(np.int64)
+
+    buckets = {}
+    for idx, key in enumerate(map(tuple, cells)):
+        buckets.setdefault(key, []).append(idx)
+
+    neighbours = []
+    for idx in range(n):
+        cx, cy = cells[idx]
+        ring = 1
+        while True:
+            candidates = [
+                j
+                for gx in range(cx - ring, cx + ring + 1)
+                for gy in range(cy - ring, cy + ring + 1)
+                for j in buckets.get((gx, gy), ())
+                if j != idx
+            ]
+            if len(candidates) >= k or len(candidates) == n - 1:
+                break
+            ring += 1
+
+        candidates = np.array(candidates, dtype=np.int64)
+        costs = move_times(np.broadcast_to(xy[idx], (len(candidates), 2)), xy[candidates], profile)
+        best = np.argsort(costs, kind="stable")[:k]
+        neighbours.append(candidates[best].tolist())
+    return neighbours
+
+
+def _serpentine(xy, axis):
+    """
+    Boustrophedon order over rows of equal coordinate on the other axis: rows of
+    equal Y (top to bottom, like calc_positions) for axis=0, columns of equal X
+    for axis=1.
+    """
+    other = 1 - axis
+    order = []
+    forward = True
+    for value in sorted(set(xy[:, other].tolist()), reverse=(other == 1)):
+        members = np.flatnonzero(xy[:, other] == value)
+        members = members[np.argsort(xy[members, axis], kind="stable")]
+        order.extend(members if forward else members[::-1])
+        forward = not forward
+    return order
+
+
+def _greedy(xy, profile, neighbours, cost, start):
+    n = len(xy)
+    visited = np.zeros(n, dtype=bool)
+    order = [start]
+    visited[start] = True
+    current = start
+    for _ in range(n - 1):
+        nxt = next((j for j in neighbours[current] if not visited[j]), None)
+        if nxt is None:
+            # All near neighbours used up: fall back to a vectorised scan of the rest
+            remaining = np.flatnonzero(~visited)
+            costs = move_times(np.broadcast_to(xy[current], (len(remaining), 2)), xy[remaining], profile)
+            nxt = int(remaining[np.argmin(costs)])
+        order.append(nxt)
+        visited[nxt] = True
+        current = nxt
+    return order
+
+
+def _two_opt(order, neighbours, cost, deadline):
+    """
+    Neighbour-list 2-opt on an open path with a fixed first tile.
+    """
+    order = np.array(order, dtype=np.int64)
+    n = len(order)
+    pos = np.empty(n, dtype=np.int64)
+    pos[order] = np.arange(n)
+
+    def reverse(i, j):
+        order[i:j + 1] = order[i:j + 1][::-1].copy()
+        pos[order[i:j + 1]] = np.arange(i, j + 1)
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(n - 1):
+            if time.perf_counter() >= deadline:
+                break
+            a = int(order[i])
+
+            # Successor side: replace (a, succ) and (c, after_c) with (a, c) and (succ, after_c)
+            succ = int(order[i + 1])
+            d_succ = cost(a, succ)
+            for c in neighbours[a]:
+                d_ac = cost(a, c)
+                if d_ac >= d_succ:
+                    break
+                j = int(pos[c])
+                if j <= i + 1:
+                    continue
+                old = d_succ + (cost(c, int(order[j + 1])) if j + 1 < n else 0.0)
+                new = d_ac + (cost(succ, int(order[j + 1])) if j + 1 < n else 0.0)
+                if new < old - 1e-12:
+                    reverse(i + 1, j)
+                    improved = True
+                    break
+
+            # Predecessor side: replace (pred, a) and (before_c, c) with (c, a) and (before_c, pred)
+            if i < 2:
+                continue
+            a = int(order[i])
+            pred = int(order[i - 1])
+            d_pred = cost(pred, a)
+            for c in neighbours[a]:
+                d_ca = cost(c, a)
+                if d_ca >= d_pred:
+                    break
+                j = int(pos[c])
+                if j >= i - 1 or j < 1:
+                    continue
+                before = int(order[j - 1])
+                old = d_pred + cost(before, c)
+                new = d_ca + cost(before, pred)
+                if new < old - 1e-12:
+                    reverse(j, i - 1)
+                    improved = True
+                    break
+    return order.tolist()
+
+
+def optimize_tile_order(positions, profile=DEFAULT_PROFILE, time_budget=TIME_BUDGET, neighbours=NEIGHBOURS):
+    """
+    Returns `positions` reordered to minimise estimated move time. The first
+    position stays first (it is where the scan was planned to start).
+    The result is never worse than the given order.
+    """
+    if len(positions) < 3:
+        return list(positions)
+
+    deadline = time.perf_counter() + time_budget
+    xy = np.asarray(positions, dtype=np.float64)
+    cost = _CostModel(xy, profile)
+    near = _neighbour_lists(xy, profile, neighbours)
+
+    def path_time(order):
+        return estimate_travel_time(xy[order], profile)
+
+    def anchored(order):
+        # Keep the original first tile at the start, walking whichever way is cheaper
+        order = list(order)
+        k = order.index(0)
+        forward = order[k:] + order[:k][::-1]
+        backward = order[k::-1] + order[k + 1:]
+        return min((forward, backward), key=path_time)
+
+    candidates = [
+        list(range(len(xy))),
+        anchored(_serpentine(xy, 0)),
+        anchored(_serpentine(xy, 1)),
+        _greedy(xy, profile, near, cost, 0),
+    ]
+    best = min(candidates, key=path_time)
+    improved = _two_opt(best, near, cost, deadline)
+    if path_time(improved) < path_time(best):
+        best = improved
+    return [positions[i] for i in best]
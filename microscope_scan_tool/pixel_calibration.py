@@ -0,0 +1,266 @@
+"""
+Pixel size, camera rotation and field of view, measured with the stage.
+
+measure_pixel_calibration() moves the stage by known offsets around one
+position (a quarter of the nominal field of view, so the frames still overlap
+by three quarters), measures how far the image moved by phase correlation
+of the overlap strips, and fits the 2x2 map from stage microns to
+pixels by least squares. From it come µm/pixel along both stage axes, the
+rotation of the camera against the stage axes and the field of view.
+
+Calibrations are cached as small JSON files under CALIBRATION_DIR, keyed by
+objective label and capture resolution (like the shading calibrations).
+scan_plan.step_sizes() uses the cached field of view to place tiles for a
+target overlap. This module imports OpenCV and the hardware helpers only when
+measuring, so reading a calibration stays cheap.
+"""
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from microscope_scan_tool.objectives import FRAME_SIZE, field_of_view
+
+CALIBRATION_DIR = os.path.join(os.path.expanduser("~"), ".microscope_scan_tool", "calibration")
+CALIBRATION_TRAVEL = 0.25       # stage offsets as a fraction of the nominal field of view
+CALIBRATION_MOVES = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1))
+COARSE_TRAVEL = 0.05            # first pass: moves short enough to be unambiguous on periodic structure
+COARSE_MOVES = ((1, 0), (-1, 0), (0, 1), (0, -1))
+MAX_SCALE_ERROR = 0.15          # the nominal pixel size may be off by this much
+FINE_SEARCH_PX = 6              # search radius (downsampled px) around a predicted shift
+DOWNSAMPLE = 2                  # frames are registered at half resolution (less sensor noise, faster)
+MAX_RESIDUAL_PX = 2.0           # RMS misfit of the stage-to-pixel map above which the calibration is refused
+
+
+class PixelCalibration:
+    """
+    Measured µm/pixel along the stage X and Y axes, camera rotation against the
+    stage axes (degrees) and the capture size they were measured at.
+    """
+
+    def __init__(self, objective_label, um_per_px, rotation_deg=0.0, size=FRAME_SIZE, residual_px=0.0, source=""):
+        self.objective_label = objective_label
+        self.um_per_px = tuple(float(v) for v in um_per_px)
+        self.rotation_deg = float(rotation_deg)
+        self.size = tuple(int(v) for v in size)
+        self.residual_px = float(residual_px)
+        self.source = source
+        self.path = None
+
+    def __repr__(self):
+        return (f"pixel calibration for {self.objective_label}: {self.um_per_px[0]:.4f} x {self.um_per_px[1]:.4f} "
+                f"µm/px, rotation {round(self.rotation_deg, 2) + 0.0:+.2f}°")
+
+    def field_of_view(self):
+        """
+        (width, height) of one frame in stage microns.
+        """
+        return self.size[0] * self.um_per_px[0], self.size[1] * self.um_per_px[1]
+
+    def covered_field(self):
+        """
+        (width, height) of the largest stage-aligned rectangle, centred on the
+        tile, that the rotated field of view still covers. Tiles stepped by
+        this much leave no gaps.
+        """
+        width, height = self.field_of_view()
+        cos, sin = math.cos(math.radians(self.rotation_deg)), abs(math.sin(math.radians(self.rotation_deg)))
+        det = cos * cos - sin * sin
+        covered = ((width * cos - height * sin) / det, (height * cos - width * sin) / det) if det > 0 else (0, 0)
+        if min(covered) <= 0:
+            raise ValueError(f"Camera rotation of {self.rotation_deg:.1f}° leaves no stage-aligned field")
+        return covered
+
+    def step_sizes(self, overlap):
+        """
+        (x_step, y_step) in whole µm for neighbouring tiles to share at least `overlap` percent.
+        """
+        keep = 1.0 - overlap / 100.0
+        width, height = self.covered_field()
+        return max(1, int(width * keep)), max(1, int(height * keep))
+
+    def to_dict(self):
+        return {"objective": self.objective_label, "size": list(self.size), "um_per_px": list(self.um_per_px),
+                "rotation_deg": self.rotation_deg, "residual_px": self.residual_px, "source": self.source,
+                "created": datetime.now().isoformat()}
+
+    def save(self, directory=CALIBRATION_DIR):
+        """
+        Writes the calibration to its cache file and returns the path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = pixel_calibration_path(self.objective_label, self.size, directory)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        self.path = path
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        calibration = cls(data["objective"], data["um_per_px"], data.get("rotation_deg", 0.0), data["size"],
+                          data.get("residual_px", 0.0), data.get("source", ""))
+        calibration.path = path
+        return calibration
+
+
+def pixel_calibration_path(objective_label, size=FRAME_SIZE, directory=CALIBRATION_DIR):
+    return os.path.join(directory, f"pixels_{objective_label}_{size[0]}x{size[1]}.json")
+
+
+def load_pixel_calibration(objective_label, size=FRAME_SIZE, directory=CALIBRATION_DIR):
+    """
+    Cached calibration for an objective and capture size, or None if there is none.
+    """
+    path = pixel_calibration_path(objective_label, size, directory)
+    if not os.path.exists(path):
+        return None
+    return PixelCalibration.load(path)
+
+
+def _fit_map(offsets, shifts):
+    """
+    Least-squares 2x2 map M with shift = M @ offset, and its RMS misfit in pixels.
+    """
+    offsets = np.asarray(offsets, dtype=np.float64)
+    shifts = np.asarray(shifts, dtype=np.float64)
+    solution, _, _, _ = np.linalg.lstsq(offsets, shifts, rcond=None)
+    m = solution.T
+    residual = float(np.sqrt(np.mean(np.sum((shifts - offsets @ m.T) ** 2, axis=1))))
+    return m, residual
+
+
+def fit_pixel_calibration(offsets, shifts, objective_label, size=FRAME_SIZE, source=""):
+    """
+    Fits stage offsets (n, 2) in µm to the measured frame offsets (n, 2) in
+    pixels of the upright frame (as registration measures them: +x when the
+    stage moved +x). Raises ValueError if the motion is mirrored or the fit is poor.
+    """
+    if len(offsets) < 3:
+        raise ValueError(f"Only {len(offsets)} stage moves could be measured; move to textured tissue and retry")
+    # shift = M @ offset with M = R(-rotation) / (µm per pixel) for a camera rotated against the stage
+    m, residual = _fit_map(offsets, shifts)
+    if np.linalg.det(m) <= 0:
+        raise ValueError("Image motion is mirrored against the stage motion; check the camera flip")
+    if residual > MAX_RESIDUAL_PX:
+        raise ValueError(f"Image shifts do not follow the stage moves (RMS misfit {residual:.1f} px)")
+    rotation = math.degrees(math.atan2(m[0, 1] - m[1, 0], m[0, 0] + m[1, 1]))
+    um_per_px = 1.0 / np.linalg.norm(m[:, 0]), 1.0 / np.linalg.norm(m[:, 1])
+    return PixelCalibration(objective_label, um_per_px, rotation, size, residual, source)
+
+
+def _shift_near(reference, frame, expected, search_px):
+    """
+    Offset of `frame` against `reference` (pixels) within `search_px` of
+    `expected`, and the cross-correlation of the overlap there. Like
+    registration.overlap_offset, but the correlation peak is searched only
+    inside that radius, so a stronger peak from periodic structure elsewhere
+    cannot win. Returns (None, -1.0) if the frames do not overlap.
+    """
+    import cv2
+
+    from microscope_scan_tool.registration import MIN_OVERLAP_PX, _overlap_correlation
+
+    h, w = reference.shape[:2]
+    dx, dy = int(round(expected[0])), int(round(expected[1]))
+    xa0, xa1 = max(0, dx), min(w, w + dx)
+    ya0, ya1 = max(0, dy), min(h, h + dy)
+    if xa1 - xa0 < MIN_OVERLAP_PX or ya1 - ya0 < MIN_OVERLAP_PX:
+        return None, -1.0
+    strip_a = reference[ya0:ya1, xa0:xa1]
+    strip_b = frame[ya0 - dy:ya1 - dy, xa0 - dx:xa1 - dx]
+    window = cv2.createHanningWindow((strip_a.shape[1], strip_a.shape[0]), cv2.CV_32F)
+    spectrum_a = np.fft.rfft2((strip_a - strip_a.mean()) * window)
+    cross = spectrum_a * np.conj(np.fft.rfft2((strip_b - strip_b.mean()) * window))
+    surface = np.fft.fftshift(np.fft.irfft2(cross / (np.abs(cross) + 1e-12), s=strip_a.shape))
+
+    # Peak inside the search radius, refined to sub-pixel by the centroid of its 3x3 neighbourhood
+    cy, cx = surface.shape[0] // 2, surface.shape[1] // 2
+    r = int(min(search_px, cy - 1, cx - 1))
+    patch = surface[cy - r:cy + r + 1, cx - r:cx + r + 1]
+    py, px = np.unravel_index(np.argmax(patch), patch.shape)
+    py, px = min(max(py, 1), 2 * r - 1), min(max(px, 1), 2 * r - 1)
+    peak = np.clip(patch[py - 1:py + 2, px - 1:px + 2], 0, None)
+    grid = np.arange(-1, 2)
+    total = peak.sum() or 1.0
+    ex = px - r + float((peak.sum(axis=0) * grid).sum()) / total
+    ey = py - r + float((peak.sum(axis=1) * grid).sum()) / total
+    score = _overlap_correlation(reference, frame, dx + int(round(ex)), dy + int(round(ey)))
+    return (dx + ex, dy + ey), score
+
+
+def measure_pixel_calibration(core, cap, objective_label, travel=CALIBRATION_TRAVEL, moves=CALIBRATION_MOVES):
+    """
+    Calibrates the objective that is in place at the current stage position,
+    which should show textured tissue. Every move in `moves` (multiples of
+    `travel` times the nominal field of view) is imaged and registered
+    against the frame at the start; the stage returns to the start afterwards.
+
+    A first pass of short moves (COARSE_TRAVEL) measures the map roughly
+    around the nominal pixel size; it predicts the long moves closely enough
+    that periodic structure cannot be mistaken for the true shift.
+    Raises RuntimeError if the camera fails or too few moves can be registered.
+    """
+    import cv2
+
+    from microscope_scan_tool.frame_freshness import fresh_frame
+    from microscope_scan_tool.registration import MIN_CORRELATION
+    from microscope_scan_tool.stage_controller import move_stage
+    from microscope_scan_tool.stage_settling import read_xy
+
+    def grey_frame():
+        frame = fresh_frame(cap, time.perf_counter())
+        if frame is None:
+            raise RuntimeError("Camera did not deliver a frame")
+        frame = cv2.flip(frame, -1)  # the capture path stores tiles upright
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (w // DOWNSAMPLE, h // DOWNSAMPLE), interpolation=cv2.INTER_AREA)
+        return small.astype(np.float32), (w, h)
+
+    def move(x, y):
+        # Offsets are taken between commanded positions, which is what scan plans use
+        move_stage(core, x, y)
+        core.wait_for_device(core.get_xy_stage_device())
+
+    x0, y0 = read_xy(core)
+    move(x0, y0)
+    reference, size = grey_frame()
+    nominal_w, nominal_h = field_of_view(objective_label, size)
+    nominal_um = nominal_w / size[0]
+
+    def register(moves, fraction, predict, search_px):
+        offsets, shifts = [], []
+        for mx, my in moves:
+            offset = (mx * fraction * nominal_w, my * fraction * nominal_h)
+            move(x0 + offset[0], y0 + offset[1])
+            expected = np.asarray(predict(offset)) / DOWNSAMPLE
+            frame, _ = grey_frame()
+            shift, score = _shift_near(reference, frame, expected, search_px(expected))
+            if shift is not None and score >= MIN_CORRELATION:
+                offsets.append(offset)
+                shifts.append((shift[0] * DOWNSAMPLE, shift[1] * DOWNSAMPLE))
+        return offsets, shifts
+
+    try:
+        offsets, shifts = register(COARSE_MOVES, COARSE_TRAVEL, lambda o: np.asarray(o) / nominal_um,
+                                   lambda e: MAX_SCALE_ERROR * np.abs(e).max() + FINE_SEARCH_PX)
+        if len(offsets) < 2:
+            raise RuntimeError(f"Too little texture at ({x0:.0f}, {y0:.0f}) for calibration; "
+                               "move to tissue and retry")
+        coarse, _ = _fit_map(offsets, shifts)
+        offsets, shifts = register(moves, travel, lambda o: coarse @ np.asarray(o), lambda e: FINE_SEARCH_PX)
+    finally:
+        move(x0, y0)
+    try:
+        return fit_pixel_calibration(offsets, shifts, objective_label, size,
+                                     source=f"stage at ({x0:.0f}, {y0:.0f}), {len(offsets)} of {len(moves)} moves")
+    except ValueError as e:
+        raise RuntimeError(str(e)) from e
@@ -0,0 +1,135 @@
+"""
+Per-frame preprocessing shared by the capture path and the live preview.
+
+White balance is applied through per-channel lookup tables that are rebuilt only
+when the white balance settings change (one WhiteBalance snapshot is read per
+frame). With a shading calibration active (shared_state.state.shading_calibration),
+white balance and flat-field correction are fused into one per-pixel float gain
+map instead, also rebuilt only when either changes, and applied with a single
+cv2.multiply after dark-frame subtraction.
+The 180° flip and the BGR -> RGB swap are done together by a single cv2.flip
+over the frame viewed as one H x (W*3) plane (reversing that row reverses both
+pixel and channel order). A tile therefore takes two passes over the frame
+(white balance, then flip + colour swap; three with dark-frame subtraction):
+OpenCV cannot apply a LUT while writing through a reversed view, and a NumPy
+gather that would do it in one pass is slower than both cv2 passes together.
+Output goes into per-thread buffers that are reused from frame to frame.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from microscope_scan_tool import scan_timing, shared_state
+from microscope_scan_tool.white_balance_utils import build_white_balance_lut, white_balance_is_valid
+
+
+class TilePreprocessor:
+    """
+    Applies white balance, flip and colour conversion with no per-frame allocations,
+    in two passes over the frame (see the module docstring).
+
+    Returned arrays are per-thread buffers: they stay valid until the same thread
+    processes its next frame, so callers that keep a frame must copy it.
+    """
+
+    def __init__(self):
+        self._lut_lock = threading.Lock()
+        self._lut_key = None
+        self._lut = None
+        self._gain_key = None
+        self._gain = None
+        self._dark = None
+        self._local = threading.local()
+
+    def current_lut(self):
+        """
+        Returns the BGR white balance LUT for the current shared_state settings,
+        or None when white balance is off.
+        """
+        wb = shared_state.state.white_balance
+        if not wb.on or not white_balance_is_valid(wb.medians, wb.scale):
+            return None
+
+        key = (wb.medians, float(wb.scale))
+        with self._lut_lock:
+            if key != self._lut_key:
+                self._lut = build_white_balance_lut(wb.medians, wb.scale)
+                self._lut_key = key
+            return self._lut
+
+    def current_shading(self, frame):
+        """
+        Returns (gain, dark) for the active shading calibration fused with the
+        current white balance, or None when no calibration applies to this frame size.
+        """
+        calibration = shared_state.state.shading_calibration
+        if calibration is None or calibration.size != (frame.shape[1], frame.shape[0]):
+            return None
+
+        wb = shared_state.state.white_balance
+        wb_on = wb.on and white_balance_is_valid(wb.medians, wb.scale)
+        wb_key = (wb.medians, float(wb.scale)) if wb_on else None
+        key = (calibration, wb_key)
+        with self._lut_lock:
+            if key != self._gain_key:
+                # Same per-channel gain as the white balance LUT: value / (median * scale) * 255
+                channel_gains = 255.0 / (np.asarray(wb.medians, dtype=np.float32) * wb.scale) if wb_on else None
+                self._gain = calibration.gain_map(channel_gains)
+                self._dark = calibration.dark_frame()
+                self._gain_key = key
+            return self._gain, self._dark
+
+    def _buffer(self, name, like):
+        buf = getattr(self._local, name, None)
+        if buf is None or buf.shape != like.shape or buf.dtype != like.dtype:
+            buf = np.empty_like(like)
+            setattr(self._local, name, buf)
+        return buf
+
+    def process_tile(self, frame):
+        """
+        Raw BGR camera frame -> shading-corrected, white-balanced, upright RGB tile.
+        """
+        start = time.perf_counter()
+        shading = self.current_shading(frame)
+        src = frame
+        if shading is not None:
+            gain, dark = shading
+            if dark is not None:
+                src = cv2.subtract(src, dark, dst=self._buffer("dark_subtracted", frame))
+            src = cv2.multiply(src, gain, dst=self._buffer("balanced", frame), dtype=cv2.CV_8U)
+        else:
+            lut = self.current_lut()
+            if lut is not None:
+                src = cv2.LUT(frame, lut, dst=self._buffer("balanced", frame))
+        scan_timing.record("white_balance", start)
+
+        start = time.perf_counter()
+        out = self._buffer("tile", frame)
+        if frame.ndim == 3:
+            h, w, c = frame.shape
+            cv2.flip(src.reshape(h, w * c), -1, dst=out.reshape(h, w * c))
+        else:
+            cv2.flip(src, -1, dst=out)
+        scan_timing.record("flip", start)
+        return out
+
+    def white_balance(self, frame):
+        """
+        Raw BGR frame -> white-balanced BGR frame (the input itself when WB is off).
+        """
+        lut = self.current_lut()
+        if lut is None:
+            return frame
+        return cv2.LUT(frame, lut, dst=self._buffer("preview_balanced", frame))
+
+    def flip_for_display(self, frame):
+        """
+        180° flip of a BGR frame for the preview window.
+        """
+        return cv2.flip(frame, -1, dst=self._buffer("preview_flipped", frame))
+
+
+default_preprocessor = TilePreprocessor()
@@ -0,0 +1,250 @@
+"""
+Tile registration: pairwise phase correlation on the overlap strips of
+neighbouring tiles, followed by a global weighted least-squares layout.
+
+The result is written as TileConfiguration.registered.txt next to the raw
+TileConfiguration, in the same (stage micron) coordinates.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import tifffile
+
+from microscope_scan_tool.metadata_writer import find_tile_configuration, load_fiji_metadata, save_fiji_metadata
+from microscope_scan_tool.objectives import um_per_pixel
+
+REGISTERED_FILENAME = "TileConfiguration.registered.txt"
+MIN_OVERLAP_PX = 16        # ignore neighbour pairs that overlap less than this
+MIN_CORRELATION = 0.3      # overlap cross-correlation below this is treated as no match
+MAX_STAGE_ERROR_UM = 30.0  # offsets further than this from the stage positions are not plausible
+PRIOR_WEIGHT = 1e-3        # pull towards the stage position (fixes gauge, keeps isolated tiles)
+MAX_RESIDUAL_PX = 10.0     # pairs disagreeing with the global layout by more are dropped
+OUTLIER_ROUNDS = 3
+TILE_CACHE_SIZE = 32       # grayscale tiles kept in memory while correlating
+
+
+def infer_objective(scan_dir):
+    """
+    Reads the objective label from a scan folder name (Scan_<timestamp>_<objective>).
+    """
+    match = re.search(r"_(\d+x)$", os.path.basename(os.path.normpath(scan_dir)))
+    if not match:
+        raise ValueError(f"Cannot infer the objective from '{scan_dir}'; pass objective_label")
+    return match.group(1)
+
+
+class _TileCache:
+    """
+    Small thread-safe LRU of grayscale float32 tiles.
+    """
+
+    def __init__(self, scan_dir, size=TILE_CACHE_SIZE):
+        self.scan_dir = scan_dir
+        self.size = size
+        self._lock = threading.Lock()
+        self._tiles = OrderedDict()
+
+    def get(self, filename):
+        with self._lock:
+            if filename in self._tiles:
+                self._tiles.move_to_end(filename)
+                return self._tiles[filename]
+
+        image = tifffile.imread(os.path.join(self.scan_dir, filename))
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        gray = image.astype(np.float32)
+
+        with self._lock:
+            self._tiles[filename] = gray
+            while len(self._tiles) > self.size:
+                self._tiles.popitem(last=False)
+        return gray
+
+
+def find_neighbour_pairs(positions_px, tile_size):
+    """
+    Index pairs (a, b), a < b, of tiles whose footprints overlap by at least
+    MIN_OVERLAP_PX in both directions. Uses a grid of tile-sized cells.
+    """
+    w, h = tile_size
+    cells = {}
+    for i, (x, y) in enumerate(positions_px):
+        cells.setdefault((int(x // w), int(y // h)), []).append(i)
+
+    pairs = []
+    for i, (x, y) in enumerate(positions_px):
+        cx, cy = int(x // w), int(y // h)
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in cells.get((gx, gy), ()):
+                    if j <= i:
+                        continue
+                    dx, dy = abs(positions_px[j][0] - x), abs(positions_px[j][1] - y)
+                    if w - dx >= MIN_OVERLAP_PX and h - dy >= MIN_OVERLAP_PX:
+                        pairs.append((i, j))
+    return pairs
+
+
+def _overlap_correlation(tile_a, tile_b, dx, dy):
+    """
+    Normalised cross-correlation of the pixels two tiles share when tile_b sits
+    at integer offset (dx, dy) from tile_a. Returns -1 if they barely overlap.
+    """
+    h, w = tile_a.shape[:2]
+    xa0, xa1 = max(0, dx), min(w, w + dx)
+    ya0, ya1 = max(0, dy), min(h, h + dy)
+    if xa1 - xa0 < MIN_OVERLAP_PX or ya1 - ya0 < MIN_OVERLAP_PX:
+        return -1.0
+    a = tile_a[ya0:ya1, xa0:xa1]
+    b = tile_b[ya0 - dy:ya1 - dy, xa0 - dx:xa1 - dx]
+    a = a - a.mean()
+    b = b - b.mean()
+    denom = np.sqrt(float((a * a).sum()) * float((b * b).sum()))
+    return float((a * b).sum()) / denom if denom > 0 else -1.0
+
+
+def overlap_offset(tile_a, tile_b, expected, max_error_px=None):
+    """
+    Measures the offset of tile_b relative to tile_a (pixels) near `expected`
+    by phase correlation of their overlap strips.
+
+    Phase correlation only knows the shift modulo the strip size, so each
+    wrap-around reading is checked by normalised cross-correlation of the
+    resulting overlap and the best one is kept. Readings more than
+    `max_error_px` from `expected` (in either axis) are ignored.
+
+    Returns ((dx, dy), correlation), or (None, -1.0) if the tiles do not overlap.
+    """
+    h, w = tile_a.shape[:2]
+    dx, dy = int(round(expected[0])), int(round(expected[1]))
+    xa0, xa1 = max(0, dx), min(w, w + dx)
+    ya0, ya1 = max(0, dy), min(h, h + dy)
+    if xa1 - xa0 < MIN_OVERLAP_PX or ya1 - ya0 < MIN_OVERLAP_PX:
+        return None, -1.0
+
+    strip_a = tile_a[ya0:ya1, xa0:xa1]
+    strip_b = tile_b[ya0 - dy:ya1 - dy, xa0 - dx:xa1 - dx]
+    strip_h, strip_w = strip_a.shape
+    window = cv2.createHanningWindow((strip_w, strip_h), cv2.CV_32F)
+    (ex, ey), _ = cv2.phaseCorrelate(strip_b, strip_a, window)
+
+    best, best_score = None, -1.0
+    for cx in (ex, ex - np.sign(ex) * strip_w):
+        for cy in (ey, ey - np.sign(ey) * strip_h):
+            if max_error_px is not None and max(abs(cx), abs(cy)) > max_error_px:
+                continue
+            score = _overlap_correlation(tile_a, tile_b, dx + int(round(cx)), dy + int(round(cy)))
+            if score > best_score:
+                best, best_score = (dx + cx, dy + cy), score
+    return best, best_score
+
+
+def solve_layout(initial, pairs, offsets, weights, prior_weight=PRIOR_WEIGHT, iterations=500, tol=1e-6):
+    """
+    Weighted least squares for tile positions P given pairwise measurements
+    P[b] - P[a] = offset, with a weak prior P = initial. Solved per axis with
+    matrix-free conjugate gradients on (L + prior * I), so it scales to
+    thousands of tiles.
+    """
+    n = len(initial)
+    initial = np.asarray(initial, dtype=np.float64)
+    if not len(pairs):
+        return initial.copy()
+
+    a = np.asarray([p[0] for p in pairs])
+    b = np.asarray([p[1] for p in pairs])
+    weights = np.asarray(weights, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.float64)
+
+    def apply(v):
+        diff = weights * (v[b] - v[a])
+        return prior_weight * v + np.bincount(b, diff, n) - np.bincount(a, diff, n)
+
+    solution = np.empty_like(initial)
+    for axis in range(2):
+        rhs = prior_weight * initial[:, axis]
+        wo = weights * offsets[:, axis]
+        rhs = rhs + np.bincount(b, wo, n) - np.bincount(a, wo, n)
+
+        x = initial[:, axis].copy()
+        r = rhs - apply(x)
+        p = r.copy()
+        rs = r @ r
+        for _ in range(iterations):
+            if np.sqrt(rs) <= tol * max(1.0, np.sqrt(rhs @ rhs)):
+                break
+            ap = apply(p)
+            alpha = rs / (p @ ap)
+            x += alpha * p
+            r -= alpha * ap
+            rs_new = r @ r
+            p = r + (rs_new / rs) * p
+            rs = rs_new
+        solution[:, axis] = x
+    return solution
+
+
+def register_scan(scan_dir, objective_label=None, workers=None):
+    """
+    Registers all tiles of a scan folder and writes TileConfiguration.registered.txt.
+    Returns the path of the written file.
+    """
+    objective_label = objective_label or infer_objective(scan_dir)
+    config = find_tile_configuration(scan_dir)
+    if config is None:
+        raise FileNotFoundError(f"No TileConfiguration_*.txt found in {scan_dir}")
+    tiles = load_fiji_metadata(config)
+    if not tiles:
+        raise ValueError(f"{config} lists no tiles")
+
+    scale = um_per_pixel(objective_label)
+    cache = _TileCache(scan_dir)
+    first = cache.get(tiles[0][0])
+    tile_size = (first.shape[1], first.shape[0])
+    stage_px = np.array([(x / scale, y / scale) for _, x, y in tiles])
+    pairs = find_neighbour_pairs(stage_px, tile_size)
+
+    def measure(pair):
+        i, j = pair
+        expected = stage_px[j] - stage_px[i]
+        return overlap_offset(cache.get(tiles[i][0]), cache.get(tiles[j][0]), expected,
+                              max_error_px=MAX_STAGE_ERROR_UM / scale)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = list(pool.map(measure, pairs))
+
+    kept = [(pair, offset, score) for pair, (offset, score) in zip(pairs, results)
+            if offset is not None and score >= MIN_CORRELATION]
+    print(f" Registration: {len(kept)} of {len(pairs)} neighbour pairs matched "
+          f"(correlation >= {MIN_CORRELATION}).")
+
+    # Up to OUTLIER_ROUNDS rounds of dropping inconsistent pairs; the layout is
+    # always solved again after a drop, so it never includes rejected pairs.
+    layout = stage_px
+    for round_number in range(OUTLIER_ROUNDS + 1):
+        if not kept:
+            layout = stage_px
+            break
+        edges = [k[0] for k in kept]
+        offsets = np.array([k[1] for k in kept])
+        layout = solve_layout(stage_px, edges, offsets, [k[2] for k in kept])
+        a, b = np.array(edges).T
+        residual = np.linalg.norm(layout[b] - layout[a] - offsets, axis=1)
+        good = residual <= MAX_RESIDUAL_PX
+        if good.all() or round_number == OUTLIER_ROUNDS:
+            break
+        print(f" Registration: dropping {int((~good).sum())} inconsistent pairs.")
+        kept = [k for k, g in zip(kept, good) if g]
+
+    moved = np.linalg.norm(layout - stage_px, axis=1)
+    print(f" Registration: median correction {np.median(moved) * scale:.1f} µm, "
+          f"max {moved.max() * scale:.1f} µm.")
+
+    registered = [(filename, px * scale, py * scale) for (filename, _, _), (px, py) in zip(tiles, layout)]
+    return save_fiji_metadata(scan_dir, registered, output_name=REGISTERED_FILENAME, decimals=2)
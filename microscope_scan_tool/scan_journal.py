@@ -0,0 +1,168 @@
+"""
+Append-only scan journal (scan_journal.jsonl in the scan folder).
+
+The first record describes the scan plan; every tile that reaches the disk
+adds one record. Each record is flushed and fsync'd before the call returns,
+so after a crash the journal lists exactly the tiles that are safely on disk
+(a torn last line is ignored when reading).
+"""
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+
+from microscope_scan_tool.metadata_writer import save_fiji_metadata
+
+JOURNAL_FILENAME = "scan_journal.jsonl"
+CHECKSUM_CHUNK = 1 << 20
+
+
+def file_checksum(path):
+    """
+    CRC32 of a file as "crc32:xxxxxxxx" (cheap; the file is still in the page cache).
+    """
+    crc = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHECKSUM_CHUNK), b""):
+            crc = zlib.crc32(block, crc)
+    return f"crc32:{crc:08x}"
+
+
+class ScanJournal:
+    """
+    Thread-safe writer for the scan journal. Opening an existing journal
+    appends to it (used when resuming a scan).
+    """
+
+    def __init__(self, scan_dir):
+        self.scan_dir = scan_dir
+        self.path = os.path.join(scan_dir, JOURNAL_FILENAME)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _append(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def start(self, objective_label, positions, output_format="tiles", compression=None, white_balance=None,
+              acquisition=None, shading=None, continuous=None):
+        """
+        Records the scan plan: objective, output and acquisition settings (continuous:
+        the continuous-motion settings, or None for stop-and-go) and every
+        (index, x, y) the scan will visit, so an interrupted scan can be resumed exactly.
+        """
+        self._append({
+            "type": "scan",
+            "time": datetime.now().isoformat(),
+            "objective": objective_label,
+            "output_format": output_format,
+            "compression": compression,
+            "white_balance": white_balance,
+            "acquisition": acquisition,
+            "shading": shading,
+            "continuous": continuous,
+            "positions": [[i, x, y] for i, (x, y) in enumerate(positions, start=1)],
+        })
+
+    def record_tile(self, index, x, y, actual, filename):
+        """
+        Records a tile whose file has been completely written.
+        """
+        path = os.path.join(self.scan_dir, filename)
+        self._append({
+            "type": "tile",
+            "index": index,
+            "x": x,
+            "y": y,
+            "actual_x": None if actual is None else actual[0],
+            "actual_y": None if actual is None else actual[1],
+            "filename": filename,
+            "size": os.path.getsize(path),
+            "checksum": file_checksum(path),
+        })
+
+    def record_event(self, event, **fields):
+        self._append({"type": event, "time": datetime.now().isoformat(), **fields})
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def load_journal(scan_dir):
+    """
+    Reads a scan journal.
+
+    Returns:
+        (plan, tiles): the first "scan" record (or None) and a dict of the last
+        "tile" record per tile index.
+    """
+    path = os.path.join(scan_dir, JOURNAL_FILENAME)
+    plan, tiles = None, {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash
+            if record.get("type") == "scan" and plan is None:
+                plan = record
+            elif record.get("type") == "tile":
+                tiles[record["index"]] = record
+    return plan, tiles
+
+
+def load_events(scan_dir, event):
+    """
+    Returns every record of type `event` in a scan journal, oldest first.
+    """
+    path = os.path.join(scan_dir, JOURNAL_FILENAME)
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") == event:
+                records.append(record)
+    return records
+
+
+def verify_tile(scan_dir, record):
+    """
+    True if the tile file of a journal record exists and matches its size and checksum.
+    """
+    path = os.path.join(scan_dir, record["filename"])
+    try:
+        if os.path.getsize(path) != record["size"]:
+            return False
+        return file_checksum(path) == record["checksum"]
+    except OSError:
+        return False
+
+
+def rebuild_tile_configuration(scan_dir, verify=True, use_actual=False):
+    """
+    Writes a TileConfiguration from the journal (commanded positions, tile order;
+    the recorded actual positions with use_actual=True, as continuous scans do),
+    listing only tiles that are on disk (and intact, with verify=True).
+    Returns the path of the written file, or None if no tile is usable.
+    """
+    _, tiles = load_journal(scan_dir)
+    positions = []
+    for _, record in sorted(tiles.items()):
+        if verify and not verify_tile(scan_dir, record):
+            continue
+        if use_actual and record.get("actual_x") is not None:
+            positions.append((record["filename"], record["actual_x"], record["actual_y"]))
+        else:
+            positions.append((record["filename"], record["x"], record["y"]))
+    if not positions:
+        return None
+    return save_fiji_metadata(scan_dir, positions, decimals=1 if use_actual else 0)
@@ -1,76 +1,251 @@
 import time
 import os
-from datetime import datetime
-from pycromanager import Core
-import cv2
+import shutil
 
-from microscope_scan_tool.image_capture import initialize_camera, capture_image
+# Only the planning modules are imported here; the camera, imaging and TIFF stacks (OpenCV,
+# tifffile) are imported by the functions that acquire, so a dry run loads neither.
+from microscope_scan_tool.hardware import MM_PORT
+from microscope_scan_tool.mm_session import get_session
 from microscope_scan_tool.stage_controller import move_stage
-from microscope_scan_tool.logger import create_scan_folder, log_error
+from microscope_scan_tool.stage_settling import default_motion_model
+from microscope_scan_tool.logger import (close_scan_log, create_scan_folder, log_debug, log_error, log_info,
+                                         log_warning, open_scan_folder)
 from microscope_scan_tool.metadata_writer import save_fiji_metadata
-from microscope_scan_tool import shared_state
-
-# Constants
-MM_PORT = 4827
-HARD_BOUNDARY_CORNERS = [(98097, 391023), (25848, 386490), (26968, 359167), (98097, 365572)]
-HARD_X_MIN, HARD_X_MAX = min(p[0] for p in HARD_BOUNDARY_CORNERS), max(p[0] for p in HARD_BOUNDARY_CORNERS)
-HARD_Y_MIN, HARD_Y_MAX = min(p[1] for p in HARD_BOUNDARY_CORNERS), max(p[1] for p in HARD_BOUNDARY_CORNERS)
-
-# Step size map for objectives
-STEP_SIZES_BY_OBJECTIVE = {
-    "4x": (1800, 1000),
-    "20x": (200, 200),
-}
-
-def calc_positions(y_top, y_bottom, x_left, x_right, x_step, y_step):
-    if (
-        x_left < HARD_X_MIN or x_right > HARD_X_MAX or
-        y_bottom < HARD_Y_MIN or y_top > HARD_Y_MAX
-    ):
-        print(" ERROR: User-defined scan area is outside the allowed boundaries.")
-        print(f"Allowed X: {HARD_X_MIN}–{HARD_X_MAX}, Got: {x_left} - {x_right}")
-        print(f"Allowed Y: {HARD_Y_MIN}–{HARD_Y_MAX}, Got: {y_bottom} - {y_top}")
-        return None
-
-    positions = []
-    y = int(y_top)
-    move_right = True
+from microscope_scan_tool.objectives import um_per_pixel
+from microscope_scan_tool.pixel_calibration import load_pixel_calibration, measure_pixel_calibration
+from microscope_scan_tool.scan_plan import (HARD_X_MAX, HARD_X_MIN, OBJECTIVE_TO_POSITION, GridSummary, calc_positions,
+                                            calibration_lines, step_sizes, tile_footprint)
+from microscope_scan_tool.path_planner import estimate_travel_time, optimize_tile_order
+from microscope_scan_tool.scan_journal import (ScanJournal, load_events, load_journal, rebuild_tile_configuration,
+                                               verify_tile)
+from microscope_scan_tool import scan_timing, shared_state
 
-    # Precompute consistent X positions for vertical alignment
-    x_positions_fixed = list(range(int(x_left), int(x_right) + 1, x_step))
+OUTPUT_FORMATS = ("tiles", "ome-zarr", "both")
+OVERVIEW_FORMATS = {"png": "overview.png", "tiff": "overview.tif"}  # overview option -> file in the scan folder
 
-    while y >= int(y_bottom):
-        row = x_positions_fixed if move_right else list(reversed(x_positions_fixed))
-        positions.extend([(x, y) for x in row])
-        y -= y_step
-        move_right = not move_right
+def snake_like_scan(y_top, y_bottom, x_left, x_right, objective_label="4x", dry_run=False, pipelined=False,
+                    tissue_overview=None, tissue_margin=None, optimize_order=False,
+                    output_format="tiles", register=False, compression=None, autofocus=False,
+                    focus_spacing=None, focus_metric="laplacian", average_frames=1, edf_slices=1,
+                    edf_step_um=None, flat_field=False, timing=False, continuous=False,
+                    max_blur_px=None, exposure_ms=None, overlap=None, overview="png"):
+    """
+    Runs a serpentine tile scan over the given rectangle.
 
-    return positions
+    With pipelined=True the loop only moves the stage and grabs frames; white balance,
+    flipping and TIFF writes run on a bounded background pool (see TileWriterPool).
+    With tissue_overview set to an existing 4x scan folder, only tiles that come
+    within tissue_margin µm (default TISSUE_MARGIN_UM) of tissue in that overview are captured.
+    With optimize_order=True the tiles are visited in the order with the least
+    estimated stage travel time instead of plain serpentine order.
+    output_format is "tiles" (tile_XXXX.tif + TileConfiguration), "ome-zarr"
+    (streaming multiscale mosaic.ome.zarr only) or "both".
+    With register=True the written tiles are registered after the scan and
+    TileConfiguration.registered.txt is saved next to the stage-based one.
+    compression is a codec name ("none", "zlib", "zstd", "lzw", "webp") or a
+    TileCompression for the tile TIFFs; unavailable codecs fall back to zlib.
+    With autofocus=True a focus map is measured first (one autofocus point per
+    focus_spacing µm, scored with focus_metric, see focus_map) and every tile is
+    acquired at the Z interpolated from it.
+    average_frames > 1 averages that many frames per tile; edf_slices > 1 takes
+    a Z stack around each tile's focus (edf_step_um apart) and fuses it into an
+    extended depth of field tile (see frame_stacking).
+    With flat_field=True the cached shading calibration for the objective is
+    applied to every tile together with white balance (see shading_correction).
+    With timing=True every phase of every tile is timed into scan_timing.jsonl
+    and a performance summary is logged at the end (see scan_timing).
+    With continuous=True every row is swept at constant velocity while the camera
+    streams, keeping the frame nearest each tile centre at its measured position
+    (see continuous_scan); max_blur_px (default MAX_BLUR_PX) bounds the motion
+    blur and exposure_ms overrides the exposure the camera reports.
+    overlap (percent) derives the step sizes from the objective's field of view
+    (the measured one if it has a cached pixel calibration, see pixel_calibration)
+    instead of STEP_SIZES_BY_OBJECTIVE.
+    overview ("png", "tiff" or None) builds a downsampled overview of the scan
+    as tiles arrive, shown live next to the preview and saved in the scan
+    folder at the end (see overview_canvas).
+    Tiles whose field of view reaches outside the safe stage area (HARD_BOUNDARY_CORNERS) are skipped.
+    Returns the scan folder, or None if the scan did not run.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output_format '{output_format}', expected one of {OUTPUT_FORMATS}")
+    if overview is not None and overview not in OVERVIEW_FORMATS:
+        raise ValueError(f"Unknown overview '{overview}', expected one of {tuple(OVERVIEW_FORMATS)} or None")
+    if continuous and (autofocus or optimize_order or average_frames > 1 or edf_slices > 1):
+        raise ValueError("continuous=True cannot be combined with autofocus, optimize_order or frame stacking")
+    write_tiles = output_format in ("tiles", "both")
 
-def snake_like_scan(y_top, y_bottom, x_left, x_right, objective_label="4x", dry_run=False):
-    from SupportingFunctions import shared_state
-    shared_state.objective_label = objective_label
-    x_step, y_step = STEP_SIZES_BY_OBJECTIVE.get(objective_label, (1800, 1000))
-    print(f" Using step size for {objective_label}: X_STEP={x_step}, Y_STEP={y_step}")
+    shared_state.state.objective_label = objective_label
+    default_motion_model.select(objective_label)
+    pixels = load_pixel_calibration(objective_label)
+    x_step, y_step = step_sizes(objective_label, overlap, pixels)
+    basis = "" if overlap is None else f" ({overlap:g}% overlap, {'calibrated' if pixels else 'nominal'} field of view)"
+    print(f" Using step size for {objective_label}: X_STEP={x_step}, Y_STEP={y_step}{basis}")
 
-    positions = calc_positions(y_top, y_bottom, x_left, x_right, x_step, y_step)
+    positions = calc_positions(y_top, y_bottom, x_left, x_right, x_step, y_step,
+                               fov=tile_footprint(objective_label, pixels))
     if positions is None:
         log_error("  Scan aborted: user-defined scan area was outside the allowed boundaries.")
         return
 
-    core = Core(port=MM_PORT)
+    if tissue_overview is not None:
+        from microscope_scan_tool.tissue_planner import TISSUE_MARGIN_UM, plan_tissue_positions
+        if tissue_margin is None:
+            tissue_margin = TISSUE_MARGIN_UM
+        positions = plan_tissue_positions(positions, tissue_overview, detail_objective=objective_label,
+                                          margin_um=tissue_margin)
+        if not positions:
+            log_error("  Scan aborted: no tissue found in the overview scan.")
+            return
+
+    if optimize_order:
+        naive_time = estimate_travel_time(positions)
+        positions = optimize_tile_order(positions)
+        optimized_time = estimate_travel_time(positions)
+        print(f" Estimated stage travel: {naive_time:.1f} s serpentine -> {optimized_time:.1f} s optimized "
+              f"({naive_time - optimized_time:.1f} s saved over {len(positions)} tiles)")
+
+    if dry_run:
+        # No hardware is contacted, so dry runs also work on machines without Micro-Manager
+        print("  DRY RUN: Skipping stage movement and image capture.")
+        for line in GridSummary(x_step, y_step).add(positions).lines():
+            print(line)
+        if pixels is not None:
+            for line in calibration_lines(y_top, y_bottom, x_left, x_right, objective_label, pixels, overlap):
+                print(line)
+        else:
+            print(f"No pixel calibration for {objective_label}")
+        if average_frames > 1 or edf_slices > 1:
+            print(f"Would average {average_frames} frames over {edf_slices} Z slice(s) per tile")
+        if autofocus:
+            from microscope_scan_tool.focus_map import FOCUS_SPACING_UM, sample_points
+            spacing = focus_spacing or FOCUS_SPACING_UM.get(objective_label, FOCUS_SPACING_UM["4x"])
+            print(f"Would autofocus {len(sample_points(positions, spacing))} focus map points")
+        if flat_field:
+            from microscope_scan_tool.shading_correction import load_calibration
+            calibration = load_calibration(objective_label)
+            print(f"Would apply {calibration}" if calibration else f"No shading calibration for {objective_label}")
+        if continuous:
+            from microscope_scan_tool.camera_service import DEFAULT_FPS
+            from microscope_scan_tool.continuous_scan import (DEFAULT_EXPOSURE, MAX_BLUR_PX, estimate_scan_time,
+                                                              scan_velocity, tile_overlap)
+            tiles = [(i, x, y) for i, (x, y) in enumerate(positions, start=1)]
+            exposure = exposure_ms / 1000.0 if exposure_ms is not None else DEFAULT_EXPOSURE
+            velocity, limit = scan_velocity(exposure, um_per_pixel(objective_label), DEFAULT_FPS,
+                                            tile_overlap(tiles, objective_label),
+                                            MAX_BLUR_PX if max_blur_px is None else max_blur_px)
+            if velocity > 0:
+                sweep_time = estimate_scan_time(tiles, velocity, (HARD_X_MIN, HARD_X_MAX))
+                # A fresh frame after each stop takes 1.5 frame intervals on average
+                stop_time = estimate_travel_time(positions) + len(positions) * 1.5 / DEFAULT_FPS
+                print(f"Would sweep at {velocity:.0f} µm/s (limited by {limit}): ~{sweep_time:.1f} s "
+                      f"vs ~{stop_time:.1f} s stop-and-go")
+        return
+
+    from microscope_scan_tool.continuous_scan import MAX_BLUR_PX, acquire_continuous
+    from microscope_scan_tool.focus_map import build_focus_map
+    from microscope_scan_tool.frame_stacking import TileStacking
+    from microscope_scan_tool.image_capture import initialize_camera
+    from microscope_scan_tool.mosaic_writer import MOSAIC_DIRNAME, OmeZarrMosaicWriter
+    from microscope_scan_tool.overview_canvas import OverviewCanvas
+    from microscope_scan_tool.tile_compression import resolve_compression
+
+    if max_blur_px is None:
+        max_blur_px = MAX_BLUR_PX
+    compression = resolve_compression(compression)
+    if write_tiles:
+        print(f" Tile compression: {compression}")
+
+    core = prepare_microscope(objective_label)
+    if core is None:
+        return
+    stacking = TileStacking.from_settings(core, objective_label, average_frames, edf_slices, edf_step_um)
+    if stacking.enabled:
+        print(f" Tile acquisition: {stacking}")
+
+    cap = initialize_camera()
+    if cap is None:
+        return
+
+    scan_dir = create_scan_folder(objective_label)
+    shading = _use_shading(objective_label) if flat_field else None
+    journal = ScanJournal(scan_dir)
+    journal.start(objective_label, positions, output_format, vars(compression),
+                  shared_state.state.white_balance.to_dict(), stacking.settings(),
+                  shading.path if shading is not None else None,
+                  {"max_blur_px": max_blur_px, "exposure_ms": exposure_ms} if continuous else None)
+    mosaic = None
+    if output_format in ("ome-zarr", "both"):
+        mosaic = OmeZarrMosaicWriter(os.path.join(scan_dir, MOSAIC_DIRNAME), positions, objective_label)
+    overview_canvas = None
+    if overview is not None:
+        overview_canvas = OverviewCanvas(positions, objective_label,
+                                         um_per_px=sum(pixels.um_per_px) / 2 if pixels else None)
+        shared_state.state.overview = overview_canvas
+
+    tiles = [(i, x, y) for i, (x, y) in enumerate(positions, start=1)]
+    if timing:
+        scan_timing.start(scan_dir)
+    try:
+        focus_map = None
+        if autofocus:
+            focus_map = build_focus_map(core, cap, positions, objective_label, focus_spacing, focus_metric)
+            if focus_map is not None:
+                journal.record_event("focus_map", metric=focus_metric, points=focus_map.to_list())
+        fiji_positions = None
+        if continuous:
+            fiji_positions = acquire_continuous(core, cap, scan_dir, tiles, objective_label, mosaic=mosaic,
+                                                write_tiles=write_tiles, compression=compression, journal=journal,
+                                                max_blur_px=max_blur_px, exposure_ms=exposure_ms,
+                                                x_limits=(HARD_X_MIN, HARD_X_MAX))
+            if fiji_positions is None:
+                log_warning("  Continuous scan unavailable; scanning stop-and-go.")
+        if fiji_positions is None:
+            fiji_positions = acquire_tiles(core, cap, scan_dir, tiles, pipelined=pipelined, mosaic=mosaic,
+                                           write_tiles=write_tiles, compression=compression, journal=journal,
+                                           focus_map=focus_map, stacking=stacking)
+    finally:
+        shared_state.state.shading_calibration = None
+        shared_state.state.overview = None
+        if mosaic is not None:
+            mosaic.close()
+        if overview_canvas is not None:
+            _save_overview(overview_canvas, os.path.join(scan_dir, OVERVIEW_FORMATS[overview]), journal)
+        journal.close()
+        timings = scan_timing.stop() if timing else None
+
+    if timings is not None:
+        for line in scan_timing.summary_lines(timings):
+            log_info(line)
+    session_report = core.report()
+    log_info(session_report[0])
+    for line in session_report[1:]:
+        log_debug(line)
+    if write_tiles:
+        save_fiji_metadata(scan_dir, fiji_positions, decimals=1 if continuous else 0)
+        if register and fiji_positions:
+            _register(scan_dir, objective_label)
+    log_info(f" Scan complete. Images and logs saved in: {scan_dir}")
+    close_scan_log()
+    cap.release()
+    print(" Scan safely stopped.")
+    return scan_dir
+
+
+def prepare_microscope(objective_label):
+    """
+    Takes computer control of the Olympus hub and switches to the objective
+    through the shared Micro-Manager session (settings that are already in
+    place are not sent again). Returns the session, or None on failure.
+    """
+    core = get_session(MM_PORT)
 
     try:
         core.set_property("OlympusHub", "Control", "Manual + Computer")
         print("OlympusHub Control set to 'Manual + Computer'.")
     except Exception as e:
         print(f"  Could not set OlympusHub Control: {e}")
-        return
-
-    OBJECTIVE_TO_POSITION = {
-        "4x": "Position-1",
-        "20x": "Position-2"
-    }
+        return None
 
     try:
         mm_label = OBJECTIVE_TO_POSITION[objective_label]
@@ -79,33 +254,268 @@ def snake_like_scan(y_top, y_bottom, x_left, x_right, objective_label="4x", dry_
         print(f" Objective set to {objective_label} ({mm_label})")
     except Exception as e:
         print(f"  Failed to switch objective: {e}")
-        return
+        return None
+    return core
 
-    if dry_run:
-        print("  DRY RUN: Skipping stage movement and image capture.")
-        print(f"Would scan {len(positions)} tiles from ({x_left}, {y_top}) to ({x_right}, {y_bottom})")
-        for i, (x, y) in enumerate(positions, start=1):
-            print(f"Tile {i:03d}: X={x}, Y={y}")
-        return
 
+def calibrate_pixels(objective_label, x=None, y=None, save=True):
+    """
+    Measures µm/pixel, camera rotation and field of view for an objective by
+    stage moves around (x, y) (default: the current position), which should
+    show textured tissue, and caches the result (see pixel_calibration).
+    Returns the PixelCalibration, or None if it could not be measured.
+    """
+    from microscope_scan_tool.image_capture import initialize_camera
+
+    core = prepare_microscope(objective_label)
+    if core is None:
+        return None
     cap = initialize_camera()
     if cap is None:
-        return
+        return None
+    try:
+        if x is not None and y is not None:
+            move_stage(core, x, y)
+        calibration = measure_pixel_calibration(core, cap, objective_label)
+    except RuntimeError as e:
+        print(f"  Pixel calibration failed: {e}")
+        return None
+    finally:
+        cap.release()
+    print(f" {calibration!r} (RMS misfit {calibration.residual_px:.2f} px)")
+    width, height = calibration.field_of_view()
+    print(f" Field of view: {width:.1f} x {height:.1f} µm")
+    if save:
+        print(f" Saved to {calibration.save()}")
+    return calibration
 
-    scan_dir = create_scan_folder(objective_label)
+
+def acquire_tiles(core, cap, scan_dir, tiles, pipelined=False, mosaic=None, write_tiles=True,
+                  compression=None, journal=None, focus_map=None, stacking=None):
+    """
+    Visits tiles [(index, x, y)] in order, capturing one frame per tile that was
+    exposed after the stage settled (no fixed delays; duplicate or blurred
+    frames are re-captured, see frame_freshness).
+    With a focus_map the focus drive moves to each tile's interpolated Z while
+    the XY stage moves. A TileStacking averages or Z-stacks every tile.
+    Written tiles are recorded in the journal as soon as they are on disk.
+    Returns [(filename, x, y)] of the written tiles in acquisition order.
+    """
+    from microscope_scan_tool.acquisition_pipeline import TileWriterPool
+    from microscope_scan_tool.focus_map import focus_targets
+    from microscope_scan_tool.frame_freshness import FrameValidator
+    from microscope_scan_tool.image_capture import capture_image, grab_frame
+    from microscope_scan_tool.tile_compression import resolve_compression
+
+    compression = resolve_compression(compression)
     fiji_positions = []
+    writer = TileWriterPool(scan_dir, mosaic=mosaic, write_tiles=write_tiles,
+                            compression=compression, journal=journal) if pipelined else None
 
-    for i, (x, y) in enumerate(positions, start=1):
-        move_stage(core, x, y)
+    validator = FrameValidator()
+    z_targets = focus_targets(focus_map, tiles) if focus_map is not None else None
+    focus_device = core.get_focus_device() if focus_map is not None else None
+    shared_state.state.scanning.set()
+    try:
+        for n, (i, x, y) in enumerate(tiles):
+            scan_timing.begin_tile(i, x, y)
+            if z_targets is not None:
+                start = time.perf_counter()
+                core.set_position(focus_device, z_targets[n])
+                scan_timing.record("focus", start)
+            actual = move_stage(core, x, y)
+            if z_targets is not None:
+                start = time.perf_counter()
+                core.wait_for_device(focus_device)
+                scan_timing.record("focus", start)
+            settled_at = time.perf_counter()
 
-        if i == 1:
-            time.sleep(2)
+            if writer is not None:
+                frame = grab_frame(cap, i, settled_at, validator, stacking)
+                if frame is not None:
+                    writer.submit(frame, i, x, y, actual)
+                continue
 
-        filename = capture_image(cap, scan_dir, i, x, y)
-        if filename:
-            fiji_positions.append((filename, x, y))
+            filename = capture_image(cap, scan_dir, i, x, y, mosaic=mosaic, write_tile=write_tiles,
+                                     compression=compression, settled_at=settled_at, validator=validator,
+                                     stacking=stacking)
+            if filename:
+                if journal is not None and write_tiles:
+                    journal.record_tile(i, x, y, actual, filename)
+                fiji_positions.append((filename, x, y))
+    finally:
+        shared_state.state.scanning.clear()
+        scan_timing.set_tile(None)
+        if writer is not None:
+            fiji_positions = writer.finish()
+    if stacking is not None and stacking.enabled:
+        print(stacking.report())
+    return fiji_positions
 
-    save_fiji_metadata(scan_dir, fiji_positions)
-    log_error(f" Scan complete. Images and logs saved in: {scan_dir}")
-    cap.release()
-    print(" Scan safely stopped.")
+
+def _use_shading(objective_label, path=None):
+    """
+    Activates the shading calibration at `path` (default: the cached one for
+    the objective) for scan tiles. Returns it, or None if there is none.
+    """
+    from microscope_scan_tool.shading_correction import ShadingCalibration, load_calibration
+
+    if path is not None:
+        calibration = ShadingCalibration.load(path) if os.path.exists(path) else None
+    else:
+        calibration = load_calibration(objective_label)
+    if calibration is None:
+        log_warning(f"  No shading calibration for {objective_label}; tiles are not flat-field corrected.")
+    else:
+        print(f" Shading correction: {calibration}")
+    shared_state.state.shading_calibration = calibration
+    return calibration
+
+
+def _register(scan_dir, objective_label):
+    from microscope_scan_tool.registration import register_scan
+
+    try:
+        register_scan(scan_dir, objective_label)
+    except Exception as e:
+        log_error(f"  Tile registration failed: {e}")
+
+
+def _save_overview(overview_canvas, path, journal):
+    overview_canvas.save(path)
+    journal.record_event("overview", path=os.path.basename(path), **overview_canvas.describe())
+    width, height = overview_canvas.describe()["size"]
+    log_info(f" Overview ({width} x {height} px, {overview_canvas.um_per_px:.1f} µm/px) saved: {path}")
+
+
+def _rebuild_mosaic(scan_dir, plan, tile_records):
+    """
+    Rewrites mosaic.ome.zarr from the tiles on disk (the mosaic of an interrupted
+    scan was never flushed completely).
+    """
+    import tifffile
+
+    from microscope_scan_tool.mosaic_writer import MOSAIC_DIRNAME, OmeZarrMosaicWriter
+
+    path = os.path.join(scan_dir, MOSAIC_DIRNAME)
+    shutil.rmtree(path, ignore_errors=True)
+    mosaic = OmeZarrMosaicWriter(path, [(x, y) for _, x, y in plan["positions"]], plan["objective"])
+    try:
+        for index, record in sorted(tile_records.items()):
+            with tifffile.TiffFile(os.path.join(scan_dir, record["filename"])) as tif:
+                tile = tif.asarray()
+                description = tif.pages[0].description or ""
+            metadata = dict(line.split("=", 1) for line in description.splitlines() if "=" in line)
+            mosaic.add_tile(tile, index, record["x"], record["y"], metadata)
+    finally:
+        mosaic.close()
+    print(f" Mosaic rebuilt from {len(tile_records)} tiles: {path}")
+
+
+def resume_scan(scan_dir, pipelined=True, register=False):
+    """
+    Resumes an interrupted scan from its journal: tiles that are on disk and
+    intact are kept, every other planned tile is captured again with the
+    original objective, compression, white balance, shading calibration, focus
+    map and frame averaging / Z stack settings. A saved overview is reloaded
+    and completed with the new tiles. The TileConfiguration
+    (and mosaic, for output_format="both") is rebuilt from the journal; tiles
+    missing from a continuous scan are captured stop-and-go and listed at their
+    read-back positions like the rest of that scan.
+    Returns the scan folder, or None if the scan could not be resumed.
+    """
+    plan, records = load_journal(scan_dir)
+    if plan is None:
+        log_error(f"  Cannot resume {scan_dir}: the journal has no scan plan.")
+        return None
+    if plan["output_format"] == "ome-zarr":
+        log_error("  Cannot resume a mosaic-only scan: no tiles were written to disk.")
+        return None
+
+    objective_label = plan["objective"]
+    intact = {i: r for i, r in records.items() if verify_tile(scan_dir, r)}
+    missing = [(i, x, y) for i, x, y in plan["positions"] if i not in intact]
+    open_scan_folder(scan_dir)
+    log_info(f" Resuming {scan_dir}: {len(intact)} of {len(plan['positions'])} tiles on disk, "
+             f"{len(missing)} to capture.")
+
+    if missing:
+        wb = plan.get("white_balance") or {}
+        shared_state.state.set_white_balance(on=wb.get("on", False), medians=wb.get("medians"),
+                                             scale=wb.get("scale", shared_state.state.white_balance.scale))
+        shared_state.state.objective_label = objective_label
+        default_motion_model.select(objective_label)
+        from microscope_scan_tool.focus_map import AUTOFOCUS_RANGES, FocusMap
+        from microscope_scan_tool.frame_stacking import TileStacking
+        from microscope_scan_tool.image_capture import initialize_camera
+        from microscope_scan_tool.overview_canvas import OverviewCanvas
+        from microscope_scan_tool.tile_compression import TileCompression
+
+        compression = TileCompression(**plan["compression"]) if plan.get("compression") else None
+
+        core = prepare_microscope(objective_label)
+        if core is None:
+            return None
+        cap = initialize_camera()
+        if cap is None:
+            return None
+
+        focus_points = load_events(scan_dir, "focus_map")
+        focus_margin = AUTOFOCUS_RANGES.get(objective_label, AUTOFOCUS_RANGES["4x"])[0]
+        focus_map = FocusMap(focus_points[-1]["points"], margin=focus_margin) if focus_points else None
+        stacking = TileStacking(core, **plan["acquisition"]) if plan.get("acquisition") else None
+        if plan.get("shading"):
+            _use_shading(objective_label, plan["shading"])
+
+        overviews = load_events(scan_dir, "overview")
+        overview_canvas = None
+        if overviews:
+            overview_canvas = OverviewCanvas([(x, y) for _, x, y in plan["positions"]], objective_label,
+                                             um_per_px=overviews[-1].get("tile_um_per_px"))
+            overview_canvas.load(os.path.join(scan_dir, overviews[-1]["path"]))
+            shared_state.state.overview = overview_canvas
+
+        journal = ScanJournal(scan_dir)
+        journal.record_event("resume", missing=len(missing))
+        try:
+            acquire_tiles(core, cap, scan_dir, missing, pipelined=pipelined,
+                          compression=compression, journal=journal, focus_map=focus_map, stacking=stacking)
+        finally:
+            shared_state.state.shading_calibration = None
+            shared_state.state.overview = None
+            if overview_canvas is not None:
+                _save_overview(overview_canvas, os.path.join(scan_dir, overviews[-1]["path"]), journal)
+            journal.close()
+            cap.release()
+        _, records = load_journal(scan_dir)
+
+    rebuild_tile_configuration(scan_dir, use_actual=bool(plan.get("continuous")))
+    if plan["output_format"] == "both":
+        _rebuild_mosaic(scan_dir, plan, {i: r for i, r in records.items() if verify_tile(scan_dir, r)})
+    if register:
+        _register(scan_dir, objective_label)
+    log_info(f" Resumed scan complete: {scan_dir}")
+    close_scan_log()
+    return scan_dir
+
+
+def tissue_aware_scan(y_top, y_bottom, x_left, x_right, objective_label="20x", overview_dir=None,
+                      tissue_margin=None, dry_run=False, pipelined=False, optimize_order=True):
+    """
+    Overview-then-detail scan: acquires a 4x overview of the rectangle (or reuses
+    overview_dir), then scans at objective_label only where there is tissue.
+    Returns the detail scan folder, or None if the scan did not run.
+    """
+    if overview_dir is None:
+        if dry_run:
+            print("  DRY RUN: a tissue-aware dry run needs an existing overview_dir.")
+            return None
+        overview_dir = snake_like_scan(y_top, y_bottom, x_left, x_right, objective_label="4x",
+                                       pipelined=pipelined)
+        if overview_dir is None:
+            return None
+
+    return snake_like_scan(y_top, y_bottom, x_left, x_right, objective_label=objective_label,
+                           dry_run=dry_run, pipelined=pipelined,
+                           tissue_overview=overview_dir, tissue_margin=tissue_margin,
+                           optimize_order=optimize_order)
@@ -0,0 +1,268 @@
+"""
+Scan area limits, step sizes and the serpentine tile grid.
+
+The grid is generated with NumPy a block of rows at a time (iter_grid), so plans
+with millions of tiles can be counted, summarised or streamed without building
+them in memory. Tiles are clipped against the safe stage area, the polygon
+HARD_BOUNDARY_CORNERS, not just its bounding box, by their whole footprint
+(tile_footprint); without a field of view, by stage position only.
+
+Kept free of camera, GUI and Micro-Manager imports so that scan plans can be
+made (and dry runs printed) on machines without those stacks.
+"""
+import math
+
+import numpy as np
+
+from microscope_scan_tool.objectives import field_of_view
+from microscope_scan_tool.path_planner import estimate_travel_time
+
+HARD_BOUNDARY_CORNERS = [(98097, 391023), (25848, 386490), (26968, 359167), (98097, 365572)]
+HARD_X_MIN, HARD_X_MAX = min(p[0] for p in HARD_BOUNDARY_CORNERS), max(p[0] for p in HARD_BOUNDARY_CORNERS)
+HARD_Y_MIN, HARD_Y_MAX = min(p[1] for p in HARD_BOUNDARY_CORNERS), max(p[1] for p in HARD_BOUNDARY_CORNERS)
+
+# Step size map for objectives
+STEP_SIZES_BY_OBJECTIVE = {
+    "4x": (1800, 1000),
+    "20x": (200, 200),
+}
+
+OBJECTIVE_TO_POSITION = {
+    "4x": "Position-1",
+    "20x": "Position-2"
+}
+
+DEFAULT_OVERLAP = 10        # percent, target overlap when comparing calibrated steps with the table
+CHUNK_TILES = 1 << 16       # about this many tiles per iter_grid block (whole rows)
+EDGE_TOLERANCE_UM = 1e-6    # points this close to the boundary count as inside
+
+
+def step_sizes(objective_label, overlap=None, calibration=None):
+    """
+    (x_step, y_step) in µm for an objective: the STEP_SIZES_BY_OBJECTIVE table, or, with
+    `overlap` in percent, the steps that make neighbouring fields of view share at least that much.
+    The field of view is the measured one of `calibration` (a pixel_calibration.PixelCalibration)
+    if given, else the nominal one.
+    """
+    if overlap is None:
+        return STEP_SIZES_BY_OBJECTIVE.get(objective_label, (1800, 1000))
+    if not 0 <= overlap < 100:
+        raise ValueError(f"overlap must be a percentage in [0, 100), got {overlap}")
+    if calibration is not None:
+        return calibration.step_sizes(overlap)
+    width, height = field_of_view(objective_label)
+    keep = 1.0 - overlap / 100.0
+    return max(1, int(width * keep)), max(1, int(height * keep))
+
+
+def tile_footprint(objective_label, calibration=None):
+    """
+    (width, height) in µm of the stage area one tile images: the measured field of view of
+    `calibration` (grown to the bounding box of the rotated frame) if given, else the nominal one.
+    """
+    if calibration is None:
+        return field_of_view(objective_label)
+    width, height = calibration.field_of_view()
+    angle = math.radians(calibration.rotation_deg)
+    cos, sin = abs(math.cos(angle)), abs(math.sin(angle))
+    return width * cos + height * sin, width * sin + height * cos
+
+
+def grid_axes(y_top, y_bottom, x_left, x_right, x_step, y_step):
+    """
+    Column X positions (left to right) and row Y positions (top to bottom) of the grid.
+    """
+    xs = np.arange(int(x_left), int(x_right) + 1, int(x_step), dtype=np.int64)
+    ys = np.arange(int(y_top), int(y_bottom) - 1, -int(y_step), dtype=np.int64)
+    return xs, ys
+
+
+def points_in_polygon(x, y, polygon=HARD_BOUNDARY_CORNERS):
+    """
+    Boolean mask of the points (x, y arrays) inside or on the boundary of `polygon`.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    corners = np.asarray(polygon, dtype=np.float64)
+    inside = np.zeros(np.broadcast(x, y).shape, dtype=bool)
+    on_edge = np.zeros_like(inside)
+    for (x1, y1), (x2, y2) in zip(corners, np.roll(corners, -1, axis=0)):
+        if y1 != y2:
+            crosses = (y1 > y) != (y2 > y)
+            inside ^= crosses & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+        cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+        on_edge |= ((np.abs(cross) <= EDGE_TOLERANCE_UM * np.hypot(x2 - x1, y2 - y1))
+                    & (x >= min(x1, x2)) & (x <= max(x1, x2)) & (y >= min(y1, y2)) & (y <= max(y1, y2)))
+    return inside | on_edge
+
+
+def _edge_crosses_boxes(p1, p2, x_min, x_max, y_min, y_max):
+    """
+    Whether the segment p1-p2 passes through the open interior of each box (Liang-Barsky).
+    """
+    t_in = np.zeros(np.shape(x_min))
+    t_out = np.ones(np.shape(x_min))
+    hit = np.ones(np.shape(x_min), dtype=bool)
+    for start, delta, low, high in ((p1[0], p2[0] - p1[0], x_min, x_max), (p1[1], p2[1] - p1[1], y_min, y_max)):
+        if delta == 0:
+            hit &= (low < start) & (start < high)
+            continue
+        a, b = (low - start) / delta, (high - start) / delta
+        t_in = np.maximum(t_in, np.minimum(a, b))
+        t_out = np.minimum(t_out, np.maximum(a, b))
+    return hit & (t_in < t_out)
+
+
+def rects_in_polygon(x, y, width, height, polygon=HARD_BOUNDARY_CORNERS):
+    """
+    Boolean mask of the width x height rectangles centred on (x, y) that lie
+    entirely inside `polygon`: all four corners inside and no polygon edge
+    crossing the rectangle (exact for any simple polygon, convex or not).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x_min, x_max = x - width / 2.0, x + width / 2.0
+    y_min, y_max = y - height / 2.0, y + height / 2.0
+    keep = np.ones(np.broadcast(x, y).shape, dtype=bool)
+    for cx, cy in ((x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)):
+        keep &= points_in_polygon(cx, cy, polygon)
+    corners = np.asarray(polygon, dtype=np.float64)
+    for p1, p2 in zip(corners, np.roll(corners, -1, axis=0)):
+        keep &= ~_edge_crosses_boxes(p1, p2, x_min, x_max, y_min, y_max)
+    return keep
+
+
+def iter_grid(y_top, y_bottom, x_left, x_right, x_step, y_step, polygon=HARD_BOUNDARY_CORNERS, fov=None,
+              chunk_tiles=CHUNK_TILES):
+    """
+    Yields the serpentine grid as (n, 2) int64 arrays of (x, y), a block of whole
+    rows (about chunk_tiles tiles) at a time. Rows alternate direction starting
+    left to right. With `polygon`, only tiles whose position (or, with fov=(w, h),
+    whose whole footprint) is inside it are kept; empty blocks are skipped.
+    """
+    xs, ys = grid_axes(y_top, y_bottom, x_left, x_right, x_step, y_step)
+    if not len(xs):
+        return
+    rows_per_chunk = max(1, chunk_tiles // len(xs))
+    for first in range(0, len(ys), rows_per_chunk):
+        rows = ys[first:first + rows_per_chunk]
+        block = np.empty((len(rows), len(xs), 2), dtype=np.int64)
+        block[..., 0] = xs
+        block[..., 1] = rows[:, None]
+        block[(first + np.arange(len(rows))) % 2 == 1, :, 0] = xs[::-1]
+        tiles = block.reshape(-1, 2)
+        if polygon is not None:
+            if fov is None:
+                tiles = tiles[points_in_polygon(tiles[:, 0], tiles[:, 1], polygon)]
+            else:
+                tiles = tiles[rects_in_polygon(tiles[:, 0], tiles[:, 1], fov[0], fov[1], polygon)]
+        if len(tiles):
+            yield tiles
+
+
+def grid_positions(y_top, y_bottom, x_left, x_right, x_step, y_step, polygon=HARD_BOUNDARY_CORNERS, fov=None):
+    """
+    The whole iter_grid plan as one (n, 2) int64 array.
+    """
+    chunks = list(iter_grid(y_top, y_bottom, x_left, x_right, x_step, y_step, polygon, fov))
+    return np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+
+
+def count_tiles(y_top, y_bottom, x_left, x_right, x_step, y_step, polygon=HARD_BOUNDARY_CORNERS, fov=None):
+    """
+    Number of tiles in the clipped grid, counted block by block.
+    """
+    return sum(len(chunk) for chunk in iter_grid(y_top, y_bottom, x_left, x_right, x_step, y_step, polygon, fov))
+
+
+def calibration_lines(y_top, y_bottom, x_left, x_right, objective_label, calibration, overlap=None):
+    """
+    Compares the region's tile count with steps from the measured field of view
+    (at `overlap` percent, default DEFAULT_OVERLAP) against the STEP_SIZES_BY_OBJECTIVE table.
+    """
+    overlap = DEFAULT_OVERLAP if overlap is None else overlap
+    fixed = STEP_SIZES_BY_OBJECTIVE.get(objective_label, (1800, 1000))
+    calibrated = calibration.step_sizes(overlap)
+    fov = tile_footprint(objective_label, calibration)
+    fixed_tiles = count_tiles(y_top, y_bottom, x_left, x_right, *fixed, fov=fov)
+    calibrated_tiles = count_tiles(y_top, y_bottom, x_left, x_right, *calibrated, fov=fov)
+    width, height = calibration.covered_field()
+    fixed_x, fixed_y = 100.0 * (1 - fixed[0] / width), 100.0 * (1 - fixed[1] / height)
+    lines = [
+        f" {calibration!r}",
+        f" Calibrated steps for {overlap:g}% overlap: {calibrated[0]} x {calibrated[1]} µm "
+        f"-> {calibrated_tiles} tiles",
+        f" Fixed steps {fixed[0]} x {fixed[1]} µm overlap {fixed_x:.0f}% x {fixed_y:.0f}% -> {fixed_tiles} tiles",
+    ]
+    if calibrated_tiles <= fixed_tiles:
+        share = 100.0 * (fixed_tiles - calibrated_tiles) / max(fixed_tiles, 1)
+        lines.append(f" Calibrated steps save {fixed_tiles - calibrated_tiles} tiles ({share:.0f}%)")
+    else:
+        reason = "leave gaps" if min(fixed_x, fixed_y) < 0 else f"overlap less than {overlap:g}% along one axis"
+        lines.append(f" Calibrated steps need {calibrated_tiles - fixed_tiles} more tiles (the fixed steps {reason})")
+    return lines
+
+
+def calc_positions(y_top, y_bottom, x_left, x_right, x_step, y_step, fov=None):
+    """
+    Serpentine tile positions as a list of (x, y) tuples, clipped to the safe
+    stage area (with fov=(w, h), see tile_footprint, every tile's whole
+    footprint must be inside it). Returns None if no tile is inside it.
+    """
+    xs, ys = grid_axes(y_top, y_bottom, x_left, x_right, x_step, y_step)
+    positions = grid_positions(y_top, y_bottom, x_left, x_right, x_step, y_step, fov=fov)
+    if not len(positions):
+        print(" ERROR: User-defined scan area is outside the allowed boundaries.")
+        print(f"Allowed X: {HARD_X_MIN}–{HARD_X_MAX}, Got: {x_left} - {x_right}")
+        print(f"Allowed Y: {HARD_Y_MIN}–{HARD_Y_MAX}, Got: {y_bottom} - {y_top}")
+        return None
+    clipped = len(xs) * len(ys) - len(positions)
+    if clipped:
+        print(f" WARNING: {clipped} of {len(xs) * len(ys)} tiles are outside the allowed scan area and were skipped.")
+    return list(zip(positions[:, 0].tolist(), positions[:, 1].tolist()))
+
+
+class GridSummary:
+    """
+    Tile count, rows, columns, extent and estimated stage travel of a plan, fed
+    one block of positions at a time (e.g. from iter_grid).
+    """
+
+    def __init__(self, x_step=None, y_step=None):
+        self.x_step, self.y_step = x_step, y_step
+        self.tiles = 0
+        self.travel = 0.0
+        self.first = self.last = None
+        self._columns = set()
+        self._rows = set()
+        self._low = np.full(2, np.inf)
+        self._high = np.full(2, -np.inf)
+
+    def add(self, positions):
+        xy = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        if not len(xy):
+            return self
+        self.travel += estimate_travel_time(xy, start=self.last)
+        if self.first is None:
+            self.first = tuple(xy[0])
+        self.last = tuple(xy[-1])
+        self.tiles += len(xy)
+        self._columns.update(np.unique(xy[:, 0]).tolist())
+        self._rows.update(np.unique(xy[:, 1]).tolist())
+        self._low = np.minimum(self._low, xy.min(axis=0))
+        self._high = np.maximum(self._high, xy.max(axis=0))
+        return self
+
+    def lines(self):
+        if not self.tiles:
+            return [" No tiles."]
+        steps = f" ({self.x_step} x {self.y_step} µm steps)" if self.x_step else ""
+        (x0, y0), (x1, y1) = self._low, self._high
+        return [
+            f" {self.tiles} tiles in {len(self._rows)} rows x {len(self._columns)} columns{steps}",
+            f" Extent: X {x0:.0f}–{x1:.0f}, Y {y0:.0f}–{y1:.0f} µm "
+            f"({(x1 - x0) / 1000:.1f} x {(y1 - y0) / 1000:.1f} mm)",
+            f" First tile X={self.first[0]:.0f}, Y={self.first[1]:.0f}; last tile X={self.last[0]:.0f}, "
+            f"Y={self.last[1]:.0f}",
+            f" Estimated stage travel: {self.travel:.1f} s",
+        ]
@@ -0,0 +1,233 @@
+"""
+Per-tile timing instrumentation.
+
+While a ScanTimer is active (see start()), the capture path records how long
+every phase of every tile takes: the stage move command, settling, focus
+moves, frame grab, white balance / shading, flip and colour conversion, mosaic
+update, TIFF encode and file write, and time the scan loop spent blocked on
+the writer pool. Phases are attributed to the tile set with begin_tile() /
+set_tile() on the current thread, so the scan loop and the writer threads can
+record concurrently. When no timer is active, record() returns after a single
+global check, so the hooks cost practically nothing.
+
+When the timer stops, one JSON line per tile (times in ms) is written to
+scan_timing.jsonl in the scan folder, and summary_lines() gives per-phase
+percentiles, tiles/hour, the slowest tiles and stage busy/idle time.
+"""
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+TIMING_FILENAME = "scan_timing.jsonl"
+PHASES = ("move", "settle", "focus", "grab", "queue", "white_balance", "flip", "mosaic", "overview", "encode",
+          "write")
+STAGE_PHASES = ("move", "settle", "focus")  # the stage (XY or Z) is moving during these
+PERCENTILES = (50, 90, 99)
+SLOWEST_TILES = 5
+
+_active = None
+_local = threading.local()
+
+
+class ScanTimer:
+    """
+    Per-tile phase durations for one scan, kept in memory until stop().
+    """
+
+    def __init__(self, scan_dir):
+        self.path = os.path.join(scan_dir, TIMING_FILENAME)
+        self.tiles = {}  # index -> record dict (durations in seconds until written)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def begin(self, index, x, y):
+        now = time.perf_counter()
+        with self._lock:
+            self.tiles[index] = {"tile": index, "x": x, "y": y, "start": now - self._origin}
+
+    def add(self, index, phase, seconds):
+        with self._lock:
+            record = self.tiles.get(index)
+            if record is not None:
+                record[phase] = record.get(phase, 0.0) + seconds
+                record["end"] = time.perf_counter() - self._origin
+
+    def records(self):
+        """
+        Tile records in acquisition order, with times in ms; "loop" is the time
+        from the start of the tile to the start of the next one.
+        """
+        with self._lock:
+            tiles = sorted(self.tiles.values(), key=lambda r: r["start"])
+        end = time.perf_counter() - self._origin
+        out = []
+        for n, tile in enumerate(tiles):
+            following = tiles[n + 1]["start"] if n + 1 < len(tiles) else max(tile.get("end", end), tile["start"])
+            record = {"tile": tile["tile"], "x": tile["x"], "y": tile["y"],
+                      "start": round(tile["start"], 4), "loop": round(1000 * (following - tile["start"]), 2)}
+            record.update({p: round(1000 * tile[p], 2) for p in PHASES if p in tile})
+            out.append(record)
+        return out
+
+    def write(self):
+        records = self.records()
+        with open(self.path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        return records
+
+
+def start(scan_dir):
+    """
+    Activates timing for a scan writing into scan_dir. Returns the ScanTimer.
+    """
+    global _active
+    _active = ScanTimer(scan_dir)
+    return _active
+
+
+def stop():
+    """
+    Deactivates timing and writes the per-tile file. Returns the tile records
+    (see ScanTimer.records), or [] when timing was not active.
+    """
+    global _active
+    timer, _active = _active, None
+    if timer is None:
+        return []
+    return timer.write()
+
+
+def is_active():
+    return _active is not None
+
+
+def begin_tile(index, x, y):
+    """
+    Starts a new tile on the scan loop thread.
+    """
+    _local.tile = index
+    if _active is not None:
+        _active.begin(index, x, y)
+
+
+def set_tile(index):
+    """
+    Attributes this thread's following records to tile `index` (writer threads).
+    """
+    _local.tile = index
+
+
+def record(phase, since):
+    """
+    Adds the time since `since` (a time.perf_counter() value) to `phase` of
+    the current thread's tile. Does nothing when timing is off.
+    """
+    if _active is None:
+        return
+    index = getattr(_local, "tile", None)
+    if index is not None:
+        _active.add(index, phase, time.perf_counter() - since)
+
+
+class _TimedFile(io.RawIOBase):
+    """
+    Binary file that accumulates the time spent in write().
+    """
+
+    def __init__(self, path):
+        self._raw = open(path, "wb", buffering=0)
+        self.write_time = 0.0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        start = time.perf_counter()
+        n = self._raw.write(data)
+        self.write_time += time.perf_counter() - start
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        return self._raw.tell()
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+@contextlib.contextmanager
+def timed_output(path):
+    """
+    Yields the target to write a file to: `path` itself when timing is off,
+    otherwise a file object whose write time is recorded as "write" and the
+    rest of the time inside the block as "encode".
+    """
+    if _active is None:
+        yield path
+        return
+    start = time.perf_counter()
+    with _TimedFile(path) as f:
+        yield f
+    total = time.perf_counter() - start
+    index = getattr(_local, "tile", None)
+    if index is not None and _active is not None:
+        _active.add(index, "write", f.write_time)
+        _active.add(index, "encode", total - f.write_time)
+
+
+def load_timings(scan_dir):
+    """
+    Tile records from a scan's timing file ([] if the scan was not timed).
+    """
+    path = os.path.join(scan_dir, TIMING_FILENAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summary_lines(records):
+    """
+    Human-readable scan performance report for tile records (see ScanTimer.records).
+    """
+    if not records:
+        return [" Scan timing: no tiles recorded."]
+    last = records[-1]
+    elapsed = last["start"] + last["loop"] / 1000 - records[0]["start"]
+    lines = [f" Scan timing: {len(records)} tiles in {elapsed:.1f} s "
+             f"({len(records) / max(elapsed, 1e-9) * 3600:.0f} tiles/hour)"]
+
+    header = "".join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+    lines.append(f"   {'phase':<14}{header}{'max':>9}{'total s':>10}   (ms per tile)")
+    for phase in ("loop",) + PHASES:
+        values = np.array([r[phase] for r in records if phase in r])
+        if not len(values):
+            continue
+        cells = "".join(f"{v:>9.1f}" for v in np.percentile(values, PERCENTILES))
+        lines.append(f"   {phase:<14}{cells}{values.max():>9.1f}{values.sum() / 1000:>10.2f}")
+
+    busy = sum(r.get(p, 0.0) for r in records for p in STAGE_PHASES) / 1000
+    idle = max(elapsed - busy, 0.0)
+    lines.append(f" Stage busy {busy:.1f} s ({busy / max(elapsed, 1e-9):.0%}), "
+                 f"idle {idle:.1f} s ({idle / max(elapsed, 1e-9):.0%})")
+
+    slowest = sorted(records, key=lambda r: r["loop"], reverse=True)[:SLOWEST_TILES]
+    lines.append(" Slowest tiles:")
+    for r in slowest:
+        top = sorted(((r[p], p) for p in PHASES if p in r), reverse=True)[:3]
+        detail = ", ".join(f"{p} {v:.0f}" for v, p in top)
+        lines.append(f"   tile {r['tile']} at ({r['x']}, {r['y']}): {r['loop']:.0f} ms ({detail})")
+    return lines
@@ -0,0 +1,222 @@
+"""
+Flat-field and dark-frame shading correction.
+
+A ShadingCalibration holds a flat field (per-pixel, per-channel relative
+illumination, mean 1 per channel) and optionally a dark frame, both in raw
+camera orientation (BGR, not flipped). It can be
+
+- acquired from a blank slide: acquire_flat_field() averages frames at one or
+  more glass positions (per-pixel median across positions removes dust);
+- estimated retrospectively from an existing scan: estimate_flat_from_scan()
+  takes a per-pixel percentile over many downsampled tiles, computed in row
+  chunks so memory stays bounded, and smooths it.
+
+Calibrations are cached on disk under SHADING_DIR, keyed by objective label
+and capture resolution. The capture path applies
+    out = (raw - dark) * gain,   gain = white balance gain / flat
+as one precomputed float gain map (see preprocessing.TilePreprocessor).
+"""
+import glob
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import tifffile
+
+from microscope_scan_tool.frame_freshness import fresh_frame
+from microscope_scan_tool.frame_stacking import FrameAverager
+from microscope_scan_tool.objectives import FRAME_SIZE
+from microscope_scan_tool.stage_controller import move_stage
+
+SHADING_DIR = os.path.join(os.path.expanduser("~"), ".microscope_scan_tool", "shading")
+CALIBRATION_FRAMES = 32          # frames averaged per blank-slide position / dark frame
+ESTIMATE_SIZE = (240, 135)       # retrospective flats are estimated at 1/8 of 1920x1080 (they are smooth)
+FLAT_PERCENTILE = 80.0           # glass is the brightest content, so a high percentile skips most tissue
+FLAT_SMOOTH_SIGMA = 6.0          # px at ESTIMATE_SIZE
+MAX_FLAT_TILES = 500             # tiles sampled for a retrospective estimate
+CHUNK_BYTES = 32 << 20           # working memory per percentile chunk
+MIN_FLAT = 0.05                  # flat values are clamped to this to keep gains finite
+
+
+class ShadingCalibration:
+    """
+    Flat field (float32, normalised to mean 1 per channel) and optional dark
+    frame (float32, raw counts) for one objective and capture size. The flat
+    may be stored at a lower resolution than `size`; it is resized on use.
+    """
+
+    def __init__(self, flat, dark=None, objective_label=None, size=FRAME_SIZE, source=""):
+        flat = np.asarray(flat, dtype=np.float32)
+        self.flat = flat / flat.reshape(-1, flat.shape[-1]).mean(axis=0)
+        self.dark = None if dark is None else np.asarray(dark, dtype=np.float32)
+        self.objective_label = objective_label
+        self.size = tuple(int(v) for v in size)
+        self.source = source
+        self.path = None
+
+    def __repr__(self):
+        corner = float(self.flat[0, 0].mean())
+        return (f"flat field for {self.objective_label} at {self.size[0]}x{self.size[1]} "
+                f"(corner {corner:.0%} of mean{', with dark frame' if self.dark is not None else ''})")
+
+    def full_flat(self):
+        flat = self.flat
+        if (flat.shape[1], flat.shape[0]) != self.size:
+            flat = cv2.resize(flat, self.size, interpolation=cv2.INTER_LINEAR)
+        return flat
+
+    def gain_map(self, channel_gains=None):
+        """
+        Per-pixel float32 gain (H, W, C) = channel_gains / flat at the capture size.
+        """
+        gains = np.ones(self.flat.shape[-1], dtype=np.float32) if channel_gains is None \
+            else np.asarray(channel_gains, dtype=np.float32)
+        return gains / np.maximum(self.full_flat(), MIN_FLAT)
+
+    def dark_frame(self):
+        """
+        Dark frame as uint8 at the capture size (for cv2.subtract), or None.
+        """
+        if self.dark is None:
+            return None
+        dark = self.dark
+        if (dark.shape[1], dark.shape[0]) != self.size:
+            dark = cv2.resize(dark, self.size, interpolation=cv2.INTER_LINEAR)
+        return np.clip(np.rint(dark), 0, 255).astype(np.uint8)
+
+    def save(self, directory=SHADING_DIR):
+        """
+        Writes the calibration to its cache file and returns the path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = calibration_path(self.objective_label, self.size, directory)
+        arrays = {"flat": self.flat}
+        if self.dark is not None:
+            arrays["dark"] = self.dark
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, objective=self.objective_label or "", size=np.array(self.size),
+                            source=self.source, created=datetime.now().isoformat(), **arrays)
+        os.replace(tmp_path, path)
+        self.path = path
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            calibration = cls(data["flat"], data["dark"] if "dark" in data else None,
+                              str(data["objective"]) or None, tuple(data["size"]), str(data["source"]))
+        calibration.path = path
+        return calibration
+
+
+def calibration_path(objective_label, size=FRAME_SIZE, directory=SHADING_DIR):
+    return os.path.join(directory, f"shading_{objective_label}_{size[0]}x{size[1]}.npz")
+
+
+def load_calibration(objective_label, size=FRAME_SIZE, directory=SHADING_DIR):
+    """
+    Cached calibration for an objective and capture size, or None if there is none.
+    """
+    path = calibration_path(objective_label, size, directory)
+    if not os.path.exists(path):
+        return None
+    return ShadingCalibration.load(path)
+
+
+def chunked_percentile(stack, percentile, chunk_bytes=CHUNK_BYTES):
+    """
+    Per-pixel percentile over axis 0 of an (N, H, W, C) stack, computed a few
+    rows at a time so the float64 working copy stays under chunk_bytes.
+    """
+    n, h = stack.shape[:2]
+    row_bytes = 8 * n * int(np.prod(stack.shape[2:]))
+    rows = max(1, chunk_bytes // row_bytes)
+    out = np.empty(stack.shape[1:], dtype=np.float32)
+    for r0 in range(0, h, rows):
+        out[r0:r0 + rows] = np.percentile(stack[:, r0:r0 + rows], percentile, axis=0)
+    return out
+
+
+def _averaged_frame(cap, frames, averager):
+    first = fresh_frame(cap, time.perf_counter())
+    if first is None:
+        raise RuntimeError("Camera did not deliver a frame")
+    averager.reset(first)
+    averager.add(first)
+    for _ in range(frames - 1):
+        frame = fresh_frame(cap, time.perf_counter())
+        if frame is not None:
+            averager.add(frame)
+    return averager.mean(np.float32)
+
+
+def acquire_dark_frame(cap, frames=CALIBRATION_FRAMES):
+    """
+    Averages `frames` frames with the light path blocked. Returns float32 counts.
+    """
+    return _averaged_frame(cap, frames, FrameAverager())
+
+
+def acquire_flat_field(cap, objective_label, core=None, positions=None, frames=CALIBRATION_FRAMES, dark=None):
+    """
+    Flat field from a blank (glass-only) slide: `frames` frames are averaged at
+    each of `positions` (the current position if None), and the per-pixel
+    median across positions removes dust and debris that move with the slide.
+    """
+    averager = FrameAverager()
+    means = []
+    for x, y in positions or [None]:
+        if x is not None:
+            move_stage(core, x, y)
+        mean = _averaged_frame(cap, frames, averager)
+        if dark is not None:
+            mean = np.maximum(mean - dark, 0)
+        means.append(mean)
+    flat = means[0] if len(means) == 1 else chunked_percentile(np.stack(means), 50.0)
+    h, w = flat.shape[:2]
+    return ShadingCalibration(flat, dark, objective_label, (w, h), source="blank slide")
+
+
+def _raw_thumbnail(path, size):
+    """
+    Downsampled tile in raw camera orientation (tiles are stored upright RGB).
+    """
+    tile = tifffile.imread(path)
+    small = cv2.resize(tile, size, interpolation=cv2.INTER_AREA)
+    small = cv2.flip(small, -1)
+    return small[..., ::-1] if small.ndim == 3 else small[..., None]
+
+
+def estimate_flat_from_scan(scan_dir, objective_label=None, percentile=FLAT_PERCENTILE, max_tiles=MAX_FLAT_TILES,
+                            size=ESTIMATE_SIZE):
+    """
+    Retrospective flat field from the tiles of an existing scan: a per-pixel
+    high percentile over up to max_tiles downsampled tiles, smoothed.
+    The tiles' white balance cancels out (the flat is normalised per channel).
+    """
+    if objective_label is None:
+        from microscope_scan_tool.registration import infer_objective
+        objective_label = infer_objective(scan_dir)
+    paths = sorted(glob.glob(os.path.join(scan_dir, "tile_*.tif")))
+    if not paths:
+        raise FileNotFoundError(f"No tiles found in {scan_dir}")
+    if len(paths) > max_tiles:
+        paths = [paths[i] for i in np.linspace(0, len(paths) - 1, max_tiles).astype(int)]
+
+    with tifffile.TiffFile(paths[0]) as tif:
+        tile_h, tile_w = tif.pages[0].shape[:2]
+    stack = None
+    for i, path in enumerate(paths):
+        thumb = _raw_thumbnail(path, size)
+        if stack is None:
+            stack = np.empty((len(paths),) + thumb.shape, dtype=thumb.dtype)
+        stack[i] = thumb
+
+    flat = chunked_percentile(stack, percentile)
+    flat = cv2.GaussianBlur(flat, (0, 0), FLAT_SMOOTH_SIGMA, borderType=cv2.BORDER_REFLECT)
+    if flat.ndim == 2:
+        flat = flat[..., None]
+    return ShadingCalibration(np.maximum(flat, 1.0), None, objective_label, (tile_w, tile_h),
+                              source=f"{os.path.abspath(scan_dir)} ({len(paths)} tiles, p{percentile:g})")
@@ -1,15 +1,95 @@
-camera_running = True
+"""
+State shared by the Tk GUI thread, the live preview thread and the scan loop.
 
-# White balance settings
-white_balance_on = False
-white_balance_medians = None
-white_balance_scale = 1.2
+`state` is the single AppState instance. White balance settings are held as an
+immutable WhiteBalance snapshot that is swapped under a lock, so a reader
+always gets a consistent (on, medians, scale) triple with one attribute read.
+Shutdown, scanning and patch selection are threading.Events that threads
+wait on or check instead of polling module globals with sleeps.
+"""
+import threading
+from collections import namedtuple
 
-# Patch selection state
-enable_patch_selection = False
-selecting_box = False
-box_start = None
-box_end = None
-last_frame_snapshot = None  # Used to capture the box from live feed
+DEFAULT_WHITE_BALANCE_SCALE = 1.2
 
 
+class WhiteBalance(namedtuple("WhiteBalance", ["on", "medians", "scale"])):
+    """
+    Immutable white balance settings; medians is a tuple of per-channel (BGR)
+    medians or None.
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        return {"on": self.on, "medians": None if self.medians is None else list(self.medians), "scale": self.scale}
+
+
+class AppState:
+    """
+    Application state and the events threads coordinate on.
+
+    objective_label, shading_calibration, overview and scan_log are only written
+    by the scan thread before tiles are captured; the writer threads read them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._white_balance = WhiteBalance(False, None, DEFAULT_WHITE_BALANCE_SCALE)
+        self.stopped = threading.Event()          # set once the application shuts down
+        self.scanning = threading.Event()         # set while a scan is acquiring; the preview slows down
+        self.patch_selection = threading.Event()  # set while the preview waits for a white patch box
+        self.patch_selected = threading.Event()   # set when a white patch has been measured
+        self.objective_label = None               # set by snake_like_scan, embedded in tile metadata
+        self.shading_calibration = None           # ShadingCalibration applied to scan tiles, or None
+        self.overview = None                      # OverviewCanvas of the running scan, shown by the preview
+        self.scan_log = None                      # logger.ScanLog of the running scan, or None
+
+    @property
+    def white_balance(self):
+        """
+        Current WhiteBalance snapshot (a single atomic read).
+        """
+        return self._white_balance
+
+    def set_white_balance(self, **changes):
+        """
+        Replaces any of on / medians / scale atomically. Returns the new snapshot.
+        """
+        if changes.get("medians") is not None:
+            changes["medians"] = tuple(float(m) for m in changes["medians"])
+        with self._lock:
+            self._white_balance = self._white_balance._replace(**changes)
+            return self._white_balance
+
+    def begin_patch_selection(self, scale):
+        """
+        Clears the white balance and lets the preview take a new white patch at `scale`.
+        """
+        self.set_white_balance(on=False, medians=None, scale=scale)
+        self.patch_selected.clear()
+        self.patch_selection.set()
+
+    def finish_patch_selection(self, medians):
+        """
+        Applies the medians of the selected patch (None: empty patch, white balance stays off).
+        """
+        if medians is None:
+            self.set_white_balance(on=False, medians=None)
+        else:
+            self.set_white_balance(on=True, medians=medians)
+        self.patch_selection.clear()
+        self.patch_selected.set()
+
+    @property
+    def running(self):
+        return not self.stopped.is_set()
+
+    def stop(self):
+        """
+        Asks every thread to shut down; the preview exits within one frame.
+        """
+        self.stopped.set()
+        self.patch_selection.clear()
+
+
+state = AppState()
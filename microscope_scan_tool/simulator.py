@@ -0,0 +1,648 @@
+"""
+Simulated microscope used in place of Micro-Manager and the DirectShow camera.
+
+SimulatedCore mimics the subset of pycromanager.Core used by this package and
+SimulatedCamera mimics cv2.VideoCapture, so scan code runs unchanged against it.
+Select it through microscope_scan_tool.hardware.use_simulator().
+"""
+import math
+import random
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Field of view of the simulated optics at full sensor resolution
+SENSOR_SIZE = (1920, 1080)
+SIM_UM_PER_PIXEL = {
+    "Position-1": 1.0,   # 4x
+    "Position-2": 0.2,   # 20x
+}
+
+SIM_NUMERICAL_APERTURE = {
+    "Position-1": 0.1,   # 4x
+    "Position-2": 0.4,   # 20x
+}
+
+# Virtual slide covers the whole hard boundary area of the stage
+SLIDE_BOUNDS = (25000, 359000, 99000, 392000)  # x_min, y_min, x_max, y_max (µm)
+GLASS_BGR = (232, 236, 238)
+FOCUS_BASE_Z = 1500.0  # µm, in-focus Z at the slide centre
+OBJECTIVE_SWITCH_TIME = 1.0  # s, turret rotation when the objective label changes
+STAGE_SPEED_PROPERTY = "Speed"  # XY stage property holding the velocity (µm/s)
+
+
+class Point2D:
+    """
+    Stand-in for the java Point2D returned by Core.get_xy_stage_position().
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def _trapezoid_duration(distance, velocity, acceleration):
+    """
+    Time to travel `distance` from rest to rest with a trapezoidal velocity profile.
+    """
+    if distance <= 0:
+        return 0.0
+    if distance < velocity * velocity / acceleration:
+        return 2.0 * math.sqrt(distance / acceleration)
+    return distance / velocity + velocity / acceleration
+
+
+def _trapezoid_travelled(t, distance, velocity, acceleration):
+    """
+    Distance covered after `t` seconds of a rest-to-rest trapezoidal move.
+    """
+    total = _trapezoid_duration(distance, velocity, acceleration)
+    if t >= total:
+        return distance
+    if t <= 0:
+        return 0.0
+
+    v_peak = min(velocity, math.sqrt(distance * acceleration))
+    t_ramp = v_peak / acceleration
+    ramp_distance = 0.5 * acceleration * t_ramp * t_ramp
+
+    if t < t_ramp:
+        return 0.5 * acceleration * t * t
+    if t < total - t_ramp:
+        return ramp_distance + v_peak * (t - t_ramp)
+    remaining = total - t
+    return distance - 0.5 * acceleration * remaining * remaining
+
+
+class SimulatedStage:
+    """
+    XY stage with per-axis trapezoidal motion, a noisy settling phase and a small
+    residual position jitter.
+
+    Velocity (µm/s) and acceleration (µm/s²) may be scalars or (x, y) tuples;
+    a move keeps the values it was commanded with. time_scale > 1 runs the
+    physics faster than wall-clock time.
+    """
+
+    def __init__(self, velocity=20000.0, acceleration=200000.0, settle_time=0.03,
+                 settle_noise=0.01, ringing=8.0, jitter=0.3, time_scale=1.0,
+                 start=(60000.0, 375000.0), seed=None):
+        self.velocity = velocity if isinstance(velocity, tuple) else (velocity, velocity)
+        self.acceleration = acceleration if isinstance(acceleration, tuple) else (acceleration, acceleration)
+        self.settle_time = settle_time
+        self.settle_noise = settle_noise
+        self.ringing = ringing
+        self.jitter = jitter
+        self.time_scale = time_scale
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._start = tuple(float(v) for v in start)
+        self._target = self._start
+        self._move_start = 0.0
+        self._durations = (0.0, 0.0)
+        self._profile = (self.velocity, self.acceleration)
+        self._settle = 0.0
+        self.move_count = 0
+
+    def now(self):
+        """
+        Current simulated time in seconds.
+        """
+        return (time.perf_counter() - self._t0) * self.time_scale
+
+    def move_to(self, x, y):
+        with self._lock:
+            t = self.now()
+            current = self._position_at(t, with_noise=False)
+            self._start = current
+            self._target = (float(x), float(y))
+            self._move_start = t
+            self._profile = (self.velocity, self.acceleration)
+            self._durations = tuple(
+                _trapezoid_duration(abs(self._target[i] - current[i]), self.velocity[i], self.acceleration[i])
+                for i in range(2)
+            )
+            self._settle = max(0.0, self.settle_time + self._rng.gauss(0.0, self.settle_noise))
+            self.move_count += 1
+
+    def move_duration(self):
+        """
+        Simulated time from the last move command until the stage is settled.
+        """
+        return max(self._durations) + self._settle
+
+    def is_busy(self, t=None):
+        t = self.now() if t is None else t
+        return t < self._move_start + self.move_duration()
+
+    def position(self, t=None, jitter=True):
+        """
+        Stage position at simulated time t (default now). jitter=False leaves out
+        the read-out jitter, giving where the stage physically is.
+        """
+        with self._lock:
+            return self._position_at(self.now() if t is None else t, jitter=jitter)
+
+    def _position_at(self, t, with_noise=True, jitter=True):
+        elapsed = t - self._move_start
+        travel_end = max(self._durations)
+        velocity, acceleration = self._profile
+        pos = []
+        for i in range(2):
+            delta = self._target[i] - self._start[i]
+            travelled = _trapezoid_travelled(elapsed, abs(delta), velocity[i], acceleration[i])
+            value = self._start[i] + math.copysign(travelled, delta)
+
+            if with_noise:
+                if travel_end <= elapsed < travel_end + self._settle and delta != 0:
+                    # Damped ringing while the stage settles
+                    phase = (elapsed - travel_end) / max(self._settle, 1e-6)
+                    value += self.ringing * (1.0 - phase) * math.cos(phase * 6.0 * math.pi)
+                if jitter:
+                    value += self._rng.gauss(0.0, self.jitter)
+            pos.append(value)
+        return pos[0], pos[1]
+
+
+def _motion_blur(frame, dx, dy, min_length=2.0):
+    """
+    Box blur over a (dx, dy) pixel streak (per axis, so it stays cheap for long
+    streaks), ignoring sub-pixel jitter.
+    """
+    if math.hypot(dx, dy) < min_length:
+        return frame
+    size = (max(1, int(round(abs(dx)))), max(1, int(round(abs(dy)))))
+    return cv2.blur(frame, size, borderType=cv2.BORDER_REPLICATE)
+
+
+def _gaussian_blur(frame, sigma):
+    """
+    Gaussian blur; large sigmas are applied at reduced resolution to stay cheap.
+    """
+    if sigma < 0.5:
+        return frame
+    if sigma <= 4:
+        return cv2.GaussianBlur(frame, (0, 0), sigma)
+    factor = int(sigma // 2)
+    h, w = frame.shape[:2]
+    small = cv2.resize(frame, (max(1, w // factor), max(1, h // factor)), interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (0, 0), sigma / factor)
+    return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def _defocus_blur(frame, sigma_map, max_levels=4):
+    """
+    Spatially varying defocus: sigma_map is a coarse grid of blur sigmas (px)
+    over the frame. The frame is blurred at a few sigma levels and the levels
+    are blended per pixel.
+    """
+    lo, hi = float(sigma_map.min()), float(sigma_map.max())
+    if hi - lo < 1.5:
+        return _gaussian_blur(frame, (lo + hi) / 2)
+
+    levels = np.linspace(lo, hi, min(max_levels, int(math.ceil(hi - lo)) + 1))
+    spacing = levels[1] - levels[0]
+    h, w = frame.shape[:2]
+    sigma = cv2.resize(sigma_map.astype(np.float32), (w, h), interpolation=cv2.INTER_LINEAR)
+    out = np.zeros(frame.shape, dtype=np.float32)
+    for level in levels:
+        weight = np.clip(1.0 - np.abs(sigma - level) / spacing, 0.0, 1.0)
+        weight = cv2.merge([weight] * frame.shape[2]) if frame.ndim == 3 else weight
+        out = cv2.add(out, cv2.multiply(_gaussian_blur(frame, level), weight, dtype=cv2.CV_32F))
+    return cv2.convertScaleAbs(out)
+
+
+class SimulatedFocusDrive:
+    """
+    Z (focus) drive moving at constant speed, sharing the XY stage's clock.
+    """
+
+    def __init__(self, stage, velocity=2000.0, settle_time=0.01, start=FOCUS_BASE_Z):
+        self.stage = stage
+        self.velocity = velocity
+        self.settle_time = settle_time
+        self._lock = threading.Lock()
+        self._start = float(start)
+        self._target = float(start)
+        self._move_start = 0.0
+        self.move_count = 0
+
+    def move_to(self, z):
+        with self._lock:
+            t = self.stage.now()
+            self._start = self._position_at(t)
+            self._target = float(z)
+            self._move_start = t
+            self.move_count += 1
+
+    def _duration(self):
+        return abs(self._target - self._start) / self.velocity
+
+    def is_busy(self, t=None):
+        t = self.stage.now() if t is None else t
+        return t < self._move_start + self._duration() + self.settle_time
+
+    def position(self, t=None):
+        with self._lock:
+            return self._position_at(self.stage.now() if t is None else t)
+
+    def _position_at(self, t):
+        duration = self._duration()
+        if duration <= 0 or t >= self._move_start + duration:
+            return self._target
+        if t <= self._move_start:
+            return self._start
+        return self._start + (self._target - self._start) * (t - self._move_start) / duration
+
+
+class SimulatedCore:
+    """
+    Minimal stand-in for pycromanager.Core: XY stage, focus drive, device
+    properties and waits.
+
+    round_trip (s) is added to every Core call, like the ZMQ round trip to the
+    Micro-Manager server; `calls` counts them per method. Changing the
+    objective label keeps the "Objective" device busy for objective_switch_time.
+    The XY stage's "Speed" property is its velocity in µm/s (both axes).
+    """
+
+    def __init__(self, stage=None, round_trip=0.0, objective_switch_time=OBJECTIVE_SWITCH_TIME):
+        self.stage = stage or SimulatedStage()
+        self.focus = SimulatedFocusDrive(self.stage)
+        self.properties = {
+            ("Objective", "Label"): "Position-1",
+            ("OlympusHub", "Control"): "Manual + Computer",
+        }
+        self.xy_stage_device = "XYStage"
+        self.focus_device = "ZStage"
+        self.properties[(self.xy_stage_device, STAGE_SPEED_PROPERTY)] = str(self.stage.velocity[0])
+        self.round_trip = round_trip
+        self.objective_switch_time = objective_switch_time
+        self.calls = {}
+        self._objective_busy_until = 0.0
+
+    def _rpc(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.round_trip:
+            time.sleep(self.round_trip)
+
+    def set_xy_position(self, x, y):
+        self._rpc("set_xy_position")
+        self.stage.move_to(x, y)
+
+    def get_x_position(self, *args):
+        self._rpc("get_x_position")
+        return self.stage.position()[0]
+
+    def get_y_position(self, *args):
+        self._rpc("get_y_position")
+        return self.stage.position()[1]
+
+    def get_xy_stage_position(self, *args):
+        self._rpc("get_xy_stage_position")
+        return Point2D(*self.stage.position())
+
+    def get_xy_stage_device(self):
+        self._rpc("get_xy_stage_device")
+        return self.xy_stage_device
+
+    def set_position(self, *args):
+        # set_position(z) or set_position(device, z), like Core.setPosition
+        self._rpc("set_position")
+        self.focus.move_to(args[-1])
+
+    def get_position(self, *args):
+        self._rpc("get_position")
+        return self.focus.position()
+
+    def get_focus_device(self):
+        self._rpc("get_focus_device")
+        return self.focus_device
+
+    def set_property(self, device, prop, value):
+        self._rpc("set_property")
+        if (device, prop) == ("Objective", "Label") and self.properties[(device, prop)] != str(value):
+            self._objective_busy_until = self.stage.now() + self.objective_switch_time
+        if (device, prop) == (self.xy_stage_device, STAGE_SPEED_PROPERTY):
+            self.stage.velocity = (float(value), float(value))
+        self.properties[(device, prop)] = str(value)
+
+    def get_property(self, device, prop):
+        self._rpc("get_property")
+        return self.properties[(device, prop)]
+
+    def _busy(self, device):
+        if device == self.xy_stage_device:
+            return self.stage.is_busy()
+        if device == self.focus_device:
+            return self.focus.is_busy()
+        if device == "Objective":
+            return self.stage.now() < self._objective_busy_until
+        return False
+
+    def device_busy(self, device):
+        self._rpc("device_busy")
+        return self._busy(device)
+
+    def wait_for_device(self, device):
+        self._rpc("wait_for_device")
+        while self._busy(device):
+            time.sleep(0.001)
+
+    def objective_um_per_pixel(self):
+        return SIM_UM_PER_PIXEL.get(self.properties[("Objective", "Label")], 1.0)
+
+    def objective_numerical_aperture(self):
+        return SIM_NUMERICAL_APERTURE.get(self.properties[("Objective", "Label")], 0.1)
+
+
+class VirtualSlide:
+    """
+    Procedural tissue section covering `bounds`, stored at a coarse resolution and
+    modulated by a periodic high-frequency texture so that 20x frames still carry
+    structure for registration and focus metrics.
+
+    The in-focus Z is FOCUS_BASE_Z everywhere unless the slide is given a tilt
+    (µm of Z per µm of X, Y) and a slow bow (amplitude in µm); `relief_um` adds
+    short-range section relief, so that parts of one 20x field sit at
+    different focus.
+    """
+
+    def __init__(self, bounds=SLIDE_BOUNDS, um_per_px=20.0, texture_um_per_px=0.5,
+                 texture_size=512, seed=0, focus_tilt=(0.0, 0.0), focus_bow_um=0.0, relief_um=0.0):
+        self.bounds = bounds
+        self.um_per_px = um_per_px
+        self.texture_um_per_px = texture_um_per_px
+        self.focus_tilt = focus_tilt
+        self.focus_bow_um = focus_bow_um
+        self.relief_um = relief_um
+
+        rng = np.random.default_rng(seed)
+        x_min, y_min, x_max, y_max = bounds
+        width = int(math.ceil((x_max - x_min) / um_per_px))
+        height = int(math.ceil((y_max - y_min) / um_per_px))
+
+        # Blobby tissue mask from heavily blurred noise
+        noise = rng.random((height, width), dtype=np.float32)
+        blobs = cv2.GaussianBlur(noise, (0, 0), sigmaX=max(width, height) / 60.0)
+        blobs = (blobs - blobs.min()) / max(float(blobs.max() - blobs.min()), 1e-6)
+        tissue = np.clip((blobs - 0.55) * 8.0, 0.0, 1.0)
+
+        # Eosin-like stroma with hematoxylin-like nuclei speckle
+        speckle = cv2.GaussianBlur(rng.random((height, width), dtype=np.float32), (0, 0), 1.0)
+        eosin = np.array([200, 140, 215], dtype=np.float32)
+        hematoxylin = np.array([150, 70, 110], dtype=np.float32)
+        stain = eosin + (hematoxylin - eosin) * np.clip((speckle - 0.5) * 6.0, 0.0, 1.0)[..., None]
+        glass = np.array(GLASS_BGR, dtype=np.float32)
+        slide = glass + (stain - glass) * tissue[..., None]
+        self.image = np.clip(slide, 0, 255).astype(np.uint8)
+
+        texture = cv2.GaussianBlur(rng.random((texture_size, texture_size), dtype=np.float32), (0, 0), 1.5)
+        texture = (texture - texture.mean()) / max(float(texture.std()), 1e-6)
+        self.texture = np.clip(128 + texture * 18, 0, 255).astype(np.uint8)
+        self._tiled = self.texture
+
+    def focus_z(self, x, y):
+        """
+        In-focus Z (µm) at stage positions x, y (scalars or arrays).
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        cx = (self.bounds[0] + self.bounds[2]) / 2
+        cy = (self.bounds[1] + self.bounds[3]) / 2
+        z = FOCUS_BASE_Z + self.focus_tilt[0] * (x - cx) + self.focus_tilt[1] * (y - cy)
+        if self.focus_bow_um:
+            z = z + self.focus_bow_um * np.sin(2 * np.pi * x / 20000.0) * np.cos(2 * np.pi * y / 16000.0)
+        if self.relief_um:
+            z = z + self.relief_um * np.sin(2 * np.pi * x / 350.0) * np.sin(2 * np.pi * y / 420.0)
+        return z
+
+    def _tiled_texture(self, extent):
+        reps = int(math.ceil(extent / self.texture.shape[0]))
+        if self._tiled.shape[0] < reps * self.texture.shape[0]:
+            self._tiled = np.tile(self.texture, (reps, reps))
+        return self._tiled
+
+    def render(self, cx, cy, um_per_px, width, height, rotation=0.0):
+        """
+        Renders the field of view centred on stage position (cx, cy), upright
+        (image +x is stage +x, image +y is stage +y) unless the camera is
+        rotated by `rotation` degrees. Returns a BGR uint8 frame.
+        """
+        x_min, y_min = self.bounds[0], self.bounds[1]
+        cos, sin = math.cos(math.radians(rotation)), math.sin(math.radians(rotation))
+        # Stage offset of the top-left pixel from the centre
+        left = cx - (cos * width - sin * height) / 2.0 * um_per_px
+        top = cy - (sin * width + cos * height) / 2.0 * um_per_px
+
+        scale = um_per_px / self.um_per_px
+        slide_map = np.float32([
+            [scale * cos, -scale * sin, (left - x_min) / self.um_per_px],
+            [scale * sin, scale * cos, (top - y_min) / self.um_per_px],
+        ])
+        frame = cv2.warpAffine(
+            self.image, slide_map, (width, height),
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_CONSTANT, borderValue=GLASS_BGR,
+        )
+
+        # Sample the periodic texture from a pre-tiled copy (BORDER_WRAP is much slower)
+        tex_scale = um_per_px / self.texture_um_per_px
+        size = self.texture.shape[0]
+        # Rotated fields reach left of / above the top-left pixel; pad by whole texture periods
+        pad = size * int(math.ceil(abs(sin) * (width + height) * tex_scale / size))
+        tiled = self._tiled_texture(int(math.ceil((width + height if rotation else max(width, height)) * tex_scale))
+                                    + size + 2 * pad)
+        tex_map = np.float32([
+            [tex_scale * cos, -tex_scale * sin, (left / self.texture_um_per_px) % size + pad],
+            [tex_scale * sin, tex_scale * cos, (top / self.texture_um_per_px) % size + pad],
+        ])
+        detail = cv2.warpAffine(
+            tiled, tex_map, (width, height),
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE,
+        )
+        return cv2.multiply(frame, cv2.merge([detail, detail, detail]), scale=1.0 / 128)
+
+
+class SimulatedCamera:
+    """
+    Stand-in for cv2.VideoCapture that renders the virtual slide at the current
+    stage position. Frames come out rotated 180° like the real camera, so the
+    usual flip in the capture path makes them upright.
+
+    The sensor free-runs at `fps`; frame k is exposed during the `exposure`
+    seconds before k / fps, and stage motion during the exposure blurs it.
+    Like a DirectShow driver, up to `buffered_frames` finished frames are queued
+    and handed out oldest first, so a read right after a move can return a
+    frame exposed before (or during) the move.
+    `rotation` (degrees) turns the camera against the stage axes and
+    `pixel_scale` makes the true pixel size differ from the nominal one.
+    """
+
+    def __init__(self, core, slide, fps=30.0, noise_sigma=2.0, seed=None, exposure=0.01, buffered_frames=0,
+                 vignetting=0.0, dark_level=0, rotation=0.0, pixel_scale=1.0):
+        self.core = core
+        self.slide = slide
+        self.fps = fps
+        self.noise_sigma = noise_sigma
+        self.exposure = exposure
+        self.buffered_frames = buffered_frames
+        self.vignetting = vignetting  # relative brightness loss in the frame corners
+        self.dark_level = dark_level  # black level offset (counts)
+        self.light = True             # False: lamp off, for dark frames
+        self.rotation = rotation      # camera rotation against the stage axes (degrees)
+        self.pixel_scale = pixel_scale  # true pixel size / nominal pixel size
+        self._vignette = None
+        self.width, self.height = SENSOR_SIZE
+        self._opened = True
+        self._last_frame = None
+        self._pending = None
+        self._noise = None
+        self._rng = np.random.default_rng(seed)
+
+    def isOpened(self):
+        return self._opened
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.width = int(value)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.height = int(value)
+        elif prop == cv2.CAP_PROP_FPS:
+            self.fps = float(value)
+        elif prop == cv2.CAP_PROP_EXPOSURE:
+            self.exposure = 2.0 ** float(value)  # DirectShow convention: log2 of seconds
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps * self.core.stage.time_scale)  # frames per wall-clock second
+        if prop == cv2.CAP_PROP_EXPOSURE:
+            return math.log2(self.exposure) if self.exposure else 0.0
+        return 0.0
+
+    def grab(self):
+        """
+        Takes the oldest queued frame, or waits for the next one to finish exposing.
+        """
+        if not self._opened:
+            return False
+        stage = self.core.stage
+        latest = int(math.floor(stage.now() * self.fps))
+        oldest_kept = latest - self.buffered_frames + 1
+        if self._last_frame is not None and self.buffered_frames > 0 and latest > self._last_frame:
+            frame = max(self._last_frame + 1, oldest_kept)
+        else:
+            frame = max(latest, self._last_frame if self._last_frame is not None else latest) + 1
+            delay = (frame / self.fps - stage.now()) / stage.time_scale
+            if delay > 0:
+                time.sleep(delay)
+        self._last_frame = frame
+        self._pending = frame / self.fps
+        return True
+
+    def retrieve(self, image=None, flag=0):
+        if self._pending is None:
+            return False, None
+        stage = self.core.stage
+        t_end = self._pending
+        self._pending = None
+        x, y = stage.position(t_end, jitter=False)
+
+        # Keep the sensor field of view fixed regardless of the requested resolution
+        um_per_px = self.core.objective_um_per_pixel() * self.pixel_scale * SENSOR_SIZE[0] / self.width
+        frame = self.slide.render(x, y, um_per_px, self.width, self.height, self.rotation)
+
+        frame = self._defocus(frame, x, y, um_per_px, self.core.focus.position(t_end))
+        if self.exposure:
+            x0, y0 = stage.position(t_end - self.exposure, jitter=False)
+            frame = _motion_blur(frame, (x - x0) / um_per_px, (y - y0) / um_per_px)
+        if self.vignetting:
+            frame = cv2.multiply(frame, self.vignette_map(frame.shape), dtype=cv2.CV_8U)
+        if not self.light:
+            frame = np.zeros_like(frame)
+        if self.dark_level:
+            frame = cv2.add(frame, (self.dark_level,) * 3 + (0,))
+        if self.noise_sigma:
+            frame = cv2.add(frame, self._noise_view(frame.shape), dtype=cv2.CV_8U)
+        return True, cv2.flip(frame, -1)
+
+    def vignette_map(self, shape):
+        """
+        Radial illumination falloff (1 at the centre, 1 - vignetting in the
+        corners) applied to the upright frame.
+        """
+        if self._vignette is None or self._vignette.shape != shape:
+            h, w = shape[:2]
+            yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+            r2 = ((xx - (w - 1) / 2) ** 2 + (yy - (h - 1) / 2) ** 2) / (((w - 1) / 2) ** 2 + ((h - 1) / 2) ** 2)
+            self._vignette = cv2.merge([1.0 - self.vignetting * r2] * shape[2])
+        return self._vignette
+
+    def _defocus(self, frame, x, y, um_per_px, z):
+        """
+        Blurs the frame by its distance from the slide's focal surface
+        (blur sigma ~ NA * |dz|, sampled on a coarse grid over the field).
+        """
+        h, w = frame.shape[:2]
+        gx = x + (np.linspace(0.0, 1.0, 16) - 0.5) * w * um_per_px
+        gy = y + (np.linspace(0.0, 1.0, 9) - 0.5) * h * um_per_px
+        dz = z - self.slide.focus_z(*np.meshgrid(gx, gy))
+        sigma = self.core.objective_numerical_aperture() * np.abs(dz) / um_per_px
+        return _defocus_blur(frame, sigma)
+
+    def _noise_view(self, shape):
+        """
+        Random window into a pre-generated sensor noise field (fresh randn per frame is too slow).
+        """
+        margin = 64
+        if self._noise is None or self._noise.shape[:2] != (shape[0] + margin, shape[1] + margin):
+            self._noise = self._rng.normal(
+                0.0, self.noise_sigma, (shape[0] + margin, shape[1] + margin, shape[2])
+            ).astype(np.int16)
+        dy, dx = self._rng.integers(0, margin, size=2)
+        return self._noise[dy:dy + shape[0], dx:dx + shape[1]]
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        self._opened = False
+
+
+class SimulatedMicroscope:
+    """
+    Bundles a simulated core, stage and virtual slide. Every open_camera() call
+    returns a new camera bound to the same stage, like reopening a real device.
+    """
+
+    def __init__(self, stage=None, slide=None, camera_fps=30.0, noise_sigma=2.0, seed=0,
+                 exposure=0.01, buffered_frames=0, vignetting=0.0, dark_level=0, core_round_trip=0.0,
+                 camera_rotation=0.0, pixel_scale=1.0):
+        self.core = SimulatedCore(stage or SimulatedStage(seed=seed), round_trip=core_round_trip)
+        self.slide = slide or VirtualSlide(seed=seed)
+        self.camera_fps = camera_fps
+        self.noise_sigma = noise_sigma
+        self.exposure = exposure
+        self.buffered_frames = buffered_frames
+        self.vignetting = vignetting
+        self.dark_level = dark_level
+        self.camera_rotation = camera_rotation
+        self.pixel_scale = pixel_scale
+        self.seed = seed
+
+    def open_camera(self):
+        return SimulatedCamera(self.core, self.slide, fps=self.camera_fps, noise_sigma=self.noise_sigma,
+                               seed=self.seed, exposure=self.exposure, buffered_frames=self.buffered_frames,
+                               vignetting=self.vignetting, dark_level=self.dark_level,
+                               rotation=self.camera_rotation, pixel_scale=self.pixel_scale)
@@ -1,30 +1,42 @@
 import time
-from microscope_scan_tool.logger import log_error
+
+from microscope_scan_tool import scan_timing
+from microscope_scan_tool.logger import log_warning
+from microscope_scan_tool.stage_settling import default_motion_model, move_distance, wait_for_settle
 
 POSITION_TOLERANCE = 50  # microns
 MOVE_TIMEOUT = 5.0       # seconds
 
-def move_stage(core, x, y, tolerance=POSITION_TOLERANCE, timeout=MOVE_TIMEOUT):
+def move_stage(core, x, y, tolerance=POSITION_TOLERANCE, timeout=MOVE_TIMEOUT, model=None):
     """
     Moves the stage to (x, y) and waits until the stage settles or timeout is hit.
-    """
-    core.set_xy_position(x, y)
 
-    move_attempts = 0
-    max_attempts = int(timeout / 0.1)
+    The wait is predicted from a learned distance -> settle time model, so short
+    serpentine steps finish sooner than long row returns. Only timeouts and
+    unusually slow moves are logged. Moves that time out are learned too, with
+    the timeout as the settle time of the axes that never arrived. Returns the
+    last read (x, y) position.
+    """
+    model = model or default_motion_model
+    dx, dy = move_distance(model, core, x, y)
+    predicted = model.predict(dx, dy)
 
-    while move_attempts < max_attempts:
-        current_x, current_y = core.get_x_position(), core.get_y_position()
-        dx = abs(current_x - x)
-        dy = abs(current_y - y)
+    start = time.perf_counter()
+    core.set_xy_position(x, y)
+    model.last_target = (x, y)
+    scan_timing.record("move", start)
 
-        if dx < tolerance and dy < tolerance:
-            break
+    start = time.perf_counter()
+    position, arrived, elapsed, settled = wait_for_settle(core, x, y, tolerance, timeout, predicted)
+    scan_timing.record("settle", start)
 
-        time.sleep(0.1)
-        move_attempts += 1
+    if not settled:
+        model.record(dx, dy, arrived[0] or elapsed, arrived[1] or elapsed)
+        log_warning(f" Stage move timeout at ({x}, {y}) — proceeding anyway.", x=x, y=y)
+        return position
 
-    if move_attempts >= max_attempts:
-        log_error(f" Stage move timeout at ({x}, {y}) — proceeding anyway.")
-    else:
-        log_error(f" Stage reached ({x}, {y}) in {move_attempts * 0.1:.1f} sec.")
+    model.record(dx, dy, arrived[0], arrived[1])
+    if model.is_anomalous(predicted, elapsed):
+        log_warning(f" Slow stage settle at ({x}, {y}): {elapsed:.3f} sec, expected ~{predicted:.3f} sec.",
+                    x=x, y=y, elapsed=round(elapsed, 3), predicted=round(predicted, 3))
+    return position
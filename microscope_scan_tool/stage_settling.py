@@ -0,0 +1,189 @@
+"""
+Stage settling helpers: single-call XY reads, adaptive polling and a learned
+per-axis motion model (move distance -> settle time).
+"""
+import time
+from collections import deque
+
+import numpy as np
+
+INITIAL_POLL_INTERVAL = 0.003  # seconds, first poll after the predicted wait
+MAX_POLL_INTERVAL = 0.02       # seconds, polling backs off up to this interval
+POLL_BACKOFF = 1.4
+STILL_THRESHOLD = 2.0          # µm between consecutive reads for an axis to count as stopped
+
+PREDICTED_WAIT_FRACTION = 0.6  # sleep this share of the predicted settle time before polling
+MAX_PREDICTED_WAIT = 0.2       # share of the timeout the pre-poll sleep may take at most
+MODEL_HISTORY = 200            # moves remembered per axis
+MODEL_MIN_SAMPLES = 6          # moves needed before the model makes predictions
+MODEL_MIN_DISTANCES = 3        # distinct move distances needed before the curve is fitted
+DISTANCE_RESOLUTION = 10.0     # µm; distances closer than this count as the same distance
+ANOMALY_FACTOR = 2.0           # settle time above FACTOR * predicted + MARGIN is flagged
+ANOMALY_MARGIN = 0.05          # seconds
+
+
+def read_xy(core):
+    """
+    Reads the stage XY position with a single call when the core supports it,
+    falling back to separate X and Y reads.
+    """
+    try:
+        pos = core.get_xy_stage_position()
+    except AttributeError:
+        return core.get_x_position(), core.get_y_position()
+
+    try:
+        return pos.x, pos.y
+    except AttributeError:
+        return pos.get_x(), pos.get_y()
+
+
+class AxisMotionModel:
+    """
+    Least-squares fit of settle time against move distance for one axis:
+    t = a + b * d + c * sqrt(d), which covers both acceleration-limited short
+    moves and velocity-limited long ones.
+
+    The curve is only fitted once the moves cover MODEL_MIN_DISTANCES distinct
+    distances (a scan with one step size would leave it unconstrained), and
+    predictions never leave the distance and time range actually observed.
+    """
+
+    def __init__(self, history=MODEL_HISTORY):
+        self.samples = deque(maxlen=history)
+        self._coeffs = None
+        self._range = None  # (min distance, max distance, min seconds, max seconds) of the samples
+
+    @staticmethod
+    def _features(distance):
+        distance = np.asarray(distance, dtype=np.float64)
+        return np.stack([np.ones_like(distance), distance, np.sqrt(distance)], axis=-1)
+
+    def record(self, distance, seconds):
+        if distance <= 0:
+            return
+        self.samples.append((distance, seconds))
+        d, t = np.array(self.samples).T
+        self._range = (d.min(), d.max(), t.min(), t.max())
+        self._coeffs = None
+        if len(d) >= MODEL_MIN_SAMPLES and len(np.unique(np.round(d / DISTANCE_RESOLUTION))) >= MODEL_MIN_DISTANCES:
+            self._coeffs = np.linalg.lstsq(self._features(d), t, rcond=None)[0]
+
+    def predict(self, distance):
+        """
+        Predicted settle time in seconds, or None until enough moves were seen.
+        """
+        if distance <= 0:
+            return 0.0
+        if self._coeffs is None:
+            return None
+        d_min, d_max, t_min, t_max = self._range
+        seconds = float(self._features(min(max(distance, d_min), d_max)) @ self._coeffs)
+        return min(max(seconds, t_min), t_max)
+
+
+class StageMotionModel:
+    """
+    Per-axis motion models plus the last commanded target, used by move_stage to
+    predict how long a move will take and to flag unusually slow moves.
+
+    A separate pair of axis models is kept for each key passed to select()
+    (the scan selects its objective), so the moves of one step size do not
+    predict those of another.
+    """
+
+    def __init__(self, history=MODEL_HISTORY):
+        self.history = history
+        self._models = {}
+        self.last_target = None
+        self.select(None)
+
+    def select(self, key):
+        """
+        Switches to the axis models for `key`, starting fresh ones for a new key.
+        """
+        if key not in self._models:
+            self._models[key] = (AxisMotionModel(self.history), AxisMotionModel(self.history))
+        self.x, self.y = self._models[key]
+
+    def predict(self, dx, dy):
+        """
+        Axes move concurrently, so the move takes as long as the slower axis.
+        Returns None while either moving axis has no prediction yet.
+        """
+        tx, ty = self.x.predict(abs(dx)), self.y.predict(abs(dy))
+        if tx is None or ty is None:
+            return None
+        return max(tx, ty)
+
+    def record(self, dx, dy, x_seconds, y_seconds):
+        if x_seconds is not None:
+            self.x.record(abs(dx), x_seconds)
+        if y_seconds is not None:
+            self.y.record(abs(dy), y_seconds)
+
+    def is_anomalous(self, predicted, actual):
+        return predicted is not None and actual > ANOMALY_FACTOR * predicted + ANOMALY_MARGIN
+
+
+def wait_for_settle(core, x, y, tolerance, timeout, predicted=None):
+    """
+    Waits until both axes are within `tolerance` of (x, y) and have stopped moving,
+    or `timeout` expires.
+
+    Sleeps through most of the predicted settle time (at most MAX_PREDICTED_WAIT
+    of the timeout), then polls with an interval that starts short and backs off.
+    The stage is always read at least twice, so a move is only reported as
+    unsettled once it was seen moving or outside the tolerance. Returns
+    (position, per-axis arrival times, elapsed seconds, settled flag); arrival
+    times are None for axes that never reached the target.
+    """
+    start = time.perf_counter()
+    if predicted:
+        time.sleep(min(predicted * PREDICTED_WAIT_FRACTION, timeout * MAX_PREDICTED_WAIT))
+
+    interval = INITIAL_POLL_INTERVAL
+    arrived = [None, None]
+    previous = None
+    while True:
+        position = read_xy(core)
+        elapsed = time.perf_counter() - start
+
+        # An axis has arrived once it is inside the tolerance window and no longer moving
+        confirming = False
+        for axis, target in enumerate((x, y)):
+            inside = abs(position[axis] - target) < tolerance
+            still = previous is not None and abs(position[axis] - previous[axis]) < STILL_THRESHOLD
+            if inside and still:
+                if arrived[axis] is None:
+                    arrived[axis] = elapsed
+            else:
+                arrived[axis] = None
+                confirming = confirming or inside
+
+        if arrived[0] is not None and arrived[1] is not None:
+            return position, arrived, elapsed, True
+        checked = previous is not None
+        previous = position
+        if checked and elapsed >= timeout:
+            return position, arrived, elapsed, False
+
+        # Poll quickly again when an axis just entered the window, otherwise back off
+        if confirming:
+            interval = INITIAL_POLL_INTERVAL
+        time.sleep(min(interval, max(timeout - elapsed, INITIAL_POLL_INTERVAL)))
+        interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+
+default_motion_model = StageMotionModel()
+
+
+def move_distance(model, core, x, y):
+    """
+    Distance (dx, dy) of the upcoming move, taken from the model's last target or
+    from a position read on the very first move.
+    """
+    if model.last_target is None:
+        model.last_target = read_xy(core)
+    last_x, last_y = model.last_target
+    return x - last_x, y - last_y
@@ -0,0 +1,116 @@
+"""
+TIFF compression settings for tile writes.
+
+All codecs are lossless. zlib is always available (built into tifffile); zstd,
+LZW and WebP need the optional imagecodecs package and are detected at runtime.
+tifffile encodes the strips or tiles of one image on several threads, on top
+of the parallelism of the TileWriterPool workers.
+"""
+import io
+import threading
+
+import numpy as np
+import tifffile
+
+# name -> (tifffile compression, default compressionargs, horizontal predictor)
+CODECS = {
+    "none": (None, None, False),
+    "zlib": ("zlib", {"level": 1}, True),
+    "zstd": ("zstd", {"level": 1}, True),
+    "lzw": ("lzw", None, True),
+    "webp": ("webp", {"lossless": True}, False),
+}
+DEFAULT_TILE_SIZE = 256
+ENCODE_THREADS = 2         # threads per image for compressed writes
+
+_availability = {}
+_availability_lock = threading.Lock()
+
+
+class TileCompression:
+    """
+    How tile_XXXX.tif files are encoded.
+
+    Args:
+        codec (str): One of CODECS.
+        level (int): Codec level for zlib/zstd (None: the default from CODECS).
+        tile_size (int): Write a tiled TIFF with square tiles of this size (None: strips).
+        threads (int): Threads tifffile uses to encode the strips/tiles of one image.
+    """
+
+    def __init__(self, codec="none", level=None, tile_size=None, threads=ENCODE_THREADS):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}', expected one of {tuple(CODECS)}")
+        if tile_size is not None and tile_size % 16:
+            raise ValueError(f"TIFF tile size must be a multiple of 16, got {tile_size}")
+        self.codec = codec
+        self.level = level
+        self.tile_size = tile_size
+        self.threads = threads
+
+    def __repr__(self):
+        layout = f"tiled {self.tile_size}" if self.tile_size else "strips"
+        level = f" level {self.level}" if self.level is not None else ""
+        return f"{self.codec}{level}, {layout}"
+
+    def imwrite_kwargs(self, shape):
+        """
+        Keyword arguments for tifffile.imwrite of an image with the given shape.
+        """
+        compression, args, predictor = CODECS[self.codec]
+        kwargs = {}
+        if compression is not None:
+            kwargs["compression"] = compression
+            args = dict(args or {})
+            if self.level is not None and "level" in args:
+                args["level"] = self.level
+            if args:
+                kwargs["compressionargs"] = args
+            if predictor:
+                kwargs["predictor"] = True
+            kwargs["maxworkers"] = self.threads  # strips/tiles are encoded in parallel
+        if self.tile_size:
+            tile = self.tile_size
+            if shape[0] >= tile and shape[1] >= tile:
+                kwargs["tile"] = (tile, tile)
+        return kwargs
+
+
+NO_COMPRESSION = TileCompression()
+
+
+def codec_available(codec):
+    """
+    True if tifffile can encode and decode `codec` in this environment.
+    """
+    with _availability_lock:
+        if codec not in _availability:
+            try:
+                buffer = io.BytesIO()
+                sample = np.zeros((16, 16, 3), dtype=np.uint8)
+                tifffile.imwrite(buffer, sample, photometric="rgb",
+                                 **TileCompression(codec).imwrite_kwargs(sample.shape))
+                tifffile.imread(io.BytesIO(buffer.getvalue()))
+                _availability[codec] = True
+            except Exception:
+                _availability[codec] = False
+        return _availability[codec]
+
+
+def available_codecs():
+    return [codec for codec in CODECS if codec_available(codec)]
+
+
+def resolve_compression(compression):
+    """
+    Accepts None, a codec name or a TileCompression and returns a TileCompression
+    whose codec is usable here, falling back to zlib with a warning.
+    """
+    if compression is None:
+        return NO_COMPRESSION
+    if isinstance(compression, str):
+        compression = TileCompression(compression)
+    if not codec_available(compression.codec):
+        print(f"  Compression '{compression.codec}' is not available (install imagecodecs); using zlib.")
+        compression = TileCompression("zlib", tile_size=compression.tile_size, threads=compression.threads)
+    return compression
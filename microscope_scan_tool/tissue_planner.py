@@ -0,0 +1,141 @@
+"""
+Overview-then-detail scan planning.
+
+A low-resolution overview (a fresh 4x pass or an existing 4x scan folder) is
+turned into a tissue mask, and only the detail tiles whose footprint (plus a
+margin) touches tissue are handed to snake_like_scan.
+"""
+import os
+
+import cv2
+import numpy as np
+import tifffile
+
+from microscope_scan_tool.metadata_writer import find_tile_configuration, load_fiji_metadata
+from microscope_scan_tool.objectives import field_of_view
+
+OVERVIEW_UM_PER_PIXEL = 20.0     # resolution of the overview canvas and tissue mask
+TISSUE_MARGIN_UM = 200.0         # keep detail tiles this close to tissue
+MIN_SATURATION = 20              # floor for the Otsu saturation threshold (0-255)
+DARKNESS_DELTA = 25              # pixels this much darker than glass count as tissue
+OPEN_KERNEL_UM = 60.0            # removes specks / dust smaller than this
+CLOSE_KERNEL_UM = 200.0          # fills holes and gaps smaller than this
+SECONDS_PER_TILE_ESTIMATE = 0.5  # used for the time-saved report only
+
+
+def build_overview(scan_dir, objective_label="4x", overview_um_per_px=OVERVIEW_UM_PER_PIXEL):
+    """
+    Downsamples every tile of a scan folder into one RGB overview canvas.
+
+    Returns:
+        (overview, covered, origin, overview_um_per_px) where covered marks canvas
+        pixels that received tile data and origin is the stage (x, y) of the
+        canvas' top-left pixel.
+    """
+    config = find_tile_configuration(scan_dir)
+    if config is None:
+        raise FileNotFoundError(f"No TileConfiguration_*.txt found in {scan_dir}")
+    tiles = load_fiji_metadata(config)
+    if not tiles:
+        raise ValueError(f"{config} lists no tiles")
+
+    fov_w, fov_h = field_of_view(objective_label)
+    xs = np.array([x for _, x, _ in tiles])
+    ys = np.array([y for _, _, y in tiles])
+    origin = (xs.min() - fov_w / 2, ys.min() - fov_h / 2)
+    width = int(np.ceil((xs.max() - xs.min() + fov_w) / overview_um_per_px)) + 1
+    height = int(np.ceil((ys.max() - ys.min() + fov_h) / overview_um_per_px)) + 1
+    overview = np.full((height, width, 3), 255, dtype=np.uint8)
+    covered = np.zeros((height, width), dtype=bool)
+
+    tile_w = max(1, int(round(fov_w / overview_um_per_px)))
+    tile_h = max(1, int(round(fov_h / overview_um_per_px)))
+    small = np.empty((tile_h, tile_w, 3), dtype=np.uint8)
+
+    for filename, x, y in tiles:
+        image = tifffile.imread(os.path.join(scan_dir, filename))
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        cv2.resize(image, (tile_w, tile_h), dst=small, interpolation=cv2.INTER_AREA)
+
+        col = int(round((x - fov_w / 2 - origin[0]) / overview_um_per_px))
+        row = int(round((y - fov_h / 2 - origin[1]) / overview_um_per_px))
+        overview[row:row + tile_h, col:col + tile_w] = small[:height - row, :width - col]
+        covered[row:row + tile_h, col:col + tile_w] = True
+
+    return overview, covered, origin, overview_um_per_px
+
+
+def tissue_mask(overview, covered=None, overview_um_per_px=OVERVIEW_UM_PER_PIXEL):
+    """
+    Brightfield tissue mask of an RGB overview: stained tissue is more saturated
+    and darker than bare glass. Only pixels in `covered` (default: all) are
+    considered. Returns a uint8 mask (1 = tissue).
+    """
+    if covered is None:
+        covered = np.ones(overview.shape[:2], dtype=bool)
+
+    hsv = cv2.cvtColor(overview, cv2.COLOR_RGB2HSV)
+    saturation = hsv[..., 1]
+    otsu, _ = cv2.threshold(saturation[covered], 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    saturated = saturation > max(otsu, MIN_SATURATION)
+
+    gray = cv2.cvtColor(overview, cv2.COLOR_RGB2GRAY)
+    glass_level = np.percentile(gray[covered], 90)
+    dark = gray < glass_level - DARKNESS_DELTA
+
+    mask = (saturated | dark) & covered
+    mask = mask.astype(np.uint8)
+
+    def kernel(um):
+        size = max(1, int(round(um / overview_um_per_px))) | 1
+        return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel(OPEN_KERNEL_UM))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel(CLOSE_KERNEL_UM))
+    return mask
+
+
+def filter_positions_by_mask(positions, mask, origin, overview_um_per_px, fov, margin_um=TISSUE_MARGIN_UM):
+    """
+    Keeps the (x, y) positions whose tile footprint, grown by `margin_um`, covers
+    at least one tissue pixel. Uses an integral image, so each tile is O(1).
+    Positions outside the overview are dropped (there is no evidence of tissue).
+    """
+    if not positions:
+        return []
+
+    integral = cv2.integral(mask)  # (h + 1, w + 1)
+    h, w = mask.shape
+    pts = np.asarray(positions, dtype=np.float64)
+    half_w = fov[0] / 2 + margin_um
+    half_h = fov[1] / 2 + margin_um
+
+    c0 = np.clip(np.floor((pts[:, 0] - half_w - origin[0]) / overview_um_per_px), 0, w).astype(int)
+    c1 = np.clip(np.ceil((pts[:, 0] + half_w - origin[0]) / overview_um_per_px), 0, w).astype(int)
+    r0 = np.clip(np.floor((pts[:, 1] - half_h - origin[1]) / overview_um_per_px), 0, h).astype(int)
+    r1 = np.clip(np.ceil((pts[:, 1] + half_h - origin[1]) / overview_um_per_px), 0, h).astype(int)
+
+    tissue_pixels = integral[r1, c1] - integral[r0, c1] - integral[r1, c0] + integral[r0, c0]
+    keep = tissue_pixels > 0
+    return [positions[i] for i in np.flatnonzero(keep)]
+
+
+def plan_tissue_positions(positions, overview_dir, detail_objective="20x", overview_objective="4x",
+                          margin_um=TISSUE_MARGIN_UM, seconds_per_tile=SECONDS_PER_TILE_ESTIMATE):
+    """
+    Filters a full-rectangle detail plan down to the tiles that intersect tissue
+    in an existing overview scan, and prints how much was saved.
+    """
+    overview, covered, origin, overview_um_per_px = build_overview(overview_dir, overview_objective)
+    mask = tissue_mask(overview, covered, overview_um_per_px)
+    kept = filter_positions_by_mask(positions, mask, origin, overview_um_per_px,
+                                    field_of_view(detail_objective), margin_um)
+
+    skipped = len(positions) - len(kept)
+    share = 100.0 * skipped / max(len(positions), 1)
+    print(f" Tissue plan: {len(kept)} of {len(positions)} {detail_objective} tiles intersect tissue "
+          f"({skipped} skipped, {share:.0f}%).")
+    print(f" Estimated time saved: {skipped * seconds_per_tile / 60:.1f} min "
+          f"(at {seconds_per_tile:.2f} s/tile).")
+    return kept
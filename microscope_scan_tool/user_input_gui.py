@@ -1,11 +1,8 @@
 import tkinter as tk
 from tkinter import messagebox
-import time
-import cv2
-from pycromanager import Core
 
 from microscope_scan_tool import shared_state
-from microscope_scan_tool.image_capture import initialize_camera
+from microscope_scan_tool.mm_session import get_session
 
 def get_user_inputs(fields, defaults):
     """
@@ -23,8 +20,8 @@ def get_user_inputs(fields, defaults):
     window = tk.Tk()
     window.title("Enter Stage Coordinates")
 
-    # === Initialize Micro-Manager Core ===
-    core = Core()
+    # === Micro-Manager session (shared with the scan) ===
+    core = get_session()
 
     def on_objective_change(*args):
         selected = selected_objective.get()
@@ -49,18 +46,15 @@ def get_user_inputs(fields, defaults):
 
             user_inputs["objective_label"] = selected_objective.get()
 
-            shared_state.camera_running = False
-            time.sleep(0.5)
-            cv2.destroyAllWindows()
+            # The live preview keeps running during the scan (shared camera service)
             window.destroy()
 
         except ValueError as e:
             messagebox.showerror("Input Error", f"{e}\n\nEnter numeric values only.")
 
     def on_close():
-        shared_state.camera_running = False
-        time.sleep(0.5)
-        cv2.destroyAllWindows()
+        # The preview thread sees the stop event on its next frame and closes its own window
+        shared_state.state.stop()
         window.destroy()
 
     # === Dynamic WB Slider & Button ===
@@ -86,16 +80,10 @@ def get_user_inputs(fields, defaults):
 
         # Select Button (to enable drawing)
         def confirm_gain_and_start_patch():
-            shared_state.white_balance_scale = wb_gain_scale.get()
-
             # Clear old medians and disable WB until a new patch is drawn
-            shared_state.white_balance_on = False
-            shared_state.white_balance_medians = None
-            shared_state.box_start = None
-            shared_state.box_end = None
-
-            shared_state.enable_patch_selection = True
-            print(f" Patch selection mode enabled with scale factor: {shared_state.white_balance_scale}")
+            scale = wb_gain_scale.get()
+            shared_state.state.begin_patch_selection(scale)
+            print(f" Patch selection mode enabled with scale factor: {scale}")
 
         wb_select_button = tk.Button(window, text="Select", command=confirm_gain_and_start_patch)
         wb_select_button.grid(row=row_index + 1, column=1, columnspan=2, pady=5, sticky="w")
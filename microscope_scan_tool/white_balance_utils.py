@@ -3,27 +3,39 @@ import numpy as np
 from microscope_scan_tool import shared_state
 
 
+def white_balance_is_valid(medians, scale):
+    return not (
+        medians is None or
+        scale is None or
+        np.any(np.asarray(medians) == 0) or
+        scale <= 0
+    )
+
+
+def build_white_balance_lut(medians, scale):
+    """
+    Builds a (256, 1, 3) per-channel lookup table for cv2.LUT that maps each raw
+    BGR value to (value / (median * scale)) clipped to [0, 1] and scaled to uint8.
+    Matches the float per-pixel formula exactly.
+    """
+    target = np.asarray(medians, dtype=np.float32) * scale
+    values = np.arange(256, dtype=np.float32)[:, None]
+    balanced = np.clip(values / target, 0, 1)
+    return (balanced * 255).astype(np.uint8).reshape(256, 1, 3)
+
+
 def apply_white_balance_to_frame(frame):
     """
     Applies white balance correction to a given frame using stored medians and scale factor.
     Used for preview only.
     """
-    medians = shared_state.white_balance_medians
-    scale = shared_state.white_balance_scale
+    wb = shared_state.state.white_balance
+    medians, scale = wb.medians, wb.scale
 
-    if (
-        medians is None or
-        scale is None or
-        np.any(medians == 0) or
-        scale <= 0
-    ):
+    if not white_balance_is_valid(medians, scale):
         return frame
 
-    target = medians * scale
-    frame_float = frame.astype(np.float32)
-    balanced = frame_float / target
-    balanced = np.clip(balanced, 0, 1)
-    return (balanced * 255).astype(np.uint8)
+    return cv2.LUT(frame, build_white_balance_lut(medians, scale))
 
 
 def compute_patch_medians(frame, patch_coords):
@@ -78,16 +90,14 @@ def select_white_patch_and_compute_medians(frame, scale_factor=1.0):
             medians = compute_patch_medians(clone, patch_coords)
 
             if medians is not None:
-                shared_state.white_balance_medians = medians
-                shared_state.white_balance_scale = scale_factor
-                shared_state.white_balance_on = True
+                shared_state.state.set_white_balance(on=True, medians=medians, scale=scale_factor)
 
                 corrected = apply_white_balance_to_frame(clone)
                 corrected_resized = cv2.resize(corrected, (resized.shape[1], resized.shape[0]))
                 cv2.imshow('Select White Patch', corrected_resized)
             else:
                 print("Empty patch selected.\n Failed to compute medians.")
-                shared_state.white_balance_on = False
+                shared_state.state.set_white_balance(on=False)
 
     cv2.namedWindow('Select White Patch', cv2.WINDOW_NORMAL)
     cv2.imshow('Select White Patch', resized)